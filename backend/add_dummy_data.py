@@ -6,6 +6,7 @@ Dashboard, Müşteri Analizi, Isı Haritası, Kuyruk Analizi ve Sohbet (AI) içi
 from datetime import datetime, timedelta
 from app import create_app
 from models import db, User, CustomerData, HeatmapData, QueueData, SiteConfig
+from services.rollup_service import rebuild_rollups
 
 app = create_app()
 
@@ -119,6 +120,8 @@ def add_dummy_data():
                 print(f"   {day_offset + 1} gün işlendi...")
 
         try:
+            db.session.commit()
+            rebuild_rollups([admin_id])  # doğrudan DB'ye yazıldı: saatlik rollup'ları güncelle
             db.session.commit()
             print("\n[OK] Tüm dummy data başarıyla eklendi (personel hariç).")
             print(f"   - Customer Data: {total_customer} kayıt")
@@ -6,6 +6,7 @@ Nike kullanıcısı (nike@vislivis.com) için:
 from datetime import datetime, timedelta
 from app import create_app
 from models import db, User, CustomerData, HeatmapData, QueueData, SiteConfig, CameraConfig
+from services.rollup_service import rebuild_rollups
 
 app = create_app()
 
@@ -146,6 +147,8 @@ def add_dummy_data_nike():
                 print(f"   {day_offset + 1} gün işlendi...")
 
         try:
+            db.session.commit()
+            rebuild_rollups([user_id])  # doğrudan DB'ye yazıldı: saatlik rollup'ları güncelle
             db.session.commit()
             print("\n[OK] Nike için tüm dummy data eklendi.")
             print(f"   - Kamera: 2 Kişi Sayım, 5 Isı Haritası, 2 Kasa Analizi (9 adet)")
@@ -13,6 +13,7 @@ except ImportError:
     TURKEY = None  # Python 3.8: sunucu yerel saati kullanılır
 from app import create_app
 from models import db, User, CustomerData, HeatmapData, QueueData, SiteConfig
+from services.rollup_service import rebuild_rollups
 
 app = create_app()
 
@@ -112,6 +113,8 @@ def add_dummy_today():
                 total_queue += 1
 
         try:
+            db.session.commit()
+            rebuild_rollups([admin_id])  # doğrudan DB'ye yazıldı: saatlik rollup'ları güncelle
             db.session.commit()
             print("[OK] Bugün için örnek veri eklendi.")
             print(f"   - Customer Data: {total_customer} kayıt (Müşteri Sayımı / Günlük Akış / Yaş-Cinsiyet)")
@@ -13,6 +13,8 @@ def create_app(config_class=Config):
          allow_headers=['Content-Type', 'Authorization'],
          supports_credentials=True)
     db.init_app(app)
+    from db_utils import configure_sqlite
+    configure_sqlite(app)
     jwt = JWTManager(app)
 
     # JWT 422 -> 401 + açıklayıcı mesaj
@@ -42,6 +44,8 @@ def create_app(config_class=Config):
     from routes.insights import insights_bp
     from routes.camera_upload import camera_upload_bp
     from routes.notifications import notifications_bp
+    from routes.export import export_bp
+    from routes.events import events_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
@@ -57,6 +61,8 @@ def create_app(config_class=Config):
     app.register_blueprint(insights_bp, url_prefix='/api/insights')
     app.register_blueprint(camera_upload_bp, url_prefix='/api/camera')
     app.register_blueprint(notifications_bp, url_prefix='/api')
+    app.register_blueprint(export_bp, url_prefix='/api/export')
+    app.register_blueprint(events_bp, url_prefix='/api/events')
 
     @app.errorhandler(Exception)
     def handle_error(err):
@@ -113,6 +119,10 @@ def _start_health_scheduler(app):
     if os.environ.get('FLASK_DEBUG') == '1' and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
         print("[HealthScheduler] Reloader parent sürecinde, scheduler başlatılmıyor.")
         return
+    # job_worker.py gibi yardımcı süreçler scheduler kilidini gunicorn'dan almasın
+    if os.environ.get('HEALTH_SCHEDULER', '1') == '0':
+        print("[HealthScheduler] HEALTH_SCHEDULER=0, scheduler bu süreçte başlatılmıyor.")
+        return
 
     LOCK_FILE = '/tmp/vislivis_scheduler.lock'
 
@@ -129,9 +139,55 @@ def _start_health_scheduler(app):
 
     def run():
         with app.app_context():
+            try:
+                # PostgreSQL profili: önümüzdeki aylar için ham veri bölümlerini aç (SQLite'ta no-op)
+                from services.pg_partitions import ensure_partitions
+                with db.engine.begin() as conn:
+                    created = ensure_partitions(conn)
+                if created:
+                    print(f"[HealthScheduler] {created} yeni tablo bölümü oluşturuldu.")
+            except Exception as e:
+                print(f"[HealthScheduler] Bölüm oluşturma hatası: {e}")
+            try:
+                # Saklama politikası: RAW_RETENTION_DAYS'ten eski ham veriyi arşivle (kapalıysa no-op)
+                from services.retention_service import run_retention
+                archived = run_retention()
+                if any(archived.values()):
+                    print(f"[HealthScheduler] Ham veri arşivlendi: {archived}")
+            except Exception as e:
+                print(f"[HealthScheduler] Arşivleme hatası: {e}")
+            try:
+                # Canlı olay kutusu: abone olmasa da eski olayları sil
+                from services.event_bus import cleanup as cleanup_events
+                cleanup_events()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[HealthScheduler] Olay kutusu temizleme hatası: {e}")
+            try:
+                # Okunmamış sayaçlarını kaynak tablolarla eşitle (eşzamanlı yazmalardan kalan sapmalar)
+                from services.unread_counters import reconcile
+                fixed = reconcile()
+                if fixed:
+                    print(f"[HealthScheduler] {fixed} okunmamış sayacı düzeltildi.")
+            except Exception as e:
+                db.session.rollback()
+                print(f"[HealthScheduler] Sayaç eşitleme hatası: {e}")
+            try:
+                # Deneme hakkı biten gönderimlerden kalan Telegram uyarılarını tekrar kuyruğa al
+                from services.alert_dispatcher import flush_pending
+                flush_pending()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[HealthScheduler] Telegram kuyruğu hatası: {e}")
+            try:
+                from db_utils import sqlite_maintenance
+                sqlite_maintenance()
+            except Exception as e:
+                print(f"[HealthScheduler] SQLite bakım hatası: {e}")
             try:
                 result = run_dead_service_check()
-                print(f"[HealthScheduler] Kontrol tamamlandı: {result.get('dead_count', 0)} ölü, {result.get('alive_count', 0)} aktif.")
+                print(f"[HealthScheduler] Kontrol tamamlandı: {result.get('dead_count', 0)} ölü, {result.get('alive_count', 0)} aktif "
+                      f"({result.get('timings_ms', {}).get('total', 0)} ms).")
             except Exception as e:
                 print(f"[HealthScheduler] Hata: {e}")
         # 60 dakika sonra tekrar çalıştır
@@ -145,6 +201,11 @@ def _start_health_scheduler(app):
     timer.start()
     print("[HealthScheduler] Başlatıldı (tek worker). İlk kontrol 5 dakika sonra yapılacak.")
 
+    # Arka plan iş kuyruğu (anomali kontrolü vb.) da aynı tek worker'da çalışır
+    if app.config.get('JOB_WORKER_INPROCESS', True):
+        from services.job_queue import start_worker
+        start_worker(app)
+
 
 app = create_app()
 _start_health_scheduler(app)
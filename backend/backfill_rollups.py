@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Saatlik rollup tablolarını (ve anomali taban çizgilerini) ham veriden baştan oluşturur.
+
+Kullanım (backend klasöründe):
+  python backfill_rollups.py              # tüm kullanıcılar
+  python backfill_rollups.py 3 7          # sadece user_id 3 ve 7
+
+Ne zaman çalıştırılmalı:
+- Rollup tablosu ilk kez eklendiğinde (mevcut ham veriyi aktarmak için)
+- API dışından doğrudan DB'ye yazan script'lerden (seed, dummy import) sonra
+Tekrar çalıştırmak güvenlidir; ilgili kullanıcıların rollup satırları silinip yeniden yazılır.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from models import db
+from services.rollup_service import rebuild_rollups
+from services.anomaly_baseline import rebuild_baselines
+
+app = create_app()
+
+
+def backfill(user_ids=None):
+    with app.app_context():
+        counts = rebuild_rollups(user_ids)
+        counts['anomaly_baseline'] = rebuild_baselines(user_ids)
+        db.session.commit()
+        for table, n in counts.items():
+            print(f"OK: {table} {n} satır yazıldı.")
+
+
+if __name__ == "__main__":
+    ids = [int(a) for a in sys.argv[1:]] or None
+    backfill(ids)
@@ -15,10 +15,40 @@ _fallback_secret = os.environ.get('SECRET_KEY') or 'vislivis-dev-secret-key-chan
 _backend_dir = os.path.dirname(os.path.abspath(__file__))
 _default_db = 'sqlite:///' + os.path.join(_backend_dir, 'instance', 'vislivis.db').replace('\\', '/')
 
+
+def _database_url():
+    url = os.environ.get('DATABASE_URL') or _default_db
+    # Heroku/Docker tarzı postgres:// şeması SQLAlchemy'de postgresql:// olmalı
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def _engine_options(url):
+    """PostgreSQL profili: bağlantı havuzu. SQLite'ta varsayılanlar kullanılır."""
+    if not url.startswith('postgresql'):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '10')),        # worker başına
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '10')),
+        'pool_pre_ping': True,                                        # kopmuş bağlantıyı kullanmadan önce yenile
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '1800')),  # sn
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', '30')),
+    }
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or _fallback_secret
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or _default_db
+    # Varsayılan SQLite; production için DATABASE_URL=postgresql://... (bkz. migrate_postgres.py)
+    SQLALCHEMY_DATABASE_URI = _database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite bağlantı profili (db_utils.configure_sqlite); PostgreSQL'de kullanılmaz
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', '1') == '1'  # 0: mevcut WAL DB'yi geri çevirmez (journal_mode kalıcı)
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '15000'))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', '65536'))  # bağlantı başına
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_JOURNAL_SIZE_LIMIT = int(os.environ.get('SQLITE_JOURNAL_SIZE_LIMIT', str(64 * 1024 * 1024)))  # checkpoint sonrası WAL dosyası
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or _fallback_secret
     JWT_ACCESS_TOKEN_EXPIRES = 86400  # 24 saat
     JWT_TOKEN_LOCATION = ['headers', 'query_string']
@@ -27,3 +57,33 @@ class Config:
     JWT_HEADER_TYPE = 'Bearer'
     JWT_CSRF_PROTECT = False  # API Bearer token için CSRF kapalı
     CORS_ORIGINS = _cors_origins()
+    # Analytics GET yanıt önbelleği (services/cache_service.py)
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') == '1'
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '60'))  # bugünü içeren yanıtlar (sn)
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '2000'))  # worker başına
+    ETAG_ENABLED = os.environ.get('ETAG_ENABLED', '1') == '1'  # aynı imzadan ETag / 304
+    # Arka plan iş kuyruğu (services/job_queue.py)
+    JOB_WORKER_INPROCESS = os.environ.get('JOB_WORKER_INPROCESS', '1') == '1'  # 0: ayrı süreç (job_worker.py)
+    JOB_COALESCE_SECONDS = int(os.environ.get('JOB_COALESCE_SECONDS', '30'))  # aynı işin birleştirilme penceresi
+    JOB_POLL_SECONDS = int(os.environ.get('JOB_POLL_SECONDS', '5'))
+    JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', '600'))  # bu süreden eski 'running' iş worker açılışında geri alınır
+    # Telegram uyarı gönderimi (services/alert_dispatcher.py); token / sohbet: TELEGRAM_BOT, TELEGRAM_ID
+    TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')  # test: yerel stub
+    TELEGRAM_DIGEST_SECONDS = int(os.environ.get('TELEGRAM_DIGEST_SECONDS', '30'))  # bu pencerede biriken uyarılar tek mesaj
+    TELEGRAM_MIN_INTERVAL_SECONDS = float(os.environ.get('TELEGRAM_MIN_INTERVAL_SECONDS', '3'))  # sohbet başına mesaj aralığı
+    TELEGRAM_TIMEOUT = int(os.environ.get('TELEGRAM_TIMEOUT', '10'))
+    # Modül heartbeat yazma tamponu (services/heartbeat_buffer.py); 0: her ping anında yazılır
+    HEARTBEAT_FLUSH_SECONDS = int(os.environ.get('HEARTBEAT_FLUSH_SECONDS', '30'))
+    # Erişim kapsamı (user_ids, company grubu, mesai saatleri) süreç önbelleği, sn (user_context.py)
+    ACCESS_CACHE_TTL = int(os.environ.get('ACCESS_CACHE_TTL', '30'))
+    # Canlı olay akışı / SSE (services/event_bus.py, routes/events.py)
+    EVENT_POLL_SECONDS = float(os.environ.get('EVENT_POLL_SECONDS', '1'))  # worker başına outbox okuma aralığı
+    EVENT_RETENTION_SECONDS = int(os.environ.get('EVENT_RETENTION_SECONDS', '600'))  # replay penceresi
+    EVENT_GAP_SECONDS = int(os.environ.get('EVENT_GAP_SECONDS', '60'))  # geç commit olan olayların bekleneceği süre
+    EVENT_STREAM_MAX_SECONDS = int(os.environ.get('EVENT_STREAM_MAX_SECONDS', '300'))
+    EVENT_KEEPALIVE_SECONDS = int(os.environ.get('EVENT_KEEPALIVE_SECONDS', '15'))
+    EVENT_STREAM_MAX_PER_WORKER = int(os.environ.get('EVENT_STREAM_MAX_PER_WORKER', '4'))  # gunicorn.conf.py thread sayısını buna göre ayarlar
+    EVENT_INGEST_THROTTLE_SECONDS = int(os.environ.get('EVENT_INGEST_THROTTLE_SECONDS', '5'))
+    # Ham veri saklama / arşiv (services/retention_service.py); 0: ham veri süresiz tutulur
+    RAW_RETENTION_DAYS = int(os.environ.get('RAW_RETENTION_DAYS', '0'))
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or os.path.join(_backend_dir, 'instance', 'archive')
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+SQLite veritabanının tutarlı (online) yedeği, sıkıştırma, saklama politikası ve geri yükleme doğrulaması.
+
+Kullanım (backend klasöründe; db_backup.sh cron'dan çağırır):
+  python db_backup.py backup                   # yedek al + doğrula + eski yedekleri temizle
+  python db_backup.py verify <yedek.db.gz>     # yedeği geçici dosyaya açıp bütünlüğünü kontrol et
+  python db_backup.py restore <yedek.db.gz> <hedef.db> [--force]
+  python db_backup.py prune                    # sadece saklama politikasını uygula
+
+- Kopya SQLite online backup API ile alınır (cp yarım transaction yakalayabilir). WAL modunda tek adımda
+  alınır: okuma snapshot'ı yazıcıları bloklamaz. Rollback journal modunda BACKUP_STEP_PAGES sayfalık
+  adımlarla, aralarda BACKUP_STEP_PAUSE sn bekleyerek alınır; yazıcılar adımlar arasında ilerleyebilir.
+- Kopya PRAGMA integrity_check'ten geçmeden yayınlanmaz. gzip ile sıkıştırılır; yanına sha256 ve tablo
+  satır sayılarını içeren .json manifest yazılır.
+- verify: sıkıştırılmış yedeği açar, sha256 / integrity_check / satır sayılarını manifest ile karşılaştırır
+  (geri yüklenebilirlik testi). backup komutu her yedekten sonra bunu çalıştırır.
+- Saklama: son KEEP_HOURS saat içindeki tüm yedekler, sonra KEEP_DAYS gün boyunca günde bir,
+  KEEP_WEEKS hafta boyunca haftada bir yedek tutulur.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = os.environ.get('DB_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'vislivis.db')
+BACKUP_DIR = os.environ.get('BACKUP_DIR') or '/var/www/vislivis/db_backups'
+
+BACKUP_STEP_PAGES = 1024
+BACKUP_STEP_PAUSE = 0.05  # sn, adımlar arası
+KEEP_HOURS = 48
+KEEP_DAYS = 14
+KEEP_WEEKS = 8
+
+PREFIX = 'vislivis_'
+STAMP_FORMAT = '%Y-%m-%d_%H-%M'
+SUFFIX = '.db.gz'
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _check(path: str) -> dict:
+    """integrity_check + tablo satır sayıları. Bozuksa ValueError."""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        result = conn.execute('PRAGMA integrity_check').fetchone()[0]
+        if result != 'ok':
+            raise ValueError(f'integrity_check: {result}')
+        tables = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        return {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables}
+    finally:
+        conn.close()
+
+
+def _online_copy(src_path: str, dst_path: str) -> None:
+    src = sqlite3.connect(f'file:{src_path}?mode=ro', uri=True)
+    dst = sqlite3.connect(dst_path)
+    try:
+        wal = src.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+        if wal:
+            src.backup(dst)
+        else:
+            src.backup(dst, pages=BACKUP_STEP_PAGES, progress=lambda *_: time.sleep(BACKUP_STEP_PAUSE))
+        # Yedek tek dosya olsun (WAL/SHM olmadan açılabilsin)
+        dst.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        dst.close()
+        src.close()
+
+
+def _gzip(src_path: str, dst_path: str) -> None:
+    with open(src_path, 'rb') as f_in, gzip.open(dst_path, 'wb', compresslevel=6) as f_out:
+        shutil.copyfileobj(f_in, f_out, 1 << 20)
+
+
+def _gunzip(src_path: str, dst_path: str) -> None:
+    with gzip.open(src_path, 'rb') as f_in, open(dst_path, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out, 1 << 20)
+
+
+def _manifest_path(backup_path: str) -> str:
+    return backup_path[:-len(SUFFIX)] + '.json' if backup_path.endswith(SUFFIX) else backup_path + '.json'
+
+
+def backup(db_path: str = DB_PATH, backup_dir: str = BACKUP_DIR) -> str:
+    """Yedek alır, doğrular ve yayınlar; yedek dosyasının yolunu döner."""
+    os.makedirs(backup_dir, exist_ok=True)
+    stamp = datetime.now().strftime(STAMP_FORMAT)
+    final = os.path.join(backup_dir, f'{PREFIX}{stamp}{SUFFIX}')
+    started = time.monotonic()
+    with tempfile.TemporaryDirectory(dir=backup_dir) as tmp:
+        raw = os.path.join(tmp, 'snapshot.db')
+        _online_copy(db_path, raw)
+        counts = _check(raw)
+        packed = os.path.join(tmp, 'snapshot.db.gz')
+        _gzip(raw, packed)
+        manifest = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'source': db_path,
+            'size': os.path.getsize(raw),
+            'compressed_size': os.path.getsize(packed),
+            'sha256': _sha256(packed),
+            'tables': counts,
+        }
+        with open(_manifest_path(final), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(packed, final)  # aynı dosya sistemi: atomik
+    print(f"[{datetime.now()}] DB backup OK: {final} "
+          f"({manifest['size'] // 1024} KB → {manifest['compressed_size'] // 1024} KB, {time.monotonic() - started:.1f} sn)")
+    return final
+
+
+def verify(backup_path: str) -> dict:
+    """Yedeği geçici dosyaya açar; sha256, integrity_check ve satır sayılarını manifest ile karşılaştırır."""
+    manifest = None
+    if os.path.exists(_manifest_path(backup_path)):
+        with open(_manifest_path(backup_path)) as f:
+            manifest = json.load(f)
+        if _sha256(backup_path) != manifest['sha256']:
+            raise ValueError('sha256 uyuşmuyor')
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, 'restore.db')
+        if backup_path.endswith('.gz'):
+            _gunzip(backup_path, raw)
+        else:
+            shutil.copyfile(backup_path, raw)
+        counts = _check(raw)
+    if manifest and counts != manifest['tables']:
+        diff = {t: (manifest['tables'].get(t), counts.get(t))
+                for t in set(counts) | set(manifest['tables']) if counts.get(t) != manifest['tables'].get(t)}
+        raise ValueError(f'satır sayıları uyuşmuyor: {diff}')
+    return counts
+
+
+def restore(backup_path: str, target_path: str, force: bool = False) -> None:
+    """
+    Yedeği doğrulayıp target_path'e geri yükler. Hedef varsa --force gerekir; hedef canlı DB ise
+    uygulama durdurulmalıdır (yazma backup API ile yapılır, yarım dosya oluşmaz).
+    """
+    if os.path.exists(target_path) and not force:
+        raise FileExistsError(f'{target_path} mevcut; üzerine yazmak için --force')
+    verify(backup_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, 'restore.db')
+        if backup_path.endswith('.gz'):
+            _gunzip(backup_path, raw)
+        else:
+            shutil.copyfile(backup_path, raw)
+        src = sqlite3.connect(raw)
+        dst = sqlite3.connect(target_path)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+    print(f"Geri yüklendi: {backup_path} → {target_path}")
+
+
+def _backup_time(name: str):
+    if not (name.startswith(PREFIX) and name.endswith(SUFFIX)):
+        return None
+    try:
+        return datetime.strptime(name[len(PREFIX):-len(SUFFIX)], STAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def prune(backup_dir: str = BACKUP_DIR, now: datetime | None = None) -> list:
+    """Saklama politikasına göre fazla yedekleri (ve manifestlerini) siler; silinenleri döner."""
+    now = now or datetime.now()
+    backups = sorted(
+        ((t, name) for name in os.listdir(backup_dir) if (t := _backup_time(name))),
+        reverse=True,
+    )
+    keep, seen_days, seen_weeks = set(), set(), set()
+    for t, name in backups:
+        age = now - t
+        day, week = t.date(), t.isocalendar()[:2]
+        if age <= timedelta(hours=KEEP_HOURS):
+            keep.add(name)
+        elif age <= timedelta(days=KEEP_DAYS) and day not in seen_days:
+            keep.add(name)
+        elif age <= timedelta(weeks=KEEP_WEEKS) and week not in seen_weeks:
+            keep.add(name)
+        seen_days.add(day)
+        seen_weeks.add(week)
+    removed = []
+    for _, name in backups:
+        if name in keep:
+            continue
+        path = os.path.join(backup_dir, name)
+        os.remove(path)
+        if os.path.exists(_manifest_path(path)):
+            os.remove(_manifest_path(path))
+        removed.append(name)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite online yedekleme / doğrulama / geri yükleme')
+    parser.add_argument('--db', default=DB_PATH, help=f'Kaynak DB (varsayılan: {DB_PATH})')
+    parser.add_argument('--dir', default=BACKUP_DIR, help=f'Yedek klasörü (varsayılan: {BACKUP_DIR})')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('backup', help='Yedek al, doğrula, eski yedekleri temizle')
+    p_verify = sub.add_parser('verify', help='Yedeği doğrula')
+    p_verify.add_argument('path')
+    p_restore = sub.add_parser('restore', help='Yedeği geri yükle')
+    p_restore.add_argument('path')
+    p_restore.add_argument('target')
+    p_restore.add_argument('--force', action='store_true', help='Mevcut hedefin üzerine yaz')
+    sub.add_parser('prune', help='Saklama politikasını uygula')
+    args = parser.parse_args()
+
+    try:
+        if args.command in (None, 'backup'):
+            path = backup(args.db, args.dir)
+            verify(path)
+            print(f"Doğrulandı: {path}")
+            for name in prune(args.dir):
+                print(f"Silindi: {name}")
+        elif args.command == 'verify':
+            counts = verify(args.path)
+            print(f"OK: {len(counts)} tablo, {sum(counts.values())} satır")
+        elif args.command == 'restore':
+            restore(args.path, args.target, args.force)
+        elif args.command == 'prune':
+            for name in prune(args.dir):
+                print(f"Silindi: {name}")
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"[{datetime.now()}] DB backup HATA: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
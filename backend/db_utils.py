@@ -0,0 +1,129 @@
+"""Veritabanı yardımcıları: dialect bağımsız upsert (INSERT ... ON CONFLICT), zaman gruplama ifadeleri ve SQLite bağlantı profili."""
+from models import db
+
+# Tek INSERT ifadesindeki satır sayısı (SQLite bind parametre limitine takılmamak için)
+UPSERT_CHUNK_ROWS = 500
+
+
+def _dialect_insert():
+    """Aktif bağlantının dialect'ine uygun insert() fonksiyonunu döndürür (sqlite / postgresql)."""
+    name = db.session.get_bind().dialect.name
+    if name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f'ON CONFLICT desteklenmiyor: {name}')
+    return insert
+
+
+def upsert(model, rows: list, conflict_cols: list, update_cols: list | None = None, returning: list | None = None,
+           update_set: dict | None = None):
+    """
+    rows listesini tek INSERT ... ON CONFLICT ifadesiyle yazar.
+    - conflict_cols: unique index kolonları (örn. ['user_id', 'idempotency_key'])
+    - update_cols: çakışmada güncellenecek kolonlar; None ise conflict dışındaki tüm gönderilen kolonlar,
+      boş liste ise DO NOTHING
+    - update_set: çakışmada kullanılacak özel ifadeler (örn. {'version': Model.version + 1}) veya
+      excluded satırını alıp bu dict'i dönen fonksiyon; verilirse update_cols yerine kullanılır
+    - returning: dönülecek kolonlar (örn. [Model.id]); None ise sonuç satırı dönmez
+    Aynı conflict anahtarı listede birden fazla varsa sonuncusu kullanılır (PostgreSQL aynı
+    ifadede bir satırı iki kez güncellemeye izin vermez).
+    Commit etmez; çağıran transaction'ı yönetir.
+    """
+    if not rows:
+        return []
+    dedup = {}
+    for r in rows:
+        dedup[tuple(r.get(c) for c in conflict_cols)] = r
+    rows = list(dedup.values())
+
+    insert = _dialect_insert()
+    if update_cols is None:
+        update_cols = [c for c in rows[0].keys() if c not in conflict_cols]
+    result = []
+    for i in range(0, len(rows), UPSERT_CHUNK_ROWS):
+        stmt = insert(model).values(rows[i:i + UPSERT_CHUNK_ROWS])
+        if update_set:
+            set_ = update_set(stmt.excluded) if callable(update_set) else update_set
+            stmt = stmt.on_conflict_do_update(index_elements=conflict_cols, set_=set_)
+        elif update_cols:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=conflict_cols,
+                set_={c: getattr(stmt.excluded, c) for c in update_cols},
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=conflict_cols)
+        if returning:
+            result.extend(db.session.execute(stmt.returning(*returning)).all())
+        else:
+            db.session.execute(stmt)
+    return result
+
+
+def hour_bucket(col):
+    """Datetime kolonunu saat başına yuvarlayan SQL ifadesi (GROUP BY için)."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return db.func.date_trunc('hour', col)
+    return db.func.strftime('%Y-%m-%d %H:00:00', col)
+
+
+def as_datetime(val):
+    """SQLite strftime/date() sonuçları string döner; datetime'a çevirir."""
+    from datetime import datetime
+    if val is None or isinstance(val, datetime):
+        return val
+    return datetime.fromisoformat(str(val))
+
+
+def configure_sqlite(app) -> None:
+    """
+    SQLite bağlantı profili: her yeni bağlantıda WAL, busy_timeout, önbellek ve mmap pragmaları.
+    - WAL: okuyucular yazıcıyı beklemez; synchronous=NORMAL WAL'da güvenlidir (commit fsync'i checkpoint'e kalır).
+      Sadece WAL ile ayarlanır; rollback journal'da varsayılan FULL korunur (NORMAL elektrik kesintisinde
+      son commit'leri kaybettirebilir). SQLITE_WAL=0 mevcut WAL dosyasını geri çevirmez (journal_mode kalıcıdır).
+    - busy_timeout: kilitli DB'de hemen "database is locked" yerine SQLITE_BUSY_TIMEOUT_MS kadar bekler
+      (2 worker × 2 thread + scheduler aynı dosyaya yazar).
+    PostgreSQL'de hiçbir şey yapmaz.
+    """
+    from sqlalchemy import event
+
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    cfg = app.config
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(cfg.get('SQLITE_BUSY_TIMEOUT_MS', 15000))}",
+        f"PRAGMA cache_size = -{int(cfg.get('SQLITE_CACHE_SIZE_KB', 65536))}",  # negatif: KiB
+        f"PRAGMA mmap_size = {int(cfg.get('SQLITE_MMAP_SIZE', 268435456))}",
+        'PRAGMA temp_store = MEMORY',
+        f"PRAGMA journal_size_limit = {int(cfg.get('SQLITE_JOURNAL_SIZE_LIMIT', 67108864))}",
+    ]
+    use_wal = cfg.get('SQLITE_WAL', True)
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            if use_wal:
+                cur.execute('PRAGMA journal_mode = WAL')  # kalıcıdır; tekrar ayarlamak ucuz
+                cur.execute('PRAGMA synchronous = NORMAL')
+            for pragma in pragmas:
+                cur.execute(pragma)
+        finally:
+            cur.close()
+
+
+def sqlite_maintenance() -> dict:
+    """
+    Periyodik SQLite bakımı (scheduler): PRAGMA optimize (istatistikleri gerekirse günceller) ve
+    WAL checkpoint (PASSIVE: yazıcıları bloklamaz). SQLite değilse boş dict döner.
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return {}
+    with engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA optimize')
+        busy, wal_pages, checkpointed = conn.exec_driver_sql('PRAGMA wal_checkpoint(PASSIVE)').first()
+    return {'busy': busy, 'wal_pages': wal_pages, 'checkpointed': checkpointed}
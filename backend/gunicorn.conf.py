@@ -1,7 +1,13 @@
 # Gunicorn config - VDS / production
 # Backend klasöründen çalıştırın: gunicorn -c gunicorn.conf.py app:app
+import os
+
 bind = "0.0.0.0:5000"
 workers = 2
-threads = 2
+# SSE bağlantıları (/api/events/stream) birer thread tutar. Varsayılan: eski istek eşzamanlılığı (2) +
+# EVENT_STREAM_MAX_PER_WORKER; SQLite'ta thread sayısı arttıkça "database is locked" riski artar.
+_request_threads = 2
+_stream_slots = int(os.environ.get('EVENT_STREAM_MAX_PER_WORKER', '4'))
+threads = int(os.environ.get('GUNICORN_THREADS') or (_request_threads + _stream_slots))
 timeout = 120
-worker_class = "sync"
+worker_class = "gthread"
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Arka plan iş kuyruğunu (job_queue tablosu) ayrı bir süreçte işler.
+
+Kullanım (backend klasöründe):
+  JOB_WORKER_INPROCESS=0 gunicorn -c gunicorn.conf.py app:app   # web worker'ları kuyruğu işlemez
+  python job_worker.py
+
+JOB_WORKER_INPROCESS=1 (varsayılan) ise kuyruk scheduler'ı çalıştıran gunicorn worker'ında
+işlenir; bu script'e gerek yoktur.
+
+Script kendi sürecinde JOB_WORKER_INPROCESS=0 ve HEALTH_SCHEDULER=0 varsayar: app import edilirken
+ikinci bir kuyruk thread'i açılmaz ve scheduler kilidi gunicorn'a kalır (gunicorn'dan önce
+başlatılsa bile).
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# app import'u scheduler'ı ve in-process worker'ı başlatır; bu süreçte ikisi de kapalı olmalı
+os.environ.setdefault('JOB_WORKER_INPROCESS', '0')
+os.environ.setdefault('HEALTH_SCHEDULER', '0')
+
+from app import create_app
+from services.job_queue import run_forever
+
+if __name__ == "__main__":
+    run_forever(create_app())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+customer_data / queue_data / heatmap_data tablolarına idempotency_key kolonu ve
+(user_id, idempotency_key) unique index'i ekler.
+Mevcut kayıtlar için anahtar, API'nin türettiği formatta geriye dönük doldurulur; aynı
+(kaynak, timestamp) için birden fazla satır varsa sadece en küçük id'li satır anahtar alır,
+böylece unique index mevcut çift kayıtlar yüzünden kırılmaz. Birden fazla kez çalıştırılabilir.
+"""
+import sqlite3
+import os
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'instance', 'vislivis.db')
+
+# tablo -> (index adı, anahtar ifadesi, gruplama kolonları). {t} = dış sorgudaki tablo adı
+TABLES = {
+    'customer_data': (
+        'ux_customer_idem',
+        "COALESCE({t}.camera_id, '') || '|' || strftime('%Y-%m-%dT%H:%M:%S', {t}.timestamp)",
+        'user_id, camera_id, timestamp',
+    ),
+    'queue_data': (
+        'ux_queue_idem',
+        "COALESCE({t}.cashier_id, '') || '|' || COALESCE({t}.customer_id, '') || '|' || strftime('%Y-%m-%dT%H:%M:%S', {t}.recorded_at)",
+        'user_id, cashier_id, customer_id, recorded_at',
+    ),
+    'heatmap_data': (
+        'ux_heatmap_idem',
+        "COALESCE({t}.camera_id, '') || '|' || COALESCE({t}.zone, '') || '|' || strftime('%Y-%m-%dT%H:%M:%S', {t}.recorded_at)",
+        'user_id, camera_id, zone, recorded_at',
+    ),
+}
+
+
+def migrate():
+    if not os.path.exists(DB_PATH):
+        print(f"DB bulunamadı: {DB_PATH}")
+        return
+
+    conn = sqlite3.connect(DB_PATH)
+    cur = conn.cursor()
+
+    for table, (index_name, key_expr, group_cols) in TABLES.items():
+        cur.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in cur.fetchall()]
+        if not columns:
+            print(f"- {table} tablosu yok, atlandı")
+            continue
+        if 'idempotency_key' not in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN idempotency_key VARCHAR(200)")
+            print(f"OK: {table}.idempotency_key kolonu eklendi")
+        else:
+            print(f"- {table}.idempotency_key zaten mevcut")
+
+        ts_col = group_cols.split(', ')[-1]
+        key_expr = key_expr.format(t=table)
+        cur.execute(f"""
+            UPDATE {table} SET idempotency_key = {key_expr}
+            WHERE idempotency_key IS NULL AND {ts_col} IS NOT NULL
+              AND id IN (SELECT MIN(id) FROM {table} GROUP BY {group_cols})
+              AND NOT EXISTS (
+                  SELECT 1 FROM {table} t2
+                  WHERE t2.user_id = {table}.user_id AND t2.idempotency_key = {key_expr}
+              )
+        """)
+        print(f"OK: {table} için {cur.rowcount} kayda anahtar yazıldı")
+
+        cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table} (user_id, idempotency_key)")
+        print(f"OK: {index_name} hazir")
+
+    conn.commit()
+    conn.close()
+    print("\nOK: Idempotency Migration tamamlandi.")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+module_ping tablosunu oluşturur ve service_heartbeat.module_pings (JSON) içeriğini bu tabloya taşır.
+Birden fazla kez çalıştırılabilir; (kullanıcı, modül) için daha yeni zaman korunur.
+"""
+import json
+import sqlite3
+import os
+from datetime import datetime
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'instance', 'vislivis.db')
+
+
+def migrate():
+    if not os.path.exists(DB_PATH):
+        print(f"DB bulunamadı: {DB_PATH}")
+        return
+
+    conn = sqlite3.connect(DB_PATH)
+    cur = conn.cursor()
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS module_ping (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            module VARCHAR(30) NOT NULL,
+            last_ping_at DATETIME NOT NULL
+        )
+    """)
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_module_ping ON module_ping (user_id, module)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_module_ping_last_ping_at ON module_ping (last_ping_at)")
+    print("OK: module_ping tablosu hazir")
+
+    cur.execute("PRAGMA table_info(service_heartbeat)")
+    if 'module_pings' not in [row[1] for row in cur.fetchall()]:
+        print("- service_heartbeat.module_pings yok, taşınacak veri yok")
+    else:
+        moved = 0
+        for user_id, raw in cur.execute(
+            "SELECT user_id, module_pings FROM service_heartbeat WHERE module_pings IS NOT NULL"
+        ).fetchall():
+            try:
+                pings = json.loads(raw)
+            except ValueError:
+                continue
+            for module, ts_str in pings.items():
+                try:
+                    ts = datetime.fromisoformat(ts_str)
+                except (TypeError, ValueError):
+                    continue
+                # SQLAlchemy'nin SQLite DateTime formatı
+                conn.execute("""
+                    INSERT INTO module_ping (user_id, module, last_ping_at) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id, module) DO UPDATE SET
+                        last_ping_at = MAX(module_ping.last_ping_at, excluded.last_ping_at)
+                """, (user_id, module, ts.strftime('%Y-%m-%d %H:%M:%S.%f')))
+                moved += 1
+        print(f"OK: {moved} modül ping'i taşındı")
+
+    conn.commit()
+    conn.close()
+    print("\nOK: Module Ping Migration tamamlandi. DB bozulmadi.")
+
+
+if __name__ == '__main__':
+    migrate()
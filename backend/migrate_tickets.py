@@ -78,6 +78,11 @@ try:
         cur.execute("ALTER TABLE tickets ADD COLUMN closed_by_user_id INTEGER REFERENCES users(id)")
         print("tickets.closed_by_user_id eklendi.")
 
+    # Listeleme / okunmamış sayacı için index'ler
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_tickets_user_updated ON tickets (user_id, updated_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_ticket_replies_staff ON ticket_replies (ticket_id, is_staff, created_at)")
+    print("ticket index'leri hazır.")
+
     conn.commit()
 except Exception as e:
     conn.rollback()
@@ -77,6 +77,7 @@ class CustomerData(db.Model):
     __table_args__ = (
         db.Index('ix_customer_user_ts', 'user_id', 'timestamp'),
         db.Index('ix_customer_ts', 'timestamp'),
+        db.Index('ux_customer_idem', 'user_id', 'idempotency_key', unique=True),
     )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -95,6 +96,34 @@ class CustomerData(db.Model):
     camera_id = db.Column(db.String(50))
     entered = db.Column(db.Integer, default=0)
     exited = db.Column(db.Integer, default=0)
+    # Tekrar gönderimlerde çift kayıt olmaması için: istemci anahtarı veya "kamera|timestamp"
+    idempotency_key = db.Column(db.String(200), nullable=True)
+
+
+class CustomerHourly(db.Model):
+    """
+    CustomerData'nın (kullanıcı, kamera, saat) bazında önceden toplanmış hali.
+    Ingest ve düzenleme endpoint'lerinde ilgili saatler ham veriden yeniden hesaplanır
+    (services/rollup_service.py). Dashboard okumaları ham tablo yerine buradan yapılır.
+    """
+    __tablename__ = 'customer_hourly'
+    __table_args__ = (
+        db.Index('ux_customer_hourly', 'user_id', 'camera_id', 'hour', unique=True),
+        db.Index('ix_customer_hourly_hour', 'hour'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    camera_id = db.Column(db.String(50), nullable=False, default='')  # kamerasız kayıtlar için ''
+    hour = db.Column(db.DateTime, nullable=False)  # saat başı (naive yerel saat)
+    entered = db.Column(db.Integer, default=0)
+    exited = db.Column(db.Integer, default=0)
+    male_count = db.Column(db.Integer, default=0)
+    female_count = db.Column(db.Integer, default=0)
+    age_18_30 = db.Column(db.Integer, default=0)
+    age_30_50 = db.Column(db.Integer, default=0)
+    age_50_plus = db.Column(db.Integer, default=0)
+    row_count = db.Column(db.Integer, default=0)    # toplanan ham kayıt sayısı
+    editable_id = db.Column(db.Integer)             # saatteki ilk ham kayıt (hourly-edit / record için)
 
 
 class QueueData(db.Model):
@@ -102,6 +131,7 @@ class QueueData(db.Model):
     __table_args__ = (
         db.Index('ix_queue_user_rec', 'user_id', 'recorded_at'),
         db.Index('ix_queue_rec', 'recorded_at'),
+        db.Index('ux_queue_idem', 'user_id', 'idempotency_key', unique=True),
     )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -115,6 +145,37 @@ class QueueData(db.Model):
     total_customers = db.Column(db.Integer, default=1)  # özet için (1 kayıt = N müşteri)
     recorded_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    idempotency_key = db.Column(db.String(200), nullable=True)  # istemci anahtarı veya "kasa|müşteri|timestamp"
+
+
+class QueueHourly(db.Model):
+    """
+    QueueData'nın (kullanıcı, kasa, saat) bazında önceden toplanmış hali (services/rollup_service.py).
+    Saat: COALESCE(recorded_at, created_at). Müşteri ağırlığı: total_customers (0/NULL ise 1).
+    """
+    __tablename__ = 'queue_hourly'
+    __table_args__ = (
+        db.Index('ux_queue_hourly', 'user_id', 'cashier_id', 'hour', unique=True),
+        db.Index('ix_queue_hourly_hour', 'hour'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    cashier_id = db.Column(db.String(80), nullable=False, default='')  # kasasız kayıtlar için ''
+    hour = db.Column(db.DateTime, nullable=False)
+    customers = db.Column(db.Integer, default=0)          # toplam müşteri (ağırlıklı)
+    wait_weighted_sum = db.Column(db.Float, default=0)    # sum(wait_time * müşteri)
+    wait_nonzero_sum = db.Column(db.Float, default=0)     # sıfır olmayan bekleme süreleri toplamı (kayıt bazlı)
+    wait_nonzero_count = db.Column(db.Integer, default=0)
+    wait_min = db.Column(db.Float)                        # sıfır olmayan en kısa bekleme (yoksa NULL)
+    wait_max = db.Column(db.Float, default=0)
+    # Bekleme süresi dağılımı (müşteri ağırlıklı): 0-1 dk, 1-2 dk, 2-3 dk, 3-5 dk, 5+ dk
+    wait_0_1 = db.Column(db.Integer, default=0)
+    wait_1_2 = db.Column(db.Integer, default=0)
+    wait_2_3 = db.Column(db.Integer, default=0)
+    wait_3_5 = db.Column(db.Integer, default=0)
+    wait_5_plus = db.Column(db.Integer, default=0)
+    row_count = db.Column(db.Integer, default=0)
+    editable_id = db.Column(db.Integer)
 
 
 class HeatmapData(db.Model):
@@ -122,6 +183,7 @@ class HeatmapData(db.Model):
     __table_args__ = (
         db.Index('ix_heatmap_user_date', 'user_id', 'date_recorded'),
         db.Index('ix_heatmap_rec', 'recorded_at'),
+        db.Index('ux_heatmap_idem', 'user_id', 'idempotency_key', unique=True),
     )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -133,6 +195,104 @@ class HeatmapData(db.Model):
     date_recorded = db.Column(db.Date)
     recorded_at = db.Column(db.DateTime)     # veri toplama zamanı (saat bazlı gruplama için)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    idempotency_key = db.Column(db.String(200), nullable=True)  # istemci anahtarı veya "kamera|bölge|timestamp"
+
+
+class HeatmapHourly(db.Model):
+    """
+    HeatmapData'nın (kullanıcı, gün, bölge, saat) bazında önceden toplanmış hali (services/rollup_service.py).
+    Gün: date_recorded (günlük özet filtresi), saat: COALESCE(recorded_at, created_at).
+    """
+    __tablename__ = 'heatmap_hourly'
+    __table_args__ = (
+        db.Index('ux_heatmap_hourly', 'user_id', 'date_recorded', 'zone', 'hour', unique=True),
+        db.Index('ix_heatmap_hourly_hour', 'hour'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    date_recorded = db.Column(db.Date, nullable=False)  # boşsa kayıt zamanının günü
+    zone = db.Column(db.String(120), nullable=False, default='')  # bölgesiz kayıtlar için ''
+    hour = db.Column(db.DateTime, nullable=False)
+    visitors = db.Column(db.Integer, default=0)
+    dwell_sum = db.Column(db.Float, default=0)       # sum(intensity)
+    samples = db.Column(db.Integer, default=0)       # kayıt sayısı (ortalama bekleme = dwell_sum / samples)
+    max_visitors = db.Column(db.Integer, default=0)  # tek kayıttaki en yüksek ziyaretçi (en yoğun bölge için)
+    editable_id = db.Column(db.Integer)
+
+
+class FactVersion(db.Model):
+    """
+    (kullanıcı, gün) bazında veri sürümü. Ham veri (müşteri/kuyruk/heatmap) veya analitiği etkileyen
+    ayar değiştikçe artar; yanıt önbelleği (services/cache_service.py) worker'lar arası geçersiz
+    kılmayı bununla yapar. Ayar değişiklikleri day=1970-01-01 satırına yazılır.
+    """
+    __tablename__ = 'fact_version'
+    __table_args__ = (
+        db.Index('ux_fact_version', 'user_id', 'day', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    version = db.Column(db.Integer, default=1, nullable=False)
+
+
+class AnomalyBaseline(db.Model):
+    """
+    Kullanıcı + günün saati bazında saatlik müşteri girişi taban çizgisi (services/anomaly_baseline.py).
+    Aynı saatin günlük toplamları üzerinden EWMA ortalama/varyans; anomali kontrolü tek satır okur.
+    prev_*: last_day katkısından önceki durum (aynı gün için gelen yeni veri katkıyı yeniden hesaplar).
+    """
+    __tablename__ = 'anomaly_baseline'
+    __table_args__ = (
+        db.Index('ux_anomaly_baseline', 'user_id', 'hour_of_day', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    hour_of_day = db.Column(db.Integer, nullable=False)  # 0-23
+    mean = db.Column(db.Float, nullable=False, default=0)
+    var = db.Column(db.Float, nullable=False, default=0)
+    samples = db.Column(db.Integer, nullable=False, default=0)  # katkı yapan gün sayısı
+    last_day = db.Column(db.Date)
+    prev_mean = db.Column(db.Float, nullable=False, default=0)
+    prev_var = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Job(db.Model):
+    """
+    Arka plan iş kuyruğu (services/job_queue.py). dedupe_key unique: aynı iş bekliyorken tekrar
+    eklenirse yeni satır açılmaz (örn. aynı saat için 10 kameranın POST'u tek anomali kontrolü).
+    Tamamlanan işler silinir; deneme hakkı biten işler status='failed' olarak kalır.
+    """
+    __tablename__ = 'job_queue'
+    __table_args__ = (
+        db.Index('ux_job_queue_dedupe', 'dedupe_key', unique=True),
+        db.Index('ix_job_queue_status_run_after', 'status', 'run_after'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    dedupe_key = db.Column(db.String(200), nullable=False)
+    payload = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending | running | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)  # son sahiplenme (status='running' olduğunda)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class EventOutbox(db.Model):
+    """
+    Canlı olay (SSE) kutusu (services/event_bus.py). Olay üreten istek satırı kendi transaction'ında
+    yazar; her gunicorn worker'ı yeni satırları okuyup kendi SSE aboneleri arasında dağıtır.
+    user_id NULL: tüm admin abonelerine. Satırlar EVENT_RETENTION_SECONDS sonra silinir.
+    """
+    __tablename__ = 'event_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    channel = db.Column(db.String(30), nullable=False)  # heartbeat | notification | ticket | ingest
+    payload = db.Column(db.Text)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 
 class StaffData(db.Model):
@@ -215,11 +375,28 @@ class ServiceHeartbeat(db.Model):
     expected_pings = db.Column(db.Integer, default=0)   # Beklenen ping sayısı (ör: 6 = saatte 6)
     received_pings = db.Column(db.Integer, default=0)   # Gerçekten gelen ping sayısı
     window_start = db.Column(db.DateTime, nullable=True) # Mevcut 1 saatlik pencere başlangıcı
-    # Modül bazlı son ping zamanları: {"counting": "2024-01-01T10:00:00", "heatmap": ..., "queue": ..., "camera": ...}
+    # Eski format (JSON): {"counting": "2024-01-01T10:00:00", ...}. Artık module_ping tablosu kullanılıyor
+    # (migrate_module_pings.py); bu kolon yazılmıyor.
     module_pings = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class ModulePing(db.Model):
+    """
+    Modül bazlı son ping zamanı: (kullanıcı, modül) başına tek satır.
+    last_ping_at index'li: "şu an hangi mağazaların hangi modülü canlı" tek aralık sorgusudur.
+    """
+    __tablename__ = 'module_ping'
+    __table_args__ = (
+        db.Index('ux_module_ping', 'user_id', 'module', unique=True),
+        db.Index('ix_module_ping_last_ping_at', 'last_ping_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    module = db.Column(db.String(30), nullable=False)  # counting | heatmap | queue
+    last_ping_at = db.Column(db.DateTime, nullable=False)
+
+
 class Report(db.Model):
     __tablename__ = 'reports'
     id = db.Column(db.Integer, primary_key=True)
@@ -316,7 +493,13 @@ class Ticket(db.Model):
     closed_at = db.Column(db.DateTime, nullable=True)
     closed_by_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # kim kapattı
 
-    def to_dict(self, include_user=False):
+    __table_args__ = (
+        db.Index('ix_tickets_user_updated', 'user_id', 'updated_at'),
+    )
+
+    def to_dict(self, include_user=False, users=None):
+        """users: {id: User} — listelemede önceden join ile yüklenmiş yazar/kapatan (verilmezse tek tek sorgulanır)."""
+        get_user = users.get if users is not None else User.query.get
         d = {
             'id': self.id,
             'user_id': self.user_id,
@@ -333,7 +516,7 @@ class Ticket(db.Model):
             'closed_at': self.closed_at.isoformat() if self.closed_at else None,
         }
         if self.closed_by_user_id:
-            closer = User.query.get(self.closed_by_user_id)
+            closer = get_user(self.closed_by_user_id)
             if closer:
                 d['closed_by'] = closer.full_name or closer.username or str(closer.id)
                 d['closed_by_role'] = closer.role  # admin, user, brand_manager, store_manager vb.
@@ -344,12 +527,42 @@ class Ticket(db.Model):
             d['closed_by'] = None
             d['closed_by_role'] = None
         if include_user and self.user_id:
-            u = User.query.get(self.user_id)
+            u = get_user(self.user_id)
             if u:
                 d['user'] = {'id': u.id, 'username': u.username, 'email': u.email, 'full_name': u.full_name}
         return d
 
 
+class AlertOutbox(db.Model):
+    """
+    Giden Telegram uyarıları (services/alert_dispatcher.py). Uyarıyı üreten transaction'da eklenir;
+    arka plan kuyruğu sohbet başına toplu gönderir. Gönderilen satır silinir, Telegram'ın kalıcı
+    olarak reddettiği satır status='failed' kalır.
+    """
+    __tablename__ = 'alert_outbox'
+    __table_args__ = (
+        db.Index('ix_alert_outbox_chat_status', 'chat_id', 'status', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.String(64), nullable=False)
+    text = db.Column(db.Text, nullable=False)  # HTML parse_mode
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending | failed
+    sent_parts = db.Column(db.Integer, nullable=False, default=0)  # bölünmüş uzun uyarıda gönderilen parça sayısı
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UnreadCounter(db.Model):
+    """
+    Kullanıcı başına okunmamış bildirim / destek talebi sayısı (menü badge'leri).
+    Bildirim ve ticket değişiklikleriyle aynı transaction'da services/unread_counters.py günceller.
+    """
+    __tablename__ = 'unread_counters'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    notifications = db.Column(db.Integer, default=0, nullable=False)
+    tickets = db.Column(db.Integer, default=0, nullable=False)  # son personel cevabı okunmamış ticket sayısı
+
+
 class Notification(db.Model):
     """Panel içi bildirim (anomali tespiti, sistem uyarıları vb.)"""
     __tablename__ = 'notifications'
@@ -382,6 +595,11 @@ class TicketReply(db.Model):
     is_staff = db.Column(db.Boolean, default=False)  # True = admin cevabı
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # son personel cevabı (okunmamış hesabı)
+        db.Index('ix_ticket_replies_staff', 'ticket_id', 'is_staff', 'created_at'),
+    )
+
     def to_dict(self):
         u = User.query.get(self.user_id)
         return {
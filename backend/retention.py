@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Ham veri saklama politikası / arşiv yönetimi (services/retention_service.py).
+
+Kullanım (backend klasöründe):
+  RAW_RETENTION_DAYS=180 python retention.py run        # eski ham veriyi hemen arşivle
+  python retention.py list                              # arşiv dosyaları
+  python retention.py reattach queue_data 2026-01       # bir ayın arşivini ham tabloya geri yükle
+
+Scheduler RAW_RETENTION_DAYS > 0 ise arşivlemeyi saatlik kendisi çalıştırır; bu script elle
+çalıştırmak ve arşivleri geri yüklemek içindir.
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from services.retention_service import run_retention, list_archives, reattach
+
+app = create_app()
+
+
+def main(args):
+    with app.app_context():
+        if not args or args[0] == 'run':
+            if app.config.get('RAW_RETENTION_DAYS', 0) <= 0:
+                print("RAW_RETENTION_DAYS ayarlı değil (0), işlem yapılmadı.")
+                return 1
+            for table, n in run_retention().items():
+                print(f"OK: {table} {n} satır arşivlendi.")
+        elif args[0] == 'list':
+            for item in list_archives():
+                print(f"{item['table']:<14} {item['month']}  {item['size'] // 1024:>8} KB  {item['path']}")
+        elif args[0] == 'reattach' and len(args) == 3:
+            n = reattach(args[1], args[2])
+            print(f"OK: {args[1]} {args[2]} — {n} satır geri yüklendi.")
+        else:
+            print(__doc__)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -5,10 +5,19 @@ from sqlalchemy import func
 
 from models import db, User, Company, CameraConfig, SiteConfig, ManagedStore, ActivityLog
 from auth_utils import admin_required
+from user_context import invalidate_access_cache
 
 admin_bp = Blueprint('admin', __name__)
 
 
+@admin_bp.after_request
+def _invalidate_access_cache(response):
+    """Kullanıcı / şirket / yönetilen mağaza yazan tüm admin işlemleri erişim kapsamı önbelleğini temizler."""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        invalidate_access_cache()
+    return response
+
+
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def list_users():
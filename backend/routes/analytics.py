@@ -1,12 +1,18 @@
-from flask import Blueprint, request
+from flask import Blueprint, g, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta, date, time
 from collections import defaultdict
 from zoneinfo import ZoneInfo
 from sqlalchemy import func
 
-from models import db, CustomerData, QueueData, HeatmapData, StaffData, Report, SiteConfig
-from user_context import get_resolved_user_ids
+from models import db, CustomerData, CustomerHourly, QueueData, QueueHourly, HeatmapData, HeatmapHourly, StaffData, Report, SiteConfig
+from user_context import get_resolved_user_ids, memoize_scope
+from services.cache_service import cached_response, config_version
+from services.retention_service import is_frozen, ARCHIVED_MESSAGE
+from routes.notifications import enqueue_anomaly_checks
+from services.rollup_service import (
+    refresh_customer_hours, refresh_queue_hours, refresh_heatmap_hours, WAIT_BUCKETS,
+)
 
 
 def _get_work_hours(user_ids: list) -> tuple:
@@ -14,10 +20,16 @@ def _get_work_hours(user_ids: list) -> tuple:
     work_end exclusive: work_end=21 → son slot 20:00 (20-21 periyodu). range(start, end) kullanın."""
     if not user_ids:
         return 10, 22
-    site = SiteConfig.query.filter(SiteConfig.user_id.in_(user_ids)).first()
-    start = site.work_start if site and site.work_start is not None else 10
-    end = site.work_end if site and site.work_end is not None else 22
-    return start, end  # range(start, end) → son slot = end-1
+
+    def load():
+        site = SiteConfig.query.filter(SiteConfig.user_id.in_(user_ids)).first()
+        start = site.work_start if site and site.work_start is not None else 10
+        end = site.work_end if site and site.work_end is not None else 22
+        return start, end
+
+    # Anahtarda ayar sürümü: başka worker'daki mesai saati değişikliği TTL beklemeden görünür
+    key = ('work_hours', tuple(user_ids), config_version(user_ids))
+    return memoize_scope(key, load)  # range(start, end) → son slot = end-1
 
 analytics_bp = Blueprint('analytics', __name__)
 ISTANBUL_TZ = ZoneInfo("Europe/Istanbul")
@@ -60,87 +72,88 @@ def get_customers_latest_date():
 
 
 # --- Customer Analytics ---
-@analytics_bp.route('/customers', methods=['GET'])
-@jwt_required()
-def get_customers():
-    user_ids = _user_ids()
+def _customer_query_spec() -> dict:
+    """
+    get_customers filtrelerini (date / date_from / date_to / camera_id) tek seferde çözer.
+    Dönüş: {'start': datetime|None, 'end': datetime|None, 'camera_id': str|None}
+    Öncelik: date_from+date_to > date_from > date. Geçersiz tarih filtresiz sayılır.
+    """
     date_str = request.args.get('date')
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     camera_id = request.args.get('camera_id')
+    start = end = None
+    try:
+        if date_from and date_to:
+            start, _ = _get_utc_range_for_local_date(datetime.strptime(date_from, '%Y-%m-%d').date())
+            _, end = _get_utc_range_for_local_date(datetime.strptime(date_to, '%Y-%m-%d').date())
+        elif date_from:
+            start, _ = _get_utc_range_for_local_date(datetime.strptime(date_from, '%Y-%m-%d').date())
+        elif date_str:
+            start, end = _get_utc_range_for_local_date(datetime.strptime(date_str, '%Y-%m-%d').date())
+    except ValueError:
+        start = end = None
+    return {
+        'start': start,
+        'end': end,
+        'camera_id': camera_id if camera_id and camera_id != 'all' else None,
+    }
+
+
+def _customer_spec_filters(spec: dict, ts_col, camera_col) -> list:
+    """Spec'i verilen zaman/kamera kolonları için filtre listesine çevirir (ham tablo veya rollup)."""
+    filters = []
+    if spec['start'] is not None:
+        filters.append(ts_col >= spec['start'])
+    if spec['end'] is not None:
+        filters.append(ts_col <= spec['end'])
+    if spec['camera_id']:
+        filters.append(camera_col == spec['camera_id'])
+    return filters
 
-    q = CustomerData.query.filter(CustomerData.user_id.in_(user_ids))
-    
-    # Tarih filtrelemesi
-    if date_from and date_to:
-        try:
-            df = datetime.strptime(date_from, '%Y-%m-%d').date()
-            dt = datetime.strptime(date_to, '%Y-%m-%d').date()
-            utc_start, _ = _get_utc_range_for_local_date(df)
-            _, utc_end = _get_utc_range_for_local_date(dt)
-            q = q.filter(CustomerData.timestamp >= utc_start, CustomerData.timestamp <= utc_end)
-        except ValueError:
-            pass
-    elif date_from:
-        try:
-            df = datetime.strptime(date_from, '%Y-%m-%d').date()
-            utc_start, _ = _get_utc_range_for_local_date(df)
-            q = q.filter(CustomerData.timestamp >= utc_start)
-        except ValueError:
-            pass
-    elif date_str:
-        try:
-            d = datetime.strptime(date_str, '%Y-%m-%d').date()
-            utc_start, utc_end = _get_utc_range_for_local_date(d)
-            q = q.filter(CustomerData.timestamp >= utc_start, CustomerData.timestamp <= utc_end)
-        except ValueError:
-            pass
-            
-    if camera_id and camera_id != 'all':
-        q = q.filter(CustomerData.camera_id == camera_id)
-
-    # --- SQL aggregation: demographics ---
-    from sqlalchemy import func as sqlfunc
-    agg_q = db.session.query(
-        sqlfunc.coalesce(sqlfunc.sum(CustomerData.male_count), 0).label('total_male'),
-        sqlfunc.coalesce(sqlfunc.sum(CustomerData.female_count), 0).label('total_female'),
-        sqlfunc.coalesce(sqlfunc.sum(CustomerData.age_18_30), 0).label('age_18_30'),
-        sqlfunc.coalesce(sqlfunc.sum(CustomerData.age_30_50), 0).label('age_30_50'),
-        sqlfunc.coalesce(sqlfunc.sum(CustomerData.age_50_plus), 0).label('age_50_plus'),
-    ).filter(CustomerData.user_id.in_(user_ids))
-
-    if date_from and date_to:
-        try:
-            df2 = datetime.strptime(date_from, '%Y-%m-%d').date()
-            dt2 = datetime.strptime(date_to, '%Y-%m-%d').date()
-            s2, _ = _get_utc_range_for_local_date(df2)
-            _, e2 = _get_utc_range_for_local_date(dt2)
-            agg_q = agg_q.filter(CustomerData.timestamp >= s2, CustomerData.timestamp <= e2)
-        except ValueError:
-            pass
-    elif date_from:
-        try:
-            df2 = datetime.strptime(date_from, '%Y-%m-%d').date()
-            s2, _ = _get_utc_range_for_local_date(df2)
-            agg_q = agg_q.filter(CustomerData.timestamp >= s2)
-        except ValueError:
-            pass
-    elif date_str:
-        try:
-            d2 = datetime.strptime(date_str, '%Y-%m-%d').date()
-            s2, e2 = _get_utc_range_for_local_date(d2)
-            agg_q = agg_q.filter(CustomerData.timestamp >= s2, CustomerData.timestamp <= e2)
-        except ValueError:
-            pass
-    if camera_id and camera_id != 'all':
-        agg_q = agg_q.filter(CustomerData.camera_id == camera_id)
 
-    agg_row = agg_q.first()
-    total_male = int(agg_row.total_male or 0)
-    total_female = int(agg_row.total_female or 0)
-    age_18_30 = int(agg_row.age_18_30 or 0)
-    age_30_50 = int(agg_row.age_30_50 or 0)
-    age_50_plus = int(agg_row.age_50_plus or 0)
+def _customer_cameras(user_ids) -> list:
+    """Kullanıcıların kamera listesi (rollup'tan, tarihten bağımsız). İstek boyunca bir kez sorgulanır."""
+    key = tuple(sorted({int(u) for u in user_ids}))
+    memo = g.setdefault('_customer_cameras', {})
+    if key not in memo:
+        memo[key] = [r.camera_id for r in db.session.query(CustomerHourly.camera_id).filter(
+            CustomerHourly.user_id.in_(key),
+            CustomerHourly.camera_id != '',
+        ).distinct().all()]
+    return memo[key]
+
+
+@analytics_bp.route('/customers', methods=['GET'])
+@jwt_required()
+@cached_response(date_scoped=True, extra=lambda user_ids, start, end: tuple(_customer_cameras(user_ids)))
+def get_customers():
+    user_ids = _user_ids()
+    spec = _customer_query_spec()
+
+    # --- Demografi + saatlik akış: saatlik rollup üzerinde tek GROUP BY (günün saati) ---
+    # Toplamlar saat gruplarının toplamıdır; ayrı bir toplam sorgusu gerekmez.
+    from sqlalchemy import extract
+    hour_of_day = extract('hour', CustomerHourly.hour)
+    hourly_rows = db.session.query(
+        hour_of_day.label('hour'),
+        func.sum(CustomerHourly.entered).label('entering'),
+        func.sum(CustomerHourly.exited).label('exiting'),
+        func.sum(CustomerHourly.male_count).label('male'),
+        func.sum(CustomerHourly.female_count).label('female'),
+        func.sum(CustomerHourly.age_18_30).label('age_18_30'),
+        func.sum(CustomerHourly.age_30_50).label('age_30_50'),
+        func.sum(CustomerHourly.age_50_plus).label('age_50_plus'),
+    ).filter(
+        CustomerHourly.user_id.in_(user_ids),
+        *_customer_spec_filters(spec, CustomerHourly.hour, CustomerHourly.camera_id),
+    ).group_by(hour_of_day).order_by(hour_of_day).all()
+
+    total_male = sum(int(r.male or 0) for r in hourly_rows)
+    total_female = sum(int(r.female or 0) for r in hourly_rows)
+    age_18_30 = sum(int(r.age_18_30 or 0) for r in hourly_rows)
+    age_30_50 = sum(int(r.age_30_50 or 0) for r in hourly_rows)
+    age_50_plus = sum(int(r.age_50_plus or 0) for r in hourly_rows)
 
     demographics = {
         'ageGroupsChart': [
@@ -154,57 +167,19 @@ def get_customers():
         ],
     }
 
-    # --- SQL aggregation: saatlik akis (GROUP BY hour) ---
-    from sqlalchemy import extract, cast, Integer
-    hourly_agg = db.session.query(
-        extract('hour', CustomerData.timestamp).label('hour'),
-        sqlfunc.coalesce(sqlfunc.sum(CustomerData.entered), 0).label('entering'),
-        sqlfunc.coalesce(sqlfunc.sum(CustomerData.exited), 0).label('exiting'),
-    ).filter(CustomerData.user_id.in_(user_ids))
-
-    if date_from and date_to:
-        try:
-            df3 = datetime.strptime(date_from, '%Y-%m-%d').date()
-            dt3 = datetime.strptime(date_to, '%Y-%m-%d').date()
-            s3, _ = _get_utc_range_for_local_date(df3)
-            _, e3 = _get_utc_range_for_local_date(dt3)
-            hourly_agg = hourly_agg.filter(CustomerData.timestamp >= s3, CustomerData.timestamp <= e3)
-        except ValueError:
-            pass
-    elif date_from:
-        try:
-            df3 = datetime.strptime(date_from, '%Y-%m-%d').date()
-            s3, _ = _get_utc_range_for_local_date(df3)
-            hourly_agg = hourly_agg.filter(CustomerData.timestamp >= s3)
-        except ValueError:
-            pass
-    elif date_str:
-        try:
-            d3 = datetime.strptime(date_str, '%Y-%m-%d').date()
-            s3, e3 = _get_utc_range_for_local_date(d3)
-            hourly_agg = hourly_agg.filter(CustomerData.timestamp >= s3, CustomerData.timestamp <= e3)
-        except ValueError:
-            pass
-    if camera_id and camera_id != 'all':
-        hourly_agg = hourly_agg.filter(CustomerData.camera_id == camera_id)
-
-    hourly_agg = hourly_agg.group_by(extract('hour', CustomerData.timestamp)).order_by(extract('hour', CustomerData.timestamp))
-    hourly_rows = hourly_agg.all()
-
     hourly_customer_flow = [
-        {'hour': f'{int(r.hour):02d}:00', 'entering': int(r.entering), 'exiting': int(r.exiting)}
+        {'hour': f'{int(r.hour):02d}:00', 'entering': int(r.entering or 0), 'exiting': int(r.exiting or 0)}
         for r in hourly_rows
     ]
 
-    # Camera list (distinct, fast)
-    cam_rows = db.session.query(CustomerData.camera_id).filter(
-        CustomerData.user_id.in_(user_ids),
-        CustomerData.camera_id.isnot(None)
-    ).distinct().all()
-    all_cameras = [r.camera_id for r in cam_rows if r.camera_id]
+    # Camera list (distinct, rollup üzerinden; tarih aralığından bağımsız)
+    all_cameras = _customer_cameras(user_ids)
 
     # Only return minimal row data needed by frontend (limit 500 for display)
-    rows = q.order_by(CustomerData.timestamp.desc()).limit(500).all()
+    rows = CustomerData.query.filter(
+        CustomerData.user_id.in_(user_ids),
+        *_customer_spec_filters(spec, CustomerData.timestamp, CustomerData.camera_id),
+    ).order_by(CustomerData.timestamp.desc()).limit(500).all()
     data = [
         {
             'id': r.id,
@@ -252,18 +227,17 @@ def _to_istanbul_local_naive(dt_val):
     return dt_val
 
 
-@analytics_bp.route('/customers', methods=['POST'])
-@jwt_required()
-def post_customer():
-    """
-    Müşteri verisi ekleme.
-    ÖNEMLİ: Script'ten gelen timestamp'i (örn. '2026-03-09T10:00') doğrudan kullan.
-    Daha önce parse hatası yüzünden timestamp boş kalıp datetime.utcnow() ile BUGÜNE yazılıyordu.
-    """
-    target_user_id = get_jwt_identity()
-    data = request.get_json() or {}
+# Toplu gönderimde tek istekte kabul edilen en fazla kayıt sayısı
+MAX_BATCH_ROWS = 5000
 
-    ts_raw = data.get('timestamp')
+_CUSTOMER_INT_FIELDS = (
+    'customers_inside', 'male_count', 'female_count',
+    'age_18_30', 'age_30_50', 'age_50_plus', 'entered', 'exited',
+)
+
+
+def _parse_ingest_timestamp(ts_raw):
+    """Gönderilen timestamp'i Europe/Istanbul naive datetime'a çevirir. Boş/geçersizse None."""
     ts = None
     if ts_raw:
         try:
@@ -271,51 +245,237 @@ def post_customer():
             ts = datetime.fromisoformat(str(ts_raw))
         except Exception:
             ts = _parse_timestamp(ts_raw)
-    ts = _to_istanbul_local_naive(ts)
+    return _to_istanbul_local_naive(ts)
+
 
-    r = CustomerData(
-        user_id=target_user_id,
+def _int_field(data: dict, key: str, default=0):
+    """Sayısal alanı int'e çevirir; geçersizse ValueError (alan adı ile)."""
+    val = data.get(key)
+    if val is None or val == '':
+        return default
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} sayısal olmalı')
+
+
+_TRUE_VALUES = {'true', '1', 'yes', 'evet'}
+_FALSE_VALUES = {'false', '0', 'no', 'hayir', 'hayır'}
+
+
+def _bool_field(data: dict, key: str, default=False) -> bool:
+    """Boolean alanı çözer: bool, 0/1 veya 'true'/'false' (vb.) metni; başka değerde ValueError."""
+    val = data.get(key)
+    if val is None or val == '':
+        return default
+    if isinstance(val, bool):
+        return val
+    if isinstance(val, (int, float)) and val in (0, 1):
+        return bool(val)
+    if isinstance(val, str):
+        text = val.strip().lower()
+        if text in _TRUE_VALUES:
+            return True
+        if text in _FALSE_VALUES:
+            return False
+    raise ValueError(f'{key} true/false olmalı')
+
+
+def _idempotency_key(data: dict, ts, *parts):
+    """
+    Tekrar gönderimlerde çift kayıt oluşmaması için anahtar.
+    İstemci 'idempotency_key' gönderdiyse o kullanılır; yoksa timestamp açıkça verilmişse
+    kaynak (kamera/kasa/bölge) + timestamp'ten türetilir. Aynı periyodun tekrar gönderimi
+    aynı anahtarı üretir. Timestamp yoksa (sunucu saati) anahtar üretilmez.
+    """
+    client_key = data.get('idempotency_key')
+    if client_key:
+        return str(client_key)[:200]
+    if ts is None:
+        return None
+    return '|'.join([str(p or '') for p in parts] + [ts.isoformat(timespec='seconds')])[:200]
+
+
+def _customer_values(data: dict, user_id) -> dict:
+    """Tek müşteri kaydı payload'ından CustomerData kolon değerlerini üretir; geçersizse ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError('Kayıt JSON nesnesi olmalı')
+    ts = _parse_ingest_timestamp(data.get('timestamp'))
+    values = {k: _int_field(data, k) for k in _CUSTOMER_INT_FIELDS}
+    try:
+        purchase_amount = float(data.get('purchase_amount', 0) or 0)
+    except (TypeError, ValueError):
+        raise ValueError('purchase_amount sayısal olmalı')
+    values.update(
+        user_id=int(user_id),
         timestamp=ts if ts else datetime.utcnow(),
         camera_id=data.get('camera_id'),
         location=data.get('location'),
-        customers_inside=data.get('customers_inside', 0),
-        male_count=data.get('male_count', 0),
-        female_count=data.get('female_count', 0),
-        age_18_30=data.get('age_18_30', 0),
-        age_30_50=data.get('age_30_50', 0),
-        age_50_plus=data.get('age_50_plus', 0),
         zone_visited=data.get('zone_visited'),
-        purchase_amount=data.get('purchase_amount', 0),
-        is_returning=data.get('is_returning', False),
-        satisfaction_score=data.get('satisfaction_score'),
-        entered=data.get('entered', 0),
-        exited=data.get('exited', 0),
+        purchase_amount=purchase_amount,
+        is_returning=_bool_field(data, 'is_returning'),
+        satisfaction_score=_int_field(data, 'satisfaction_score', None),
+        idempotency_key=_idempotency_key(data, ts, data.get('camera_id')),
     )
-    db.session.add(r)
-    db.session.commit()
+    return values
 
-    # Anomali tespiti: veri geldikten sonra arka planda kontrol et
-    try:
-        from routes.notifications import check_anomalies_for_user
-        from models import User
-        user = User.query.get(int(target_user_id))
-        user_name = (user.full_name or user.username) if user else ''
-        check_anomalies_for_user(int(target_user_id), user_name, data_timestamp=r.timestamp)
-    except Exception as e:
-        print(f"[Anomaly Check] Hata: {e}")
 
-    # Heartbeat güncelle
+def _save_facts(model, values_list: list) -> list:
+    """
+    Ham veri satırlarını tek transaction içinde yazar, values_list ile aynı sırada id listesi döner.
+    idempotency_key'i olan satırlar (user_id, idempotency_key) üzerinden ON CONFLICT ile upsert edilir:
+    tekrar gönderim yeni satır açmaz, mevcut satırı günceller. Anahtarsız satırlar düz insert edilir.
+    Bölümlenmiş PostgreSQL tablosunda unique index bölüm anahtarını da içerir (services/pg_partitions.py).
+    Commit etmez.
+    """
+    from db_utils import upsert
+    from services.pg_partitions import partition_key
+    keyed = [v for v in values_list if v.get('idempotency_key')]
+    ids_by_key = {}
+    if keyed:
+        key = partition_key(model)
+        returned = upsert(
+            model, keyed, ['user_id', 'idempotency_key'] + ([key] if key else []),
+            returning=[model.id, model.user_id, model.idempotency_key],
+        )
+        ids_by_key = {(r.user_id, r.idempotency_key): r.id for r in returned}
+    plain = [model(**v) for v in values_list if not v.get('idempotency_key')]
+    if plain:
+        db.session.add_all(plain)
+        db.session.flush()
+    plain_iter = iter(plain)
+    return [
+        ids_by_key.get((v['user_id'], v['idempotency_key'])) if v.get('idempotency_key') else next(plain_iter).id
+        for v in values_list
+    ]
+
+
+def _read_batch_records():
+    """
+    Toplu gönderim gövdesini okur. Desteklenen formatlar:
+    - JSON dizi: [{...}, {...}]
+    - JSON nesne: {"records": [{...}, ...]}
+    - NDJSON (Content-Type: application/x-ndjson): her satırda bir JSON kayıt
+    Returns: (kayıt listesi, hata mesajı). Parse edilemeyen NDJSON satırları kayıt yerine
+    ValueError olarak listeye konur, böylece satır bazlı hata dönebilir.
+    """
+    import json
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines'):
+        records = []
+        for line in request.get_data(as_text=True).splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                records.append(ValueError('Geçersiz JSON satırı'))
+    else:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            body = body.get('records')
+        if not isinstance(body, list):
+            return None, 'Gövde kayıt dizisi (veya {"records": [...]}) olmalı'
+        records = body
+    if not records:
+        return None, 'Kayıt bulunamadı'
+    if len(records) > MAX_BATCH_ROWS:
+        return None, f'Tek istekte en fazla {MAX_BATCH_ROWS} kayıt gönderilebilir'
+    return records, None
+
+
+def _after_customer_ingest(user_id: int):
+    """Ingest sonrası yan işler: heartbeat. (Anomali kontrolü commit öncesi kuyruğa eklenir.)"""
     try:
         from routes.health import update_module_heartbeat
-        update_module_heartbeat(int(target_user_id), 'counting')
+        update_module_heartbeat(int(user_id), 'counting')
     except Exception as e:
         print(f"[Heartbeat Auto-Update] Hata: {e}")
 
-    return {'id': r.id, 'message': 'Kaydedildi'}, 201
+
+@analytics_bp.route('/customers', methods=['POST'])
+@jwt_required()
+def post_customer():
+    """
+    Müşteri verisi ekleme.
+    ÖNEMLİ: Script'ten gelen timestamp'i (örn. '2026-03-09T10:00') doğrudan kullan.
+    Daha önce parse hatası yüzünden timestamp boş kalıp datetime.utcnow() ile BUGÜNE yazılıyordu.
+    Aynı kamera + timestamp (veya aynı idempotency_key) tekrar gelirse mevcut kayıt güncellenir.
+    """
+    target_user_id = get_jwt_identity()
+    data = request.get_json() or {}
+
+    try:
+        values = _customer_values(data, target_user_id)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    rid = _save_facts(CustomerData, [values])[0]
+    refresh_customer_hours([(values['user_id'], values['timestamp'])])
+    enqueue_anomaly_checks(target_user_id, [values['timestamp']])
+    db.session.commit()
+
+    _after_customer_ingest(target_user_id)
+
+    return {'id': rid, 'message': 'Kaydedildi'}, 201
+
+
+@analytics_bp.route('/customers/batch', methods=['POST'])
+@jwt_required()
+def post_customer_batch():
+    """
+    Toplu müşteri verisi ekleme (gün sonu / geriye dönük doldurma için).
+    Tüm kayıtlar tek geçişte doğrulanır, geçerli olanlar tek transaction'da yazılır.
+    Anomali kontrolü saat başına bir kez kuyruğa eklenir, heartbeat istek başına bir kez yapılır.
+    Yanıt: {"results": [{"index": 0, "id": 12} | {"index": 1, "error": "..."}], "inserted": N, "failed": M}
+    """
+    target_user_id = get_jwt_identity()
+    records, err = _read_batch_records()
+    if err:
+        return {'error': err}, 400
+
+    results = []
+    valid = []
+    for i, item in enumerate(records):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            values = _customer_values(item, target_user_id)
+            if is_frozen(CustomerData, values['timestamp']):
+                raise ValueError(ARCHIVED_MESSAGE)
+            valid.append((i, values))
+        except ValueError as e:
+            results.append({'index': i, 'error': str(e)})
+
+    if valid:
+        ids = _save_facts(CustomerData, [v for _, v in valid])
+        refresh_customer_hours([(v['user_id'], v['timestamp']) for _, v in valid])
+        enqueue_anomaly_checks(target_user_id, [v['timestamp'] for _, v in valid])
+        db.session.commit()
+        results.extend({'index': i, 'id': rid} for (i, _), rid in zip(valid, ids))
+        _after_customer_ingest(target_user_id)
+
+    results.sort(key=lambda x: x['index'])
+    inserted = len(valid)
+    return {
+        'results': results,
+        'inserted': inserted,
+        'failed': len(results) - inserted,
+        'message': 'Kaydedildi' if inserted else 'Kayıt eklenmedi',
+    }, (201 if inserted else 400)
+
+
+def _flow_days():
+    """get_flow_data'nın okuduğu günler: date_from ve karşılaştırma günleri (30 gün öncesine kadar)."""
+    try:
+        d = datetime.strptime(request.args.get('date_from') or '', '%Y-%m-%d').date()
+    except ValueError:
+        return None, None
+    return d - timedelta(days=30), d
 
 
 @analytics_bp.route('/customers/flow-data', methods=['GET'])
 @jwt_required()
+@cached_response(days=_flow_days)
 def get_flow_data():
     """Günlük akış: tarih ve saate göre gruplar. Saat saat (10–23) döner; veri yoksa 0.
     Veritabanında saatlik veri için: POST /customers ile her saat için ayrı kayıt atılmalı (timestamp o saatin başı)."""
@@ -323,35 +483,34 @@ def get_flow_data():
     date_from = request.args.get('date_from')
     camera_id = request.args.get('camera_id')
 
-    q = CustomerData.query.filter(CustomerData.user_id.in_(user_ids))
+    # Saatlik rollup tablosundan okunur (ham customer_data taranmaz)
+    q = CustomerHourly.query.filter(CustomerHourly.user_id.in_(user_ids))
     if date_from:
         try:
             d = datetime.strptime(date_from, '%Y-%m-%d').date()
             utc_start, utc_end = _get_utc_range_for_local_date(d)
-            q = q.filter(CustomerData.timestamp >= utc_start, CustomerData.timestamp <= utc_end)
+            q = q.filter(CustomerHourly.hour >= utc_start, CustomerHourly.hour <= utc_end)
         except ValueError:
             pass
     if camera_id and camera_id != 'all':
-        q = q.filter(CustomerData.camera_id == camera_id)
+        q = q.filter(CustomerHourly.camera_id == camera_id)
 
-    rows = q.order_by(CustomerData.timestamp).limit(500).all()
+    rows = q.order_by(CustomerHourly.hour).limit(500).all()
 
     # Tarih bazında grupla: data[dateStr] = { summary, hourly_data }
     result_data = {}
     by_date_hour = defaultdict(lambda: {'entered': 0, 'exited': 0, 'editable_id': None})
 
     for r in rows:
-        if not r.timestamp:
-            continue
-        # Veritabanındaki timestamp zaten yerel saati temsil eder (naive)
-        local_ts = r.timestamp
-        date_str = local_ts.strftime('%Y-%m-%d')
-        hour_str = local_ts.strftime('%H:00')
+        # Veritabanındaki saat zaten yerel saati temsil eder (naive)
+        date_str = r.hour.strftime('%Y-%m-%d')
+        hour_str = r.hour.strftime('%H:00')
         key = (date_str, hour_str)
-        by_date_hour[key]['entered'] += getattr(r, 'entered', 0) or 0
-        by_date_hour[key]['exited'] += getattr(r, 'exited', 0) or 0
-        if by_date_hour[key]['editable_id'] is None:
-            by_date_hour[key]['editable_id'] = r.id
+        by_date_hour[key]['entered'] += r.entered or 0
+        by_date_hour[key]['exited'] += r.exited or 0
+        if r.editable_id is not None:
+            cur = by_date_hour[key]['editable_id']
+            by_date_hour[key]['editable_id'] = r.editable_id if cur is None else min(cur, r.editable_id)
 
     for (date_str, hour_str), v in by_date_hour.items():
         if date_str not in result_data:
@@ -391,15 +550,18 @@ def get_flow_data():
                 today_exited = result_data[date_from]['summary']['total_exited']
 
             for period_label, comp_date in compare_periods:
-                comp_q = CustomerData.query.filter(
-                    CustomerData.user_id.in_(user_ids),
-                    db.func.date(CustomerData.timestamp) == comp_date,
+                comp_start, comp_end = _get_utc_range_for_local_date(comp_date)
+                comp_q = db.session.query(
+                    func.coalesce(func.sum(CustomerHourly.entered), 0),
+                    func.coalesce(func.sum(CustomerHourly.exited), 0),
+                ).filter(
+                    CustomerHourly.user_id.in_(user_ids),
+                    CustomerHourly.hour >= comp_start,
+                    CustomerHourly.hour <= comp_end,
                 )
                 if camera_id and camera_id != 'all':
-                    comp_q = comp_q.filter(CustomerData.camera_id == camera_id)
-                comp_rows = comp_q.all()
-                comp_entered = sum(getattr(r, 'entered', 0) or 0 for r in comp_rows)
-                comp_exited = sum(getattr(r, 'exited', 0) or 0 for r in comp_rows)
+                    comp_q = comp_q.filter(CustomerHourly.camera_id == camera_id)
+                comp_entered, comp_exited = comp_q.one()
 
                 entered_change = None
                 if comp_entered > 0:
@@ -426,8 +588,11 @@ def get_flow_data():
 def customer_record(rid):
     uids = _user_ids()
     r = CustomerData.query.filter(CustomerData.id == rid, CustomerData.user_id.in_(uids)).first_or_404()
+    touched = [(r.user_id, r.timestamp)]
     if request.method == 'DELETE':
         db.session.delete(r)
+        db.session.flush()
+        refresh_customer_hours(touched)
         db.session.commit()
         return {'message': 'Silindi'}
     data = request.get_json() or {}
@@ -435,6 +600,8 @@ def customer_record(rid):
         r.entered = int(data['entering']) if data['entering'] is not None else 0
     if 'exiting' in data:
         r.exited = int(data['exiting']) if data['exiting'] is not None else 0
+    db.session.flush()
+    refresh_customer_hours(touched)
     db.session.commit()
     return {'message': 'Güncellendi'}
 
@@ -553,6 +720,8 @@ def edit_customer_hourly():
             )
             db.session.add(new_row)
 
+    db.session.flush()
+    refresh_customer_hours([(u, start_dt) for u in {int(uids[0])} | {r.user_id for r in rows}])
     db.session.commit()
     return {'message': 'Saatlik toplam güncellendi', 'date': date_str, 'hour': hour_str}
 
@@ -623,6 +792,8 @@ def edit_queue_hourly():
         )
         db.session.add(new_row)
 
+    db.session.flush()
+    refresh_queue_hours([(u, start_dt) for u in {int(uids[0])} | {r.user_id for r in rows}])
     db.session.commit()
     return {'message': 'Saatlik kuyruk toplamı güncellendi', 'date': date_str, 'hour': hour_str}
 
@@ -693,6 +864,8 @@ def edit_heatmap_hourly():
         )
         db.session.add(new_row)
 
+    db.session.flush()
+    refresh_heatmap_hours([(u, start_dt) for u in {int(uids[0])} | {r.user_id for r in rows}])
     db.session.commit()
     return {'message': 'Saatlik heatmap güncellendi', 'date': date_str, 'hour': hour_str}
 @analytics_bp.route('/queues/latest-date', methods=['GET'])
@@ -755,156 +928,161 @@ def get_queues():
 @analytics_bp.route('/queues', methods=['POST'])
 @jwt_required()
 def post_queue():
+    """Kuyruk verisi ekleme. Aynı kasa + müşteri + timestamp (veya idempotency_key) tekrar gelirse güncellenir."""
     data = request.get_json() or {}
-    ts_raw = data.get('timestamp')
-    ts = None
-    if ts_raw:
-        try:
-            ts = datetime.fromisoformat(str(ts_raw))
-        except Exception:
-            ts = _parse_timestamp(ts_raw)
-    ts = _to_istanbul_local_naive(ts)
-    enter_time = datetime.fromisoformat(data['enter_time']) if data.get('enter_time') else None
-    exit_time = datetime.fromisoformat(data['exit_time']) if data.get('exit_time') else None
-    enter_time = _to_istanbul_local_naive(enter_time)
-    exit_time = _to_istanbul_local_naive(exit_time)
-    r = QueueData(
-        user_id=get_jwt_identity(),
+    ts = _parse_ingest_timestamp(data.get('timestamp'))
+    try:
+        enter_time = datetime.fromisoformat(data['enter_time']) if data.get('enter_time') else None
+        exit_time = datetime.fromisoformat(data['exit_time']) if data.get('exit_time') else None
+        wait_time = float(data.get('wait_time', 0) or 0)
+        total_customers = int(data.get('total_customers', 1) or 1)
+    except (TypeError, ValueError):
+        return {'error': 'enter_time/exit_time/wait_time/total_customers geçersiz'}, 400
+    user_id = int(get_jwt_identity())
+    values = dict(
+        user_id=user_id,
         customer_id=data.get('customer_id'),
-        enter_time=enter_time,
-        exit_time=exit_time,
-        wait_time=float(data.get('wait_time', 0) or 0),
+        enter_time=_to_istanbul_local_naive(enter_time),
+        exit_time=_to_istanbul_local_naive(exit_time),
+        wait_time=wait_time,
         queue_position=data.get('queue_position'),
         cashier_id=data.get('cashier_id'),
         status=data.get('status'),
-        total_customers=int(data.get('total_customers', 1) or 1),
+        total_customers=total_customers,
         recorded_at=ts if ts else datetime.utcnow(),
+        idempotency_key=_idempotency_key(data, ts, data.get('cashier_id'), data.get('customer_id')),
     )
-    db.session.add(r)
+    rid = _save_facts(QueueData, [values])[0]
+    refresh_queue_hours([(user_id, values['recorded_at'])])
     db.session.commit()
 
     # Heartbeat güncelle
     try:
         from routes.health import update_module_heartbeat
-        update_module_heartbeat(int(r.user_id), 'queue')
+        update_module_heartbeat(user_id, 'queue')
     except Exception as e:
         print(f"[Heartbeat Auto-Update] Hata: {e}")
 
-    return {'id': r.id, 'message': 'Kaydedildi'}, 201
+    return {'id': rid, 'message': 'Kaydedildi'}, 201
+
+
+def _empty_queue_hour():
+    return {'totalCustomers': 0, 'wait_sum': 0, 'minWaitTime': None, 'maxWaitTime': 0, 'editable_id': None}
+
+
+def _queue_summary_groups(user_ids, hour_range):
+    """queue_hourly'yi SQL'de (günün saati, kasa) bazında toplar; en fazla 24 × kasa sayısı satır döner."""
+    from sqlalchemy import extract
+    hour_of_day = extract('hour', QueueHourly.hour)
+    q = db.session.query(
+        hour_of_day.label('hod'),
+        QueueHourly.cashier_id,
+        func.sum(QueueHourly.customers).label('customers'),
+        func.sum(QueueHourly.wait_weighted_sum).label('wait_weighted_sum'),
+        func.sum(QueueHourly.wait_nonzero_sum).label('wait_nonzero_sum'),
+        func.sum(QueueHourly.wait_nonzero_count).label('wait_nonzero_count'),
+        func.min(QueueHourly.wait_min).label('wait_min'),
+        func.max(QueueHourly.wait_max).label('wait_max'),
+        func.min(QueueHourly.editable_id).label('editable_id'),
+        *(func.sum(getattr(QueueHourly, col)).label(col) for _, _, col, _ in WAIT_BUCKETS),
+    ).filter(QueueHourly.user_id.in_(user_ids))
+    if hour_range:
+        q = q.filter(QueueHourly.hour >= hour_range[0], QueueHourly.hour <= hour_range[1])
+    return q.group_by(hour_of_day, QueueHourly.cashier_id).all()
+
+
+def _queue_aggregate_rows(groups, cashier):
+    """_queue_summary_groups satırlarından özet toplamları (queues_daily_summary)."""
+    # Tüm kasalar her zaman listede olsun (kasa filtresine bakılmadan, sadece tarihe göre)
+    all_cashiers = sorted({r.cashier_id for r in groups if r.cashier_id})
+    rows = [r for r in groups if r.cashier_id == cashier] if cashier else groups
+
+    by_hour = defaultdict(_empty_queue_hour)
+    by_cashier = defaultdict(lambda: {'totalCustomers': 0, 'wait_sum': 0})
+    for r in rows:
+        v = by_hour[int(r.hod)]
+        v['totalCustomers'] += r.customers or 0
+        v['wait_sum'] += r.wait_weighted_sum or 0
+        if r.wait_min is not None:
+            v['minWaitTime'] = r.wait_min if v['minWaitTime'] is None else min(v['minWaitTime'], r.wait_min)
+        v['maxWaitTime'] = max(v['maxWaitTime'], r.wait_max or 0)
+        if r.editable_id is not None:
+            v['editable_id'] = r.editable_id if v['editable_id'] is None else min(v['editable_id'], r.editable_id)
+        c = by_cashier[r.cashier_id or 'Bilinmeyen']
+        c['totalCustomers'] += r.customers or 0
+        c['wait_sum'] += r.wait_weighted_sum or 0
+
+    return {
+        'all_cashiers': all_cashiers,
+        'by_hour': by_hour,
+        'by_cashier': by_cashier,
+        'totalCustomers': sum(r.customers or 0 for r in rows),
+        'wait_nonzero_count': sum(r.wait_nonzero_count or 0 for r in rows),
+        'wait_nonzero_sum': sum(r.wait_nonzero_sum or 0 for r in rows),
+        'maxWaitTime': max((r.wait_max or 0) for r in rows) if rows else 0,
+        'distribution': {col: sum(getattr(r, col) or 0 for r in rows) for _, _, col, _ in WAIT_BUCKETS},
+    }
 
 
 @analytics_bp.route('/queues/daily-summary', methods=['GET'])
 @jwt_required()
+@cached_response(date_scoped=True)
 def queues_daily_summary():
+    """
+    Kuyruk günlük/aralık özeti. Ham queue_data yerine saatlik rollup (queue_hourly) okunur; satırlar
+    SQL'de (günün saati, kasa) bazında gruplanır, Python yalnızca grup satırlarını birleştirir.
+    """
     user_ids = _user_ids()
     date_val = request.args.get('date_from') or request.args.get('date')
     date_to = request.args.get('date_to')
     cashier_ids = request.args.get('cashier_ids')
+    cashier = cashier_ids if cashier_ids and cashier_ids != 'all' else None
 
-    q = QueueData.query.filter(QueueData.user_id.in_(user_ids))
+    hour_range = None
     if date_val:
         try:
             d = datetime.strptime(date_val, '%Y-%m-%d').date()
-            if date_to:
-                d_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                utc_start, _ = _get_utc_range_for_local_date(d)
-                _, utc_end = _get_utc_range_for_local_date(d_to)
-                q = q.filter(db.func.coalesce(QueueData.recorded_at, QueueData.created_at) >= utc_start, 
-                             db.func.coalesce(QueueData.recorded_at, QueueData.created_at) <= utc_end)
-            else:
-                utc_start, utc_end = _get_utc_range_for_local_date(d)
-                q = q.filter(db.func.coalesce(QueueData.recorded_at, QueueData.created_at) >= utc_start, 
-                             db.func.coalesce(QueueData.recorded_at, QueueData.created_at) <= utc_end)
+            d_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else d
+            utc_start, _ = _get_utc_range_for_local_date(d)
+            _, utc_end = _get_utc_range_for_local_date(d_to)
+            hour_range = (utc_start, utc_end)
         except ValueError:
             pass
-    # Tüm kasalar her zaman listede olsun (kasa filtresine bakılmadan, sadece tarihe göre)
-    q_all_cashiers = QueueData.query.filter(QueueData.user_id.in_(user_ids))
-    if date_val:
-        try:
-            d = datetime.strptime(date_val, '%Y-%m-%d').date()
-            if date_to:
-                d_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                utc_start, _ = _get_utc_range_for_local_date(d)
-                _, utc_end = _get_utc_range_for_local_date(d_to)
-                q_all_cashiers = q_all_cashiers.filter(db.func.coalesce(QueueData.recorded_at, QueueData.created_at) >= utc_start, 
-                                                       db.func.coalesce(QueueData.recorded_at, QueueData.created_at) <= utc_end)
-            else:
-                utc_start, utc_end = _get_utc_range_for_local_date(d)
-                q_all_cashiers = q_all_cashiers.filter(db.func.coalesce(QueueData.recorded_at, QueueData.created_at) >= utc_start, 
-                                                       db.func.coalesce(QueueData.recorded_at, QueueData.created_at) <= utc_end)
-        except ValueError:
-            pass
-    all_cashiers = sorted(set(r[0] for r in q_all_cashiers.with_entities(QueueData.cashier_id).distinct().all() if r[0]))
 
-    if cashier_ids and cashier_ids != 'all':
-        q = q.filter(QueueData.cashier_id == cashier_ids)
-
-    rows = q.all()
-
-    from collections import defaultdict
-    by_hour = defaultdict(lambda: {'totalCustomers': 0, 'wait_sum': 0, 'minWaitTime': float('inf'), 'maxWaitTime': 0, 'editable_id': None})
-    for r in rows:
-        dt = getattr(r, 'recorded_at', None) or r.created_at
-        h = dt.strftime('%H') if dt else '00'
-        cnt = getattr(r, 'total_customers', None) or 1
-        wt = r.wait_time or 0
-        by_hour[h]['totalCustomers'] += cnt
-        by_hour[h]['wait_sum'] += wt * cnt
-        by_hour[h]['minWaitTime'] = min(by_hour[h]['minWaitTime'], wt) if wt else by_hour[h]['minWaitTime']
-        by_hour[h]['maxWaitTime'] = max(by_hour[h]['maxWaitTime'], wt)
-        if by_hour[h]['editable_id'] is None:
-            by_hour[h]['editable_id'] = r.id
+    agg = _queue_aggregate_rows(_queue_summary_groups(user_ids, hour_range), cashier)
 
+    by_hour = agg['by_hour']
     _wh_start, _wh_end = _get_work_hours(user_ids)
     hourly = []
     for h in range(_wh_start, _wh_end):
-        key = str(h)
-        v = by_hour[key]
+        v = by_hour[h]
         avg_wt = v['wait_sum'] / v['totalCustomers'] if v['totalCustomers'] > 0 else 0
         hourly.append({
             'hour': f'{h}:00',
             'totalCustomers': v['totalCustomers'],
             'avgWaitTime': round(avg_wt, 1),
-            'minWaitTime': v['minWaitTime'] if v['minWaitTime'] != float('inf') else 0,
+            'minWaitTime': v['minWaitTime'] or 0,
             'maxWaitTime': v['maxWaitTime'],
             'editable_id': v['editable_id'],
         })
 
-    total_cust = sum(getattr(r, 'total_customers', 1) or 1 for r in rows)
-    waits = [r.wait_time for r in rows if r.wait_time]
-    avg_wait = sum(waits) / len(waits) if waits else 0
+    nz_count = agg['wait_nonzero_count']
+    avg_wait = agg['wait_nonzero_sum'] / nz_count if nz_count else 0
 
-    by_cashier = defaultdict(lambda: {'totalCustomers': 0, 'wait_sum': 0})
-    for r in rows:
-        cid = r.cashier_id or 'Bilinmeyen'
-        cnt = getattr(r, 'total_customers', 1) or 1
-        by_cashier[cid]['totalCustomers'] += cnt
-        by_cashier[cid]['wait_sum'] += (r.wait_time or 0) * cnt
     cashier_perf = [
         {'cashier': c, 'totalCustomers': v['totalCustomers'], 'avgWait': v['wait_sum'] / v['totalCustomers'] if v['totalCustomers'] > 0 else 0}
-        for c, v in sorted(by_cashier.items())
+        for c, v in sorted(agg['by_cashier'].items())
     ]
 
     # Bekleme süresi dağılımı (saniye → aralık): 0-1 dk, 1-2 dk, 2-3 dk, 3-5 dk, 5+ dk
-    buckets = [
-        (0, 60, '0-1 dk'),
-        (60, 120, '1-2 dk'),
-        (120, 180, '2-3 dk'),
-        (180, 300, '3-5 dk'),
-        (300, float('inf'), '5+ dk'),
+    wait_time_distribution = [
+        {'range': label, 'count': agg['distribution'][col]}
+        for _, _, col, label in WAIT_BUCKETS
     ]
-    dist_counts = defaultdict(int)
-    for r in rows:
-        wt = r.wait_time or 0
-        cnt = getattr(r, 'total_customers', 1) or 1
-        for lo, hi, label in buckets:
-            if lo <= wt < hi:
-                dist_counts[label] += cnt
-                break
-    wait_time_distribution = [{'range': label, 'count': dist_counts[label]} for _, _, label in buckets]
 
+    all_cashiers = agg['all_cashiers']
     return {
-        'overallStats': {'totalCustomers': total_cust, 'avgWaitTime': avg_wait, 'maxWaitTime': max((r.wait_time or 0) for r in rows) if rows else 0},
+        'overallStats': {'totalCustomers': agg['totalCustomers'], 'avgWaitTime': avg_wait, 'maxWaitTime': agg['maxWaitTime']},
         'hourlySummary': hourly,
         'waitTimeDistribution': wait_time_distribution,
         'cashierPerformance': cashier_perf,
@@ -918,8 +1096,11 @@ def queues_daily_summary():
 def queue_record(rid):
     uids = _user_ids()
     r = QueueData.query.filter(QueueData.id == rid, QueueData.user_id.in_(uids)).first_or_404()
+    touched = [(r.user_id, r.recorded_at or r.created_at)]
     if request.method == 'DELETE':
         db.session.delete(r)
+        db.session.flush()
+        refresh_queue_hours(touched)
         db.session.commit()
         return {'message': 'Silindi'}
     data = request.get_json() or {}
@@ -927,6 +1108,8 @@ def queue_record(rid):
         r.wait_time = data['avgWaitTime']
     if 'totalCustomers' in data:
         r.total_customers = int(data['totalCustomers'])
+    db.session.flush()
+    refresh_queue_hours(touched)
     db.session.commit()
     return {'message': 'Güncellendi'}
 
@@ -941,9 +1124,37 @@ def get_heatmaps():
     return {'data': [{'id': r.id, 'zone': r.zone, 'intensity': r.intensity, 'visitor_count': r.visitor_count, 'heatmap_type': r.heatmap_type} for r in rows]}
 
 
+def _heatmap_date_recorded(data: dict, dt: datetime):
+    """date_recorded alanı verilmişse onu, yoksa (veya geçersizse) kayıt zamanının gününü döndürür."""
+    if data.get('date_recorded'):
+        try:
+            return datetime.strptime(str(data['date_recorded'])[:10], '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            pass
+    return dt.date()
+
+
+def _heatmap_metrics(data: dict):
+    """Bölge metriklerini (intensity, visitor_count) doğrular; geçersizse ValueError."""
+    try:
+        intensity = float(data.get('intensity', 0) or 0)
+    except (TypeError, ValueError):
+        raise ValueError('intensity sayısal olmalı')
+    return intensity, _int_field(data, 'visitor_count')
+
+
+def _after_heatmap_ingest(user_id: int):
+    try:
+        from routes.health import update_module_heartbeat
+        update_module_heartbeat(int(user_id), 'heatmap')
+    except Exception as e:
+        print(f"[Heartbeat Auto-Update] Hata: {e}")
+
+
 @analytics_bp.route('/heatmaps', methods=['POST'])
 @jwt_required()
 def post_heatmap():
+    """Isı haritası verisi ekleme. Aynı kamera + bölge + timestamp (veya idempotency_key) tekrar gelirse güncellenir."""
     data = request.get_json() or {}
     ts_raw = data.get('timestamp')
     ts = None
@@ -953,92 +1164,160 @@ def post_heatmap():
         except Exception:
             ts = _parse_timestamp(ts_raw)
     dt = ts if ts else datetime.utcnow()
-    if data.get('date_recorded'):
-        try:
-            date_rec = datetime.strptime(str(data['date_recorded'])[:10], '%Y-%m-%d').date()
-        except (ValueError, TypeError):
-            date_rec = dt.date()
-    else:
-        date_rec = dt.date()
-    r = HeatmapData(
-        user_id=get_jwt_identity(),
+    try:
+        intensity, visitor_count = _heatmap_metrics(data)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    user_id = int(get_jwt_identity())
+    camera_id = data.get('camera_id') or None
+    values = dict(
+        user_id=user_id,
         zone=data.get('zone'),
-        intensity=float(data.get('intensity', 0) or 0),
-        visitor_count=int(data.get('visitor_count', 0) or 0),
-        camera_id=data.get('camera_id') or None,
-        date_recorded=date_rec,
-        recorded_at=ts if ts else datetime.utcnow(),
+        intensity=intensity,
+        visitor_count=visitor_count,
+        camera_id=camera_id,
+        date_recorded=_heatmap_date_recorded(data, dt),
+        recorded_at=dt,
+        idempotency_key=_idempotency_key(data, ts, camera_id, data.get('zone')),
     )
-    db.session.add(r)
+    rid = _save_facts(HeatmapData, [values])[0]
+    refresh_heatmap_hours([(user_id, dt)])
     db.session.commit()
 
-    # Heartbeat güncelle
-    try:
-        from routes.health import update_module_heartbeat
-        update_module_heartbeat(int(r.user_id), 'heatmap')
-    except Exception as e:
-        print(f"[Heartbeat Auto-Update] Hata: {e}")
+    _after_heatmap_ingest(user_id)
 
-    return {'id': r.id, 'message': 'Kaydedildi'}, 201
+    return {'id': rid, 'message': 'Kaydedildi'}, 201
+
+
+@analytics_bp.route('/heatmaps/batch', methods=['POST'])
+@jwt_required()
+def post_heatmap_batch():
+    """
+    Bir kamera-saat için tüm bölgeleri tek istekte yazar.
+    Body: {"camera_id": "cam1", "timestamp": "2026-06-15T10:00", "date_recorded": "2026-06-15" (ops.),
+           "zones": [{"zone": "Alan-1", "visitor_count": 4, "intensity": 97.0}, ...]}
+    Idempotent: (user_id, camera_id, zone, recorded_at) için kayıt zaten varsa yenisi eklenmez,
+    mevcut kayıt güncellenir (POST /heatmaps ile aynı idempotency_key türetilir).
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return {'error': 'Body JSON nesnesi olmalı'}, 400
+    zones = data.get('zones')
+    if not isinstance(zones, list) or not zones:
+        return {'error': 'zones alanı boş olmayan bir dizi olmalı'}, 400
+    if len(zones) > MAX_BATCH_ROWS:
+        return {'error': f'Tek istekte en fazla {MAX_BATCH_ROWS} bölge gönderilebilir'}, 400
+
+    ts_raw = data.get('timestamp')
+    ts = None
+    if ts_raw:
+        try:
+            ts = datetime.fromisoformat(str(ts_raw))
+        except Exception:
+            ts = _parse_timestamp(ts_raw)
+        if ts is None:
+            return {'error': 'Geçersiz timestamp'}, 400
+    dt = ts if ts else datetime.utcnow()
+    camera_id = data.get('camera_id') or None
+    date_rec = _heatmap_date_recorded(data, dt)
+
+    results = []
+    valid = {}
+    for i, z in enumerate(zones):
+        try:
+            if not isinstance(z, dict) or not z.get('zone'):
+                raise ValueError('zone alanı zorunlu')
+            intensity, visitor_count = _heatmap_metrics(z)
+        except ValueError as e:
+            results.append({'index': i, 'zone': z.get('zone') if isinstance(z, dict) else None, 'error': str(e)})
+            continue
+        # Aynı istekte aynı bölge iki kez geldiyse sonuncusu geçerli (uyarı, hata sayılmaz)
+        if z['zone'] in valid:
+            results.append({'index': valid[z['zone']][0], 'zone': z['zone'], 'warning': 'Aynı bölge tekrar gönderildi, son değer kullanıldı'})
+        valid[z['zone']] = (i, dict(
+            user_id=user_id,
+            zone=z['zone'],
+            intensity=intensity,
+            visitor_count=visitor_count,
+            camera_id=camera_id,
+            date_recorded=date_rec,
+            recorded_at=dt,
+            idempotency_key=_idempotency_key(z, ts, camera_id, z['zone']),
+        ))
+
+    if valid:
+        ids = _save_facts(HeatmapData, [v for _, v in valid.values()])
+        refresh_heatmap_hours([(user_id, dt)])
+        db.session.commit()
+        results.extend({'index': i, 'zone': zone, 'id': rid} for (zone, (i, _)), rid in zip(valid.items(), ids))
+        _after_heatmap_ingest(user_id)
+
+    results.sort(key=lambda x: x['index'])
+    saved = len(valid)
+    return {
+        'results': results,
+        'saved': saved,
+        'failed': sum(1 for r in results if 'error' in r),
+        'message': 'Kaydedildi' if saved else 'Kayıt eklenmedi',
+    }, (201 if saved else 400)
 
 
 @analytics_bp.route('/heatmaps/daily-summary', methods=['GET'])
 @jwt_required()
+@cached_response(date_scoped=True)
 def heatmaps_daily_summary():
+    """
+    Heatmap günlük/aralık özeti. Ham heatmap_data yerine saatlik rollup (heatmap_hourly) okunur;
+    satırlar SQL'de (günün saati, bölge) bazında gruplanır.
+    """
     user_ids = _user_ids()
     date_val = request.args.get('date') or request.args.get('date_from')
     date_to = request.args.get('date_to')
     zone_ids = request.args.get('zone_ids')
-    
-    q = HeatmapData.query.filter(HeatmapData.user_id.in_(user_ids))
-    if date_val:
-        try:
-            d = datetime.strptime(date_val, '%Y-%m-%d').date()
-            if date_to:
-                d_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                q = q.filter(HeatmapData.date_recorded >= d, HeatmapData.date_recorded <= d_to)
-            else:
-                q = q.filter(HeatmapData.date_recorded == d)
-        except ValueError:
-            pass
-    rows_filtered = q.all()
-    if zone_ids and zone_ids != 'all':
-        q = q.filter(HeatmapData.zone == zone_ids)
-        rows = q.all()
-    else:
-        rows = rows_filtered
 
-    # Tüm bölgeler her zaman listede olsun (zone filtresine bakılmadan, sadece tarihe göre)
-    q_all_zones = HeatmapData.query.filter(HeatmapData.user_id.in_(user_ids))
+    filters = [HeatmapHourly.user_id.in_(user_ids)]
     if date_val:
         try:
             d = datetime.strptime(date_val, '%Y-%m-%d').date()
             if date_to:
                 d_to = datetime.strptime(date_to, '%Y-%m-%d').date()
-                q_all_zones = q_all_zones.filter(HeatmapData.date_recorded >= d, HeatmapData.date_recorded <= d_to)
+                filters += [HeatmapHourly.date_recorded >= d, HeatmapHourly.date_recorded <= d_to]
             else:
-                q_all_zones = q_all_zones.filter(HeatmapData.date_recorded == d)
+                filters.append(HeatmapHourly.date_recorded == d)
         except ValueError:
             pass
-    zones = sorted(set(r[0] for r in q_all_zones.with_entities(HeatmapData.zone).distinct().all() if r[0]))
-    
+    # (günün saati, bölge) bazında SQL'de toplanır; Python yalnızca grup satırlarını birleştirir
+    from sqlalchemy import extract
+    hour_of_day = extract('hour', HeatmapHourly.hour)
+    groups = db.session.query(
+        hour_of_day.label('hod'),
+        HeatmapHourly.zone,
+        func.sum(HeatmapHourly.visitors).label('visitors'),
+        func.sum(HeatmapHourly.dwell_sum).label('dwell_sum'),
+        func.sum(HeatmapHourly.samples).label('samples'),
+        func.min(HeatmapHourly.editable_id).label('editable_id'),
+    ).filter(*filters).group_by(hour_of_day, HeatmapHourly.zone).all()
+    # Tüm bölgeler her zaman listede olsun (zone filtresine bakılmadan, sadece tarihe göre)
+    zones = sorted({r.zone for r in groups if r.zone})
+
+    zone_filter = zone_ids if zone_ids and zone_ids != 'all' else None
+    rows = [r for r in groups if r.zone == zone_filter] if zone_filter else groups
+
     # Saat bazında grupla (recorded_at veya created_at)
     by_hour = defaultdict(lambda: {'totalVisitors': 0, 'intensity_sum': 0, 'count': 0, 'editable_id': None})
     for r in rows:
-        dt = getattr(r, 'recorded_at', None) or r.created_at
-        h = dt.strftime('%H') if dt else '12'
-        by_hour[h]['totalVisitors'] += r.visitor_count or 0
-        inv = r.intensity or 0
-        by_hour[h]['intensity_sum'] += inv
-        by_hour[h]['count'] += 1
-        if by_hour[h]['editable_id'] is None:
-            by_hour[h]['editable_id'] = r.id
-    
+        v = by_hour[int(r.hod)]
+        v['totalVisitors'] += r.visitors or 0
+        v['intensity_sum'] += r.dwell_sum or 0
+        v['count'] += r.samples or 0
+        if r.editable_id is not None:
+            v['editable_id'] = r.editable_id if v['editable_id'] is None else min(v['editable_id'], r.editable_id)
+
     _wh_start, _wh_end = _get_work_hours(user_ids)
     hourly = []
     for h in range(_wh_start, _wh_end):
-        key = str(h)
-        v = by_hour[key]
+        v = by_hour[h]
         avg_dwell = v['intensity_sum'] / v['count'] if v['count'] > 0 else 0
         hourly.append({
             'hour': f'{h}:00',
@@ -1046,22 +1325,29 @@ def heatmaps_daily_summary():
             'avgDwellTime': round(avg_dwell, 1),
             'editable_id': v['editable_id'],
         })
-    
-    total_visitors = sum(r.visitor_count or 0 for r in rows)
-    avg_dwell = sum(r.intensity or 0 for r in rows) / len(rows) if rows else 0
-    busiest = max(rows, key=lambda r: r.visitor_count or 0).zone if rows else 'N/A'
-    
+
+    total_visitors = sum(r.visitors or 0 for r in rows)
+    samples = sum(r.samples or 0 for r in rows)
+    avg_dwell = sum(r.dwell_sum or 0 for r in rows) / samples if samples else 0
+    busiest = 'N/A'
+    if rows:
+        # En yoğun bölge: tek kayıtta en çok ziyaretçi görülen saatlik satır (eşitlikte ilk satır)
+        bq = db.session.query(HeatmapHourly.zone).filter(*filters)
+        if zone_filter:
+            bq = bq.filter(HeatmapHourly.zone == zone_filter)
+        busiest = bq.order_by(func.coalesce(HeatmapHourly.max_visitors, 0).desc(), HeatmapHourly.id).limit(1).scalar() or None
+
     zone_agg = defaultdict(lambda: {'totalVisitors': 0, 'intensity_sum': 0, 'count': 0})
     for r in rows:
         z = r.zone or 'Bilinmeyen'
-        zone_agg[z]['totalVisitors'] += r.visitor_count or 0
-        zone_agg[z]['intensity_sum'] += r.intensity or 0
-        zone_agg[z]['count'] += 1
+        zone_agg[z]['totalVisitors'] += r.visitors or 0
+        zone_agg[z]['intensity_sum'] += r.dwell_sum or 0
+        zone_agg[z]['count'] += r.samples or 0
     zone_perf = [
         {'zone': z, 'totalVisitors': v['totalVisitors'], 'avgDwell': v['intensity_sum'] / v['count'] if v['count'] > 0 else 0}
         for z, v in sorted(zone_agg.items())
     ]
-    
+
     return {
         'overallStats': {'totalVisitors': total_visitors, 'avgDwellTime': avg_dwell, 'busiestZone': busiest},
         'hourlySummary': hourly,
@@ -1077,8 +1363,11 @@ def heatmaps_daily_summary():
 def heatmap_record(rid):
     uids = _user_ids()
     r = HeatmapData.query.filter(HeatmapData.id == rid, HeatmapData.user_id.in_(uids)).first_or_404()
+    touched = [(r.user_id, r.recorded_at or r.created_at)]
     if request.method == 'DELETE':
         db.session.delete(r)
+        db.session.flush()
+        refresh_heatmap_hours(touched)
         db.session.commit()
         return {'message': 'Silindi'}
     data = request.get_json() or {}
@@ -1086,6 +1375,8 @@ def heatmap_record(rid):
         r.visitor_count = data['totalVisitors']
     if 'avgDwellTime' in data:
         r.intensity = data['avgDwellTime']
+    db.session.flush()
+    refresh_heatmap_hours(touched)
     db.session.commit()
     return {'message': 'Güncellendi'}
 
@@ -3,6 +3,7 @@ from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identi
 
 from models import db, User, ManagedStore
 from activity_logger import log_activity
+from user_context import invalidate_access_cache
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -126,6 +127,7 @@ def switch_company():
     # Kullanıcının company_id'sini güncelle
     user.company_id = int(target_company_id)
     db.session.commit()
+    invalidate_access_cache()
 
     # Yeni token oluştur
     access_token = create_access_token(
@@ -177,5 +179,6 @@ def register():
     user.set_password(password)
     db.session.add(user)
     db.session.commit()
+    invalidate_access_cache()
 
     return jsonify({'message': 'Kayıt başarılı', 'user': user.to_public_dict()}), 201
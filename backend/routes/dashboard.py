@@ -1,10 +1,13 @@
-from flask import Blueprint, request
+from flask import Blueprint, g, request
 from flask_jwt_extended import jwt_required
 from datetime import datetime, timedelta, time
 from zoneinfo import ZoneInfo
+from sqlalchemy import func
 
-from models import db, CustomerData, QueueData
+from models import db, CustomerHourly, QueueHourly
+from db_utils import as_datetime
 from user_context import get_resolved_user_ids
+from services.cache_service import cached_response, version_signature
 
 dashboard_bp = Blueprint('dashboard', __name__)
 ISTANBUL_TZ = ZoneInfo("Europe/Istanbul")
@@ -16,100 +19,94 @@ def _get_utc_range_for_local_date(d):
     return local_start, local_end
 
 
+def _weekly_days():
+    """(başlangıç, bitiş) yerel gün aralığı: geçerli date_from + date_to, yoksa son 7 gün."""
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+    if date_from and date_to:
+        try:
+            return (datetime.strptime(date_from, '%Y-%m-%d').date(),
+                    datetime.strptime(date_to, '%Y-%m-%d').date())
+        except ValueError:
+            pass
+    end = datetime.now(ISTANBUL_TZ).date()
+    return end - timedelta(days=7), end
+
+
+def _latest_hours(user_ids, start_date, end_date):
+    """
+    Tek sorguda: aralıktaki en son veri saati + tüm zamanların en son veri saati.
+    İstek boyunca bir kez sorgulanır (önbellek imzası ve endpoint aynı sonucu kullanır).
+    """
+    key = (tuple(user_ids), start_date, end_date)
+    memo = g.setdefault('_weekly_latest', {})
+    if key not in memo:
+        utc_start, _ = _get_utc_range_for_local_date(start_date)
+        _, utc_end = _get_utc_range_for_local_date(end_date)
+        in_range = db.and_(CustomerHourly.hour >= utc_start, CustomerHourly.hour <= utc_end)
+        latest_in_range, latest_ts = db.session.query(
+            func.max(db.case((in_range, CustomerHourly.hour))),
+            func.max(CustomerHourly.hour),
+        ).filter(CustomerHourly.user_id.in_(user_ids)).one()
+        memo[key] = as_datetime(latest_in_range), as_datetime(latest_ts)
+    return memo[key]
+
+
+def _weekly_fallback_key(user_ids, start_date, end_date):
+    """Aralıkta veri yoksa yanıt en son veri haftasını gösterir; o pencerenin sürümü imzaya girer."""
+    latest_in_range, latest_ts = _latest_hours(user_ids, start_date, end_date)
+    if latest_in_range is not None or latest_ts is None:
+        return None
+    last_day = latest_ts.date()
+    return latest_ts, version_signature(user_ids, last_day - timedelta(days=6), last_day)
+
+
 @dashboard_bp.route('/weekly-overview', methods=['GET'])
 @jwt_required()
+@cached_response(days=_weekly_days, extra=_weekly_fallback_key)
 def weekly_overview():
     user_ids, _ = get_resolved_user_ids()
     if not user_ids:
         from flask_jwt_extended import get_jwt_identity
         user_ids = [get_jwt_identity()]
-    
-    # Tarih aralığı parametreleri (opsiyonel)
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
-    
-    if date_from and date_to:
-        try:
-            start_date_local = datetime.strptime(date_from, '%Y-%m-%d').date()
-            end_date_local = datetime.strptime(date_to, '%Y-%m-%d').date()
-            utc_start, _ = _get_utc_range_for_local_date(start_date_local)
-            _, utc_end = _get_utc_range_for_local_date(end_date_local)
-        except ValueError:
-            end_date_local = datetime.now(ISTANBUL_TZ).date()
-            start_date_local = end_date_local - timedelta(days=7)
-            utc_start, _ = _get_utc_range_for_local_date(start_date_local)
-            _, utc_end = _get_utc_range_for_local_date(end_date_local)
-    else:
-        end_date_local = datetime.now(ISTANBUL_TZ).date()
-        start_date_local = end_date_local - timedelta(days=7)
+    user_ids = sorted({int(u) for u in user_ids})
+
+    # Tarih aralığı parametreleri (opsiyonel; yoksa / geçersizse son 7 gün)
+    start_date_local, end_date_local = _weekly_days()
+    utc_start, _ = _get_utc_range_for_local_date(start_date_local)
+    _, utc_end = _get_utc_range_for_local_date(end_date_local)
+
+    # Aralıkta veri yoksa pencere en son veri tarihine kaydırılır.
+    latest_in_range, latest_ts = _latest_hours(user_ids, start_date_local, end_date_local)
+    if latest_in_range is None and latest_ts is not None:
+        end_date_local = latest_ts.date()
+        start_date_local = end_date_local - timedelta(days=6)
         utc_start, _ = _get_utc_range_for_local_date(start_date_local)
         _, utc_end = _get_utc_range_for_local_date(end_date_local)
+        latest_in_range = latest_ts
 
-    # Hizli kontrol: bu aralikta veri var mi? Yoksa en son veri tarihine kay
-    from sqlalchemy import func as sqlfunc
-    from flask_jwt_extended import get_jwt_identity
-    _check_ids = user_ids if user_ids else [get_jwt_identity()]
-    has_data = db.session.query(CustomerData.id).filter(
-        CustomerData.user_id.in_(_check_ids),
-        CustomerData.timestamp >= utc_start,
-        CustomerData.timestamp <= utc_end
-    ).first()
-    if not has_data:
-        latest_ts = db.session.query(sqlfunc.max(CustomerData.timestamp)).filter(
-            CustomerData.user_id.in_(_check_ids)
-        ).scalar()
-        if latest_ts:
-            end_date_local = latest_ts.date()
-            start_date_local = end_date_local - timedelta(days=6)
-            utc_start, _ = _get_utc_range_for_local_date(start_date_local)
-            _, utc_end = _get_utc_range_for_local_date(end_date_local)
-
-    # Müşteri verileri
-    customer_rows = CustomerData.query.filter(
-        CustomerData.user_id.in_(user_ids),
-        CustomerData.timestamp >= utc_start,
-        CustomerData.timestamp <= utc_end
-    ).all()
-
-    total_entered = sum(getattr(r, 'entered', 0) or 0 for r in customer_rows)
-    total_exited = sum(getattr(r, 'exited', 0) or 0 for r in customer_rows)
-    total_male = sum(r.male_count or 0 for r in customer_rows)
-    total_female = sum(r.female_count or 0 for r in customer_rows)
-    
-    age_groups = {}
-    for r in customer_rows:
-        for attr in ['age_18_30', 'age_30_50', 'age_50_plus']:
-            val = getattr(r, attr, 0) or 0
-            age_groups[attr] = age_groups.get(attr, 0) + val
-    
-    busiest_age = 'N/A'
-    if age_groups and sum(age_groups.values()) > 0:
-        busiest_age = max(age_groups, key=age_groups.get)
-        busiest_age = {'age_18_30': '18-30', 'age_30_50': '30-50', 'age_50_plus': '50+'}.get(busiest_age, busiest_age)
-
-    # Müşteri Analizi sayfası için: veri olan en son tarih (varsayılan seçili gün)
-    latest_customer_date = None
-    if customer_rows:
-        max_ts = max(r.timestamp for r in customer_rows if r.timestamp)
-        latest_customer_date = max_ts.date()
-
-    # Kuyruk verileri
-    queue_rows = QueueData.query.filter(
-        QueueData.user_id.in_(user_ids),
-        db.func.coalesce(QueueData.recorded_at, QueueData.created_at) >= utc_start,
-        db.func.coalesce(QueueData.recorded_at, QueueData.created_at) <= utc_end
-    ).all()
-
-    avg_wait = 0
-    if queue_rows:
-        waits = [r.wait_time for r in queue_rows if r.wait_time]
-        avg_wait = sum(waits) / len(waits) if waits else 0
+    # Müşteri verileri: saatlik rollup'tan gün bazında SQL'de toplanır
+    day = func.date(CustomerHourly.hour)
+    daily_rows = db.session.query(
+        day,
+        func.sum(CustomerHourly.entered),
+        func.sum(CustomerHourly.exited),
+        func.sum(CustomerHourly.male_count),
+        func.sum(CustomerHourly.female_count),
+        func.sum(CustomerHourly.age_18_30),
+        func.sum(CustomerHourly.age_30_50),
+        func.sum(CustomerHourly.age_50_plus),
+    ).filter(
+        CustomerHourly.user_id.in_(user_ids),
+        CustomerHourly.hour >= utc_start,
+        CustomerHourly.hour <= utc_end
+    ).group_by(day).all()
 
     # Günlük seriler - tarih aralığına göre dinamik
     daily_flow = {}
     daily_gender = {}
     daily_age = {}
-    
+
     num_days = (end_date_local - start_date_local).days + 1
     for i in range(num_days):
         d = start_date_local + timedelta(days=i)
@@ -117,33 +114,56 @@ def weekly_overview():
         daily_gender[str(d)] = {'date': str(d), 'male': 0, 'female': 0}
         daily_age[str(d)] = {'date': str(d), 'age_18_30': 0, 'age_30_50': 0, 'age_50_plus': 0}
 
-    for r in customer_rows:
-        if not r.timestamp:
-            continue
+    totals = {'entered': 0, 'exited': 0, 'male': 0, 'female': 0, 'age_18_30': 0, 'age_30_50': 0, 'age_50_plus': 0}
+    for d, entered, exited, male, female, a1, a2, a3 in daily_rows:
+        vals = {'entered': entered or 0, 'exited': exited or 0, 'male': male or 0, 'female': female or 0,
+                'age_18_30': a1 or 0, 'age_30_50': a2 or 0, 'age_50_plus': a3 or 0}
+        for k, v in vals.items():
+            totals[k] += v
         # DB'de naive yerel saat saklanıyor, doğrudan kullan (UTC dönüşümü yok)
-        d = r.timestamp.date()
-        if str(d) in daily_flow:
-            daily_flow[str(d)]['entered'] += getattr(r, 'entered', 0) or 0
-            daily_flow[str(d)]['exited'] += getattr(r, 'exited', 0) or 0
-            daily_gender[str(d)]['male'] += r.male_count or 0
-            daily_gender[str(d)]['female'] += r.female_count or 0
-            daily_age[str(d)]['age_18_30'] += getattr(r, 'age_18_30', 0) or 0
-            daily_age[str(d)]['age_30_50'] += getattr(r, 'age_30_50', 0) or 0
-            daily_age[str(d)]['age_50_plus'] += getattr(r, 'age_50_plus', 0) or 0
+        key = str(d)
+        if key in daily_flow:
+            daily_flow[key]['entered'] += vals['entered']
+            daily_flow[key]['exited'] += vals['exited']
+            daily_gender[key]['male'] += vals['male']
+            daily_gender[key]['female'] += vals['female']
+            for attr in ('age_18_30', 'age_30_50', 'age_50_plus'):
+                daily_age[key][attr] += vals[attr]
+
+    age_groups = {attr: totals[attr] for attr in ('age_18_30', 'age_30_50', 'age_50_plus')}
+    busiest_age = 'N/A'
+    if sum(age_groups.values()) > 0:
+        busiest_age = max(age_groups, key=age_groups.get)
+        busiest_age = {'age_18_30': '18-30', 'age_30_50': '30-50', 'age_50_plus': '50+'}.get(busiest_age, busiest_age)
+
+    # Müşteri Analizi sayfası için: veri olan en son tarih (varsayılan seçili gün)
+    latest_customer_date = latest_in_range.date() if latest_in_range else None
+
+    # Kuyruk verileri (saatlik rollup, tek satır)
+    wait_sum, wait_count, total_queues = db.session.query(
+        func.coalesce(func.sum(QueueHourly.wait_nonzero_sum), 0),
+        func.coalesce(func.sum(QueueHourly.wait_nonzero_count), 0),
+        func.coalesce(func.sum(QueueHourly.row_count), 0),
+    ).filter(
+        QueueHourly.user_id.in_(user_ids),
+        QueueHourly.hour >= utc_start,
+        QueueHourly.hour <= utc_end
+    ).one()
+    avg_wait = wait_sum / wait_count if wait_count else 0
 
     return {
         'totals': {
             'customers': {
-                'total_entered': total_entered,
-                'total_exited': total_exited,
-                'male': total_male,
-                'female': total_female,
+                'total_entered': totals['entered'],
+                'total_exited': totals['exited'],
+                'male': totals['male'],
+                'female': totals['female'],
                 'busiest_age_group': busiest_age,
                 'latest_customer_date': str(latest_customer_date) if latest_customer_date else None,
             },
             'queues': {
                 'avg_wait_time': avg_wait,
-                'total_queues': len(queue_rows),
+                'total_queues': total_queues,
             }
         },
         'timeseries': {
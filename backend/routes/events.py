@@ -0,0 +1,51 @@
+"""
+Canlı olay akışı (Server-Sent Events).
+
+GET /api/events/stream?token=<JWT>   (EventSource header gönderemediği için token query string'de)
+Olay tipleri (event:), data JSON:
+- heartbeat:    {"modules": {"<modül>": "<ISO zaman>"}}  → modül ping'i geldi; durum ekranı yenilenir
+- notification: Notification.to_dict()                   → yeni bildirim
+- ticket:       {"ticket_id", "status", "reply"}         → ticket açıldı / cevaplandı / durumu değişti
+- ingest:       {"table", "hour"}                        → yeni veri; sayaçlar / özetler yenilenir
+Bağlantı EVENT_STREAM_MAX_SECONDS sonra kapanır, istemci Last-Event-ID ile kaldığı yerden devam eder.
+Worker başına EVENT_STREAM_MAX_PER_WORKER bağlantı; dolu ise 503 (istemci periyodik yenilemeye döner).
+"""
+from flask import Blueprint, Response, current_app, request
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+
+from models import db
+from user_context import get_resolved_user_ids
+from services import event_bus
+
+events_bp = Blueprint('events', __name__)
+
+
+@events_bp.route('/stream', methods=['GET'])
+@jwt_required()
+def event_stream():
+    user_id = int(get_jwt_identity())
+    is_admin = (get_jwt() or {}).get('role') == 'admin'
+    user_ids, _ = get_resolved_user_ids()
+    sub = event_bus.subscribe(set(user_ids or []) | {user_id}, is_admin)
+    if sub is None:
+        return {'error': 'Canlı bağlantı sınırı dolu, periyodik yenileme kullanılmalı'}, 503
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or ''
+    try:
+        replayed = event_bus.replay(sub, int(last_event_id)) if last_event_id.isdigit() else []
+    except Exception:
+        event_bus.unsubscribe(sub)
+        raise
+    # Uzun süren akış DB bağlantısı tutmasın
+    db.session.remove()
+
+    cfg = current_app.config
+    body = event_bus.stream(
+        sub, replayed,
+        max_seconds=cfg.get('EVENT_STREAM_MAX_SECONDS', 300),
+        keepalive_seconds=cfg.get('EVENT_KEEPALIVE_SECONDS', 15),
+    )
+    return Response(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # nginx: yanıtı tamponlama
+    })
@@ -0,0 +1,209 @@
+"""
+Ham analitik verisinin (müşteri / kuyruk / heatmap) toplu dışa aktarımı.
+
+GET /api/export/<dataset>?format=csv|parquet|arrow&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD&store_id=
+- dataset: customers | queues | heatmaps
+- Satırlar sunucu tarafı cursor ile (yield_per) EXPORT_BATCH_ROWS'luk parçalar halinde okunur ve
+  yanıt akış (streaming) olarak yazılır; bellek kullanımı veri boyutundan bağımsızdır.
+- parquet / arrow (Arrow IPC stream) için pyarrow gerekir; kurulu değilse 501 döner.
+"""
+import csv
+import io
+from datetime import date, datetime, timedelta
+
+from flask import Blueprint, Response, request, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from models import db, CustomerData, QueueData, HeatmapData
+from user_context import get_resolved_user_ids
+
+export_bp = Blueprint('export', __name__)
+
+EXPORT_BATCH_ROWS = 5000
+
+# dataset -> (model, zaman kolonu adı; None ise COALESCE(recorded_at, created_at))
+DATASETS = {
+    'customers': (CustomerData, 'timestamp'),
+    'queues': (QueueData, None),
+    'heatmaps': (HeatmapData, None),
+}
+
+# Dışa aktarılmayan iç kolonlar
+_EXCLUDED_COLUMNS = {'idempotency_key'}
+
+_MIMETYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def _columns(model):
+    return [c for c in model.__table__.columns if c.name not in _EXCLUDED_COLUMNS]
+
+
+def _parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+
+def _time_filter(model, ts_name, start, end):
+    """[start, end) filtresi; kuyruk / heatmap için index kullanılabilir COALESCE(recorded_at, created_at)."""
+    filters = []
+    if ts_name:
+        col = getattr(model, ts_name)
+        if start:
+            filters.append(col >= start)
+        if end:
+            filters.append(col < end)
+        return filters
+    if start or end:
+        rec = [model.recorded_at.isnot(None)]
+        legacy = [model.recorded_at.is_(None)]
+        if start:
+            rec.append(model.recorded_at >= start)
+            legacy.append(model.created_at >= start)
+        if end:
+            rec.append(model.recorded_at < end)
+            legacy.append(model.created_at < end)
+        filters.append(db.or_(db.and_(*rec), db.and_(*legacy)))
+    return filters
+
+
+def _batches(model, ts_name, user_ids, start, end):
+    """Satırları EXPORT_BATCH_ROWS'luk tuple listeleri halinde, sunucu tarafı cursor ile üretir."""
+    cols = _columns(model)
+    order_col = getattr(model, ts_name) if ts_name else db.func.coalesce(model.recorded_at, model.created_at)
+    stmt = db.select(*cols).where(
+        model.user_id.in_(user_ids),
+        *_time_filter(model, ts_name, start, end),
+    ).order_by(order_col, model.id).execution_options(yield_per=EXPORT_BATCH_ROWS)
+    for partition in db.session.execute(stmt).partitions():
+        yield [tuple(row) for row in partition]
+
+
+def _csv_stream(cols, batches):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([c.name for c in cols])
+    for rows in batches:
+        for row in rows:
+            writer.writerow(['' if v is None else (v.isoformat() if hasattr(v, 'isoformat') else v) for v in row])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """pyarrow yazıcısının çıktısını toplayan, parça parça boşaltılan yazma hedefi."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema(pa, cols):
+    def arrow_type(col):
+        try:
+            python_type = col.type.python_type
+        except NotImplementedError:
+            return pa.string()
+        if python_type is bool:
+            return pa.bool_()
+        if python_type is int:
+            return pa.int64()
+        if python_type is float:
+            return pa.float64()
+        if python_type is datetime:
+            return pa.timestamp('us')
+        if python_type is date:
+            return pa.date32()
+        return pa.string()
+    return pa.schema([pa.field(c.name, arrow_type(c)) for c in cols])
+
+
+def _arrow_stream(fmt, cols, batches):
+    import pyarrow as pa
+    schema = _arrow_schema(pa, cols)
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+        write = writer.write_table
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_table
+    for rows in batches:
+        columns = list(zip(*rows)) if rows else [[] for _ in cols]
+        table = pa.Table.from_arrays(
+            [pa.array(list(values), type=field.type) for values, field in zip(columns, schema)],
+            schema=schema,
+        )
+        write(table)  # parquet: her parti bir row group
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.drain()
+
+
+@export_bp.route('/<dataset>', methods=['GET'])
+@jwt_required()
+def export_dataset(dataset: str):
+    """
+    Ham veriyi dışa aktar (CSV / Parquet / Arrow).
+    Query: format (varsayılan csv), date_from, date_to (dahil), store_id.
+    """
+    if dataset not in DATASETS:
+        return {'error': f"Geçersiz veri seti. Geçerli: {', '.join(DATASETS)}"}, 400
+    fmt = (request.args.get('format') or 'csv').lower()
+    if fmt not in _MIMETYPES:
+        return {'error': 'format csv, parquet veya arrow olmalı'}, 400
+    if fmt in ('parquet', 'arrow'):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return {'error': f'{fmt} dışa aktarımı için sunucuda pyarrow kurulu değil; format=csv kullanın'}, 501
+
+    try:
+        start = _parse_day(request.args.get('date_from'))
+        end = _parse_day(request.args.get('date_to'))
+    except ValueError:
+        return {'error': 'Tarih formatı YYYY-MM-DD olmalı'}, 400
+    if end:
+        end = end + timedelta(days=1)  # date_to dahil
+
+    user_ids, _ = get_resolved_user_ids()
+    if not user_ids:
+        user_ids = [int(get_jwt_identity())]
+
+    model, ts_name = DATASETS[dataset]
+    cols = _columns(model)
+    batches = _batches(model, ts_name, user_ids, start, end)
+    body = _csv_stream(cols, batches) if fmt == 'csv' else _arrow_stream(fmt, cols, batches)
+
+    ext = {'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrows'}[fmt]
+    filename = f"{dataset}_{request.args.get('date_from') or 'all'}_{request.args.get('date_to') or 'all'}.{ext}"
+    return Response(
+        stream_with_context(body),
+        mimetype=_MIMETYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
@@ -1,14 +1,13 @@
-import os
-import json
-import threading
-import requests as http_requests
+import time
+from collections import defaultdict
 from datetime import datetime, timedelta
 
 from flask import Blueprint, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
-from models import db, User, ServiceHeartbeat
+from models import db, User, ServiceHeartbeat, ModulePing
 from auth_utils import admin_required
+from services import heartbeat_buffer
 
 health_bp = Blueprint('health', __name__)
 
@@ -18,87 +17,82 @@ health_bp = Blueprint('health', __name__)
 MODULE_TIMEOUT_MINUTES = 35
 KNOWN_MODULES = ['counting', 'heatmap', 'queue']
 
-# Telegram bildirim ayarları
-TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT', '')
-TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_ID', '')
-
-
-def _get_telegram_config():
-    """Telegram config'i her seferinde env'den taze oku."""
-    return os.environ.get('TELEGRAM_BOT', ''), os.environ.get('TELEGRAM_ID', '')
-
 
 def send_telegram_alert(message: str):
-    """Telegram'a bildirim gönder."""
-    bot_token, chat_id = _get_telegram_config()
-    if not bot_token or not chat_id:
-        print("[Telegram Alert] TELEGRAM_BOT veya TELEGRAM_ID env var ayarlanmamış, bildirim atlanıyor.")
-        return
-    try:
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        http_requests.post(url, json={
-            'chat_id': chat_id,
-            'text': message,
-            'parse_mode': 'HTML'
-        }, timeout=10)
-    except Exception as e:
-        print(f"[Telegram Alert Error] {e}")
+    """Telegram uyarısını gönderim kuyruğuna ekler (services/alert_dispatcher.py) ve commit eder."""
+    from services.alert_dispatcher import queue_alert
+    if queue_alert(message):
+        db.session.commit()
 
 
 def update_module_heartbeat(user_id, module):
-    """Belirli bir modül için heartbeat zamanını günceller veya oluşturur."""
+    """
+    Belirli bir modül için heartbeat zamanını günceller (ingest / upload sonrası).
+    Yazma tamponlanır (services/heartbeat_buffer.py); DB'ye periyodik olarak toplu yazılır.
+    """
     if module not in KNOWN_MODULES:
         return
     try:
-        now = datetime.utcnow()
-        rec = ServiceHeartbeat.query.filter_by(user_id=user_id).first()
-        if rec:
-            module_pings = _load_module_pings(rec)
-            module_pings[module] = now.isoformat()
-            rec.module_pings = json.dumps(module_pings)
-            rec.last_ping_at = now
-        else:
-            module_pings = {m: (now.isoformat() if m == module else None) for m in KNOWN_MODULES}
-            rec = ServiceHeartbeat(
-                user_id=user_id,
-                last_ping_at=now,
-                module_pings=json.dumps(module_pings),
-                received_pings=1,
-                expected_pings=len(KNOWN_MODULES),
-            )
-            db.session.add(rec)
-        db.session.commit()
+        heartbeat_buffer.record(int(user_id), module)
     except Exception as e:
-        db.session.rollback()
         print(f"[Heartbeat Auto-Update Error] {e}")
 
 
+def load_module_pings(user_ids) -> dict:
+    """
+    Kullanıcıların modül bazlı son ping zamanları (module_ping + henüz yazılmamış tampon):
+    {user_id: {modül: datetime}}. Tek sorgu.
+    """
+    user_ids = [int(u) for u in user_ids]
+    result = {u: {} for u in user_ids}
+    if not user_ids:
+        return result
+    for uid, module, ts in db.session.query(
+        ModulePing.user_id, ModulePing.module, ModulePing.last_ping_at,
+    ).filter(ModulePing.user_id.in_(user_ids)):
+        result[uid][module] = ts
+    for uid, pings in heartbeat_buffer.pending_pings(user_ids).items():
+        for m, ts in pings.items():
+            if result[uid].get(m) is None or ts > result[uid][m]:
+                result[uid][m] = ts
+    return result
+
+
 def _load_module_pings(rec) -> dict:
-    """ServiceHeartbeat kaydından module_pings dict'ini yükle."""
-    if not rec or not rec.module_pings:
-        return {}
-    try:
-        return json.loads(rec.module_pings)
-    except Exception:
+    """ServiceHeartbeat kaydının kullanıcısı için {modül: datetime}."""
+    if not rec:
         return {}
+    return load_module_pings([rec.user_id])[int(rec.user_id)]
+
+
+def alive_modules(cutoff: datetime, user_ids=None) -> dict:
+    """
+    cutoff'tan sonra ping atmış modüller: {user_id: {modül, ...}}.
+    module_ping.last_ping_at üzerinde tek index'li aralık sorgusu (+ tampon).
+    """
+    q = db.session.query(ModulePing.user_id, ModulePing.module).filter(ModulePing.last_ping_at >= cutoff)
+    if user_ids is not None:
+        q = q.filter(ModulePing.user_id.in_(list(user_ids)))
+    result = defaultdict(set)
+    for uid, module in q:
+        result[uid].add(module)
+    for uid, pings in heartbeat_buffer.pending_pings(user_ids).items():
+        result[uid].update(m for m, ts in pings.items() if ts >= cutoff)
+    return result
 
 
 def _module_status(module_pings: dict, now: datetime):
     """
     Her modül için alive/dead durumunu döndür.
+    module_pings: {modül: datetime | None}
     Returns: dict {module: {'alive': bool, 'last_ping_at': iso|None}}
     """
     cutoff = now - timedelta(minutes=MODULE_TIMEOUT_MINUTES)
     result = {}
     for m in KNOWN_MODULES:
-        ts_str = module_pings.get(m)
-        if ts_str:
-            try:
-                ts = datetime.fromisoformat(ts_str)
-                alive = ts >= cutoff
-            except Exception:
-                alive = False
-            result[m] = {'alive': alive, 'last_ping_at': ts_str + 'Z' if not ts_str.endswith('Z') else ts_str}
+        ts = module_pings.get(m)
+        if ts:
+            result[m] = {'alive': ts >= cutoff, 'last_ping_at': ts.isoformat() + 'Z'}
         else:
             result[m] = {'alive': False, 'last_ping_at': None}
     return result
@@ -137,35 +131,15 @@ def heartbeat():
     data = request.get_json(silent=True) or {}
     module = data.get('module', '').strip().lower()
 
-    rec = ServiceHeartbeat.query.filter_by(user_id=user_id).first()
-    if rec:
-        module_pings = _load_module_pings(rec)
-        if module and module in KNOWN_MODULES:
-            module_pings[module] = now.isoformat()
-        else:
-            # Geriye dönük uyumluluk: modül belirtilmemişse tüm modülleri güncelle
-            for m in KNOWN_MODULES:
-                module_pings[m] = now.isoformat()
-        rec.module_pings = json.dumps(module_pings)
-        rec.last_ping_at = now
+    if module and module in KNOWN_MODULES:
+        modules = [module]
     else:
-        module_pings = {}
-        if module and module in KNOWN_MODULES:
-            module_pings[module] = now.isoformat()
-        else:
-            for m in KNOWN_MODULES:
-                module_pings[m] = now.isoformat()
-        rec = ServiceHeartbeat(
-            user_id=user_id,
-            last_ping_at=now,
-            module_pings=json.dumps(module_pings),
-            received_pings=1,
-            expected_pings=len(KNOWN_MODULES),
-        )
-        db.session.add(rec)
+        # Geriye dönük uyumluluk: modül belirtilmemişse tüm modülleri güncelle
+        modules = KNOWN_MODULES
+    heartbeat_buffer.write_pings([(user_id, m, now) for m in modules])
     db.session.commit()
 
-    overall = _overall_status(module_pings, now)
+    overall = _overall_status(load_module_pings([user_id])[int(user_id)], now)
     return {
         'status': 'ok',
         'module': module or 'all',
@@ -241,9 +215,7 @@ def heartbeat_status():
             'message': 'Henüz heartbeat gelmedi. Mağaza scripti çalışıyor mu?'
         }
 
-    module_pings = _load_module_pings(rec)
-    # Sadece KNOWN_MODULES'daki modülleri filtrele
-    filtered_pings = {m: module_pings.get(m) for m in KNOWN_MODULES}
+    filtered_pings = _load_module_pings(rec)
     modules = _module_status(filtered_pings, now)
     overall = _overall_status(filtered_pings, now)
     is_alive = overall in ('alive', 'partial')
@@ -290,8 +262,8 @@ def heartbeat_status():
     }
 
 
-def _build_store_entry(u, h, now):
-    """Tek mağaza için durum dict'i oluştur."""
+def _build_store_entry(u, h, now, module_pings=None):
+    """Tek mağaza için durum dict'i oluştur. module_pings: {modül: datetime} (load_module_pings)."""
     if not h:
         return {
             'id': u.id, 'username': u.username, 'email': u.email,
@@ -301,9 +273,7 @@ def _build_store_entry(u, h, now):
             'modules': {m: {'alive': False, 'last_ping_at': None} for m in KNOWN_MODULES},
             'received_pings': 0, 'expected_pings': len(KNOWN_MODULES), 'ratio': f"0/{len(KNOWN_MODULES)}",
         }
-    module_pings = _load_module_pings(h)
-    # Sadece KNOWN_MODULES'daki modülleri filtrele
-    filtered_pings = {m: module_pings.get(m) for m in KNOWN_MODULES}
+    filtered_pings = module_pings if module_pings is not None else _load_module_pings(h)
     modules = _module_status(filtered_pings, now)
     overall = _overall_status(filtered_pings, now)
     alive_count = sum(1 for v in modules.values() if v['alive'])
@@ -329,10 +299,11 @@ def admin_health_overview():
     heartbeats = {h.user_id: h for h in ServiceHeartbeat.query.filter(
         ServiceHeartbeat.user_id.in_([u.id for u in users])
     ).all()}
+    pings = load_module_pings(list(heartbeats))
     result = []
     for u in users:
         h = heartbeats.get(u.id)
-        entry = _build_store_entry(u, h, now)
+        entry = _build_store_entry(u, h, now, pings.get(u.id))
         result.append(entry)
     # Sıralama: dead önce, partial ortada, alive sonda
     order = {'dead': 0, 'partial': 1, 'alive': 2}
@@ -345,39 +316,43 @@ def run_dead_service_check():
     Dead/partial service kontrolü. Hem route hem scheduler tarafından çağrılabilir.
     Flask uygulama context'i içinde çağrılmalıdır.
     Sadece primary_user_id'si olan şirketlerin kullanıcılarını kontrol eder.
+    Mağaza sayısından bağımsız sabit sayıda sorgu çalışır; süreler sonuçta timings_ms altında döner.
     """
     from models import Company, SiteConfig
+    t0 = time.perf_counter()
     now = datetime.utcnow()
     local_hour = (now + timedelta(hours=3)).hour  # TSİ saati
+    local_minute = (now + timedelta(hours=3)).minute
 
-    all_heartbeats = ServiceHeartbeat.query.all()
-    heartbeat_map = {h.user_id: h for h in all_heartbeats}
-
-    # Sadece primary_user'ları kontrol et (asıl veri sahibi kullanıcılar)
-    companies_with_primary = Company.query.filter(Company.primary_user_id.isnot(None)).all()
-    primary_user_ids = [c.primary_user_id for c in companies_with_primary]
-    # Ayrıca heartbeat kaydı olup company'ye bağlı olmayan tekil user'lar
-    for h in all_heartbeats:
-        if h.user_id not in primary_user_ids:
-            u = User.query.get(h.user_id)
-            if u and u.role != 'admin' and u.is_active:
-                primary_user_ids.append(h.user_id)
+    # Sabit sayıda toplu sorgu: heartbeat'ler, primary user'lar, kullanıcılar, mesai saatleri, canlı modüller
+    heartbeat_map = {h.user_id: h for h in ServiceHeartbeat.query.all()}
+    primary_user_ids = {uid for (uid,) in db.session.query(Company.primary_user_id).filter(
+        Company.primary_user_id.isnot(None)
+    )}
+    candidate_ids = [uid for uid in heartbeat_map]  # heartbeat'i olmayan kullanıcı değerlendirilmez
+    users = {u.id: u for u in User.query.filter(User.id.in_(candidate_ids)).all()} if candidate_ids else {}
+    sites = {s.user_id: s for s in SiteConfig.query.filter(SiteConfig.user_id.in_(candidate_ids)).all()} \
+        if candidate_ids else {}
+    # Canlı modüller: module_ping.last_ping_at üzerinde tek aralık sorgusu
+    alive_map = alive_modules(now - timedelta(minutes=MODULE_TIMEOUT_MINUTES), candidate_ids)
+    t_load = time.perf_counter()
 
     dead_users = []
     partial_users = []
     alive_users = []
-    local_minute = (now + timedelta(hours=3)).minute
+    known = set(KNOWN_MODULES)
 
-    for uid in set(primary_user_ids):
-        u = User.query.get(uid)
+    for uid in candidate_ids:
+        u = users.get(uid)
         if not u or not u.is_active:
             continue
-        h = heartbeat_map.get(uid)
-        if h is None:
+        # Sadece primary_user'lar (asıl veri sahibi) ve company'ye bağlı olmayan tekil, admin olmayan user'lar
+        if uid not in primary_user_ids and u.role == 'admin':
             continue
+        h = heartbeat_map[uid]
 
         # Mesai dışı saatlerde dead sayma
-        site = SiteConfig.query.filter_by(user_id=uid).first()
+        site = sites.get(uid)
         work_start = site.work_start if site and site.work_start is not None else 9
         work_end = site.work_end if site and site.work_end is not None else 22
         if local_hour >= work_end or local_hour < work_start:
@@ -389,16 +364,14 @@ def run_dead_service_check():
         if 0 <= minutes_since_start < MODULE_TIMEOUT_MINUTES:
             continue
 
-        module_pings = _load_module_pings(h)
-        # Sadece KNOWN_MODULES'daki modülleri filtrele
-        filtered_pings = {m: module_pings.get(m) for m in KNOWN_MODULES}
-        overall = _overall_status(filtered_pings, now)
-        if overall == 'dead':
-            dead_users.append((u, h, filtered_pings))
-        elif overall == 'partial':
-            partial_users.append((u, h, filtered_pings))
+        alive_mods = alive_map.get(uid, set()) & known
+        if not alive_mods:
+            dead_users.append((u, h, alive_mods))
+        elif len(alive_mods) < len(KNOWN_MODULES):
+            partial_users.append((u, h, alive_mods))
         else:
-            alive_users.append((u, h, filtered_pings))
+            alive_users.append((u, h, alive_mods))
+    t_eval = time.perf_counter()
 
     MODULE_LABELS = {'counting': 'Kişi Sayım', 'heatmap': 'Isı Haritası', 'queue': 'Kasa Analizi'}
 
@@ -406,13 +379,11 @@ def run_dead_service_check():
         local_dt = h.last_ping_at + timedelta(hours=3)
         return local_dt.strftime('%d.%m.%Y %H:%M')
 
-    def fmt_modules(mp, now):
-        statuses = _module_status(mp, now)
+    def fmt_modules(alive_mods):
         parts = []
         for m in KNOWN_MODULES:
             label = MODULE_LABELS.get(m, m)
-            alive = statuses[m]['alive']
-            parts.append(f"{'✅' if alive else '❌'} {label}")
+            parts.append(f"{'✅' if m in alive_mods else '❌'} {label}")
         return ' | '.join(parts)
 
     if dead_users or partial_users or alive_users:
@@ -422,13 +393,13 @@ def run_dead_service_check():
             message += f"<b>❌ Kapalı ({len(dead_users)}):</b>\n"
             for u, h, mp in dead_users:
                 name = u.full_name or u.username
-                message += f"🔴 <b>{name}</b>\n   {fmt_modules(mp, now)}\n   Son: {fmt_time(h)} TSİ\n\n"
+                message += f"🔴 <b>{name}</b>\n   {fmt_modules(mp)}\n   Son: {fmt_time(h)} TSİ\n\n"
         if partial_users:
             message += f"<b>⚠️ Kısmi ({len(partial_users)}):</b>\n"
             for u, h, mp in partial_users:
                 name = u.full_name or u.username
-                dead_mods = [MODULE_LABELS.get(m, m) for m in KNOWN_MODULES if not (_module_status(mp, now)[m]['alive'])]
-                message += f"⚠️ <b>{name}</b>\n   Sorunlu: {', '.join(dead_mods)}\n   {fmt_modules(mp, now)}\n   Son: {fmt_time(h)} TSİ\n\n"
+                dead_mods = [MODULE_LABELS.get(m, m) for m in KNOWN_MODULES if m not in mp]
+                message += f"⚠️ <b>{name}</b>\n   Sorunlu: {', '.join(dead_mods)}\n   {fmt_modules(mp)}\n   Son: {fmt_time(h)} TSİ\n\n"
         if alive_users:
             message += f"<b>✅ Aktif ({len(alive_users)}):</b>\n"
             for u, h, mp in alive_users:
@@ -436,16 +407,22 @@ def run_dead_service_check():
                 message += f"✅ <b>{name}</b> — Son: {fmt_time(h)} TSİ\n"
         if dead_users or partial_users:
             message += "\n⚡ Sorunlu mağazaların sistem durumunu kontrol edin."
-        thread = threading.Thread(target=send_telegram_alert, args=(message,))
-        thread.daemon = True
-        thread.start()
+        send_telegram_alert(message)
 
+    t_end = time.perf_counter()
     return {
         'checked_at': datetime.utcnow().isoformat(),
         'dead_count': len(dead_users),
         'partial_count': len(partial_users),
         'alive_count': len(alive_users),
         'alerts_sent': len(dead_users) > 0 or len(partial_users) > 0,
+        'checked_count': len(candidate_ids),
+        'timings_ms': {
+            'load': round((t_load - t0) * 1000, 1),
+            'evaluate': round((t_eval - t_load) * 1000, 1),
+            'message': round((t_end - t_eval) * 1000, 1),
+            'total': round((t_end - t0) * 1000, 1),
+        },
     }
 
 
@@ -9,8 +9,9 @@ from collections import defaultdict
 from sqlalchemy import func
 from zoneinfo import ZoneInfo
 
-from models import db, CustomerData, QueueData, HeatmapData, StaffData
+from models import db, CustomerData, CustomerHourly, QueueData, QueueHourly, HeatmapData, StaffData
 from user_context import get_resolved_user_ids
+from services.cache_service import cached_response
 
 insights_bp = Blueprint('insights', __name__)
 ISTANBUL_TZ = ZoneInfo("Europe/Istanbul")
@@ -28,6 +29,7 @@ def _user_ids():
 
 @insights_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
+@cached_response(relative_to_today=True)
 def dashboard_insights():
     """Dashboard için genel öneriler."""
     user_ids = _user_ids()
@@ -43,28 +45,32 @@ def dashboard_insights():
     last_week_utc_start, _ = _get_utc_range_for_local_date(two_weeks_ago_local)
     _, last_week_utc_end = _get_utc_range_for_local_date(week_ago_local - timedelta(days=1))
 
-    this_week = CustomerData.query.filter(
-        CustomerData.user_id.in_(user_ids),
-        CustomerData.timestamp >= this_week_utc_start,
-        CustomerData.timestamp <= this_week_utc_end
+    # Saatlik rollup (kamera-saat başına bir satır)
+    this_week = CustomerHourly.query.filter(
+        CustomerHourly.user_id.in_(user_ids),
+        CustomerHourly.hour >= this_week_utc_start,
+        CustomerHourly.hour <= this_week_utc_end
     ).all()
 
-    last_week = CustomerData.query.filter(
-        CustomerData.user_id.in_(user_ids),
-        CustomerData.timestamp >= last_week_utc_start,
-        CustomerData.timestamp <= last_week_utc_end
+    last_week = CustomerHourly.query.filter(
+        CustomerHourly.user_id.in_(user_ids),
+        CustomerHourly.hour >= last_week_utc_start,
+        CustomerHourly.hour <= last_week_utc_end
     ).all()
 
     this_entered = sum(r.entered or 0 for r in this_week)
     last_entered = sum(r.entered or 0 for r in last_week)
 
     # Kuyruk analizi
-    queue_this_week = QueueData.query.filter(
-        QueueData.user_id.in_(user_ids),
-        db.func.coalesce(QueueData.recorded_at, QueueData.created_at) >= this_week_utc_start,
-        db.func.coalesce(QueueData.recorded_at, QueueData.created_at) <= this_week_utc_end
-    ).all()
-    avg_wait = sum(r.wait_time or 0 for r in queue_this_week) / max(len(queue_this_week), 1)
+    queue_wait_sum, queue_rows = db.session.query(
+        func.coalesce(func.sum(QueueHourly.wait_nonzero_sum), 0),
+        func.coalesce(func.sum(QueueHourly.row_count), 0),
+    ).filter(
+        QueueHourly.user_id.in_(user_ids),
+        QueueHourly.hour >= this_week_utc_start,
+        QueueHourly.hour <= this_week_utc_end
+    ).one()
+    avg_wait = queue_wait_sum / max(queue_rows, 1)
 
     insights = []
 
@@ -86,10 +92,10 @@ def dashboard_insights():
         return {'insights': insights}
 
     # 1. Hafta içi vs hafta sonu karşılaştırması
-    weekday_entered = sum(r.entered or 0 for r in this_week if r.timestamp and r.timestamp.weekday() < 5)
-    weekend_entered = sum(r.entered or 0 for r in this_week if r.timestamp and r.timestamp.weekday() >= 5)
-    weekday_days = max(len(set(r.timestamp.date() for r in this_week if r.timestamp and r.timestamp.weekday() < 5)), 1)
-    weekend_days = max(len(set(r.timestamp.date() for r in this_week if r.timestamp and r.timestamp.weekday() >= 5)), 1)
+    weekday_entered = sum(r.entered or 0 for r in this_week if r.hour.weekday() < 5)
+    weekend_entered = sum(r.entered or 0 for r in this_week if r.hour.weekday() >= 5)
+    weekday_days = max(len(set(r.hour.date() for r in this_week if r.hour.weekday() < 5)), 1)
+    weekend_days = max(len(set(r.hour.date() for r in this_week if r.hour.weekday() >= 5)), 1)
     weekday_avg = weekday_entered / weekday_days
     weekend_avg = weekend_entered / weekend_days if weekend_entered > 0 else 0
     if weekend_avg > 0 and weekday_avg > 0:
@@ -114,8 +120,7 @@ def dashboard_insights():
     # 2. Saat bazlı en verimli pencere (çift saat dilimi)
     by_hour = defaultdict(int)
     for r in this_week:
-        if r.timestamp:
-            by_hour[r.timestamp.hour] += (r.entered or 0)
+        by_hour[r.hour.hour] += (r.entered or 0)
     if len(by_hour) >= 3:
         peak_hour = max(by_hour, key=by_hour.get)
         total_h = sum(by_hour.values())
@@ -191,6 +196,7 @@ def dashboard_insights():
 
 @insights_bp.route('/customer', methods=['GET'])
 @jwt_required()
+@cached_response(relative_to_today=True)
 def customer_insights():
     """Müşteri analizi önerileri - Her zaman tam 3 premium kart döner."""
     user_ids = _user_ids()
@@ -368,6 +374,7 @@ def customer_insights():
 
 @insights_bp.route('/queue', methods=['GET'])
 @jwt_required()
+@cached_response(relative_to_today=True)
 def queue_insights():
     """Kuyruk analizi önerileri."""
     user_ids = _user_ids()
@@ -470,6 +477,7 @@ def queue_insights():
 
 @insights_bp.route('/heatmap', methods=['GET'])
 @jwt_required()
+@cached_response(relative_to_today=True)
 def heatmap_insights():
     """Isı haritası önerileri."""
     user_ids = _user_ids()
@@ -631,6 +639,7 @@ def staff_insights():
 
 @insights_bp.route('/flow', methods=['GET'])
 @jwt_required()
+@cached_response(relative_to_today=True)
 def flow_insights():
     """Günlük akış önerileri."""
     user_ids = _user_ids()
@@ -729,7 +738,7 @@ def flow_insights():
 def camera_health_insights():
     """Kamera sağlığı önerileri — gerçek heartbeat verisine dayalı."""
     from models import ServiceHeartbeat, SiteConfig, Company
-    from routes.health import KNOWN_MODULES, MODULE_TIMEOUT_MINUTES, _load_module_pings
+    from routes.health import KNOWN_MODULES, MODULE_TIMEOUT_MINUTES, load_module_pings
     user_ids = _user_ids()
     now = datetime.utcnow()
     cutoff = now - timedelta(minutes=MODULE_TIMEOUT_MINUTES)
@@ -752,21 +761,18 @@ def camera_health_insights():
     total_modules = len(KNOWN_MODULES)
     last_ping = None
 
+    pings = load_module_pings([rec.user_id for rec in recs])
     for rec in recs:
-        mp = _load_module_pings(rec)
+        mp = pings[int(rec.user_id)]
         for m in KNOWN_MODULES:
-            ping_str = mp.get(m)
-            if ping_str:
-                try:
-                    ping_dt = datetime.fromisoformat(ping_str)
-                    if ping_dt > cutoff:
-                        alive_modules += 1
-                    else:
-                        dead_modules.append(m)
-                    if last_ping is None or ping_dt > last_ping:
-                        last_ping = ping_dt
-                except (ValueError, TypeError):
+            ping_dt = mp.get(m)
+            if ping_dt:
+                if ping_dt > cutoff:
+                    alive_modules += 1
+                else:
                     dead_modules.append(m)
+                if last_ping is None or ping_dt > last_ping:
+                    last_ping = ping_dt
             else:
                 dead_modules.append(m)
 
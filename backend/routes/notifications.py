@@ -1,54 +1,35 @@
 """
 Anomali Tespiti & Bildirim Sistemi
-- Saatlik müşteri akışı ortalamanın %50 altına düştüğünde uyarı
+- Saatlik müşteri akışı aynı saatin taban çizgisinin (EWMA) belirgin altına düştüğünde uyarı
 - Kuyruk bekleme süresi eşiği aştığında uyarı
 - Telegram + Panel içi bildirim
 """
-import threading
-from datetime import datetime, timedelta
+from datetime import datetime
 from flask import Blueprint, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
-from models import db, CustomerData, QueueData, Notification, User
+from models import db, QueueHourly, Notification, User
+from services.anomaly_baseline import hour_entered, observe, BASELINE_WINDOW_DAYS
+from services.alert_dispatcher import queue_alert
+from services.event_bus import publish
+from services.unread_counters import adjust as adjust_unread, get_counts as get_unread_counts
 from user_context import get_resolved_user_ids
 from auth_utils import admin_required
 
 notifications_bp = Blueprint('notifications', __name__)
 
 # Eşik değerleri
-CUSTOMER_DROP_THRESHOLD = 0.50  # Ortalamanın %50 altı
+CUSTOMER_DROP_ZSCORE = 2.0  # Taban çizgisinin 2 standart sapma altı
+CUSTOMER_DROP_MIN_PCT = 0.20  # ...ve en az %20 düşüş
+CUSTOMER_DROP_THRESHOLD = 0.50  # Varyans yoksa: ortalamanın %50 altı
+BASELINE_MIN_SAMPLES = 3  # Taban çizgisi için gereken en az gün sayısı
 QUEUE_WAIT_THRESHOLD_SECONDS = 600  # 10 dakika üzeri kuyruk bekleme
 
 
-def _get_telegram_config():
-    """Telegram config'i health.py'den al (tek kaynak)."""
-    import os
-    bot_token = os.environ.get('TELEGRAM_BOT', '')
-    chat_id = os.environ.get('TELEGRAM_ID', '')
-    return bot_token, chat_id
-
-
-def _send_telegram(message: str):
-    """Telegram bildirim gönder."""
-    bot_token, chat_id = _get_telegram_config()
-    if not bot_token or not chat_id:
-        return
-    try:
-        import requests as http_requests
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        http_requests.post(url, json={
-            'chat_id': chat_id,
-            'text': message,
-            'parse_mode': 'HTML'
-        }, timeout=10)
-    except Exception as e:
-        print(f"[Anomaly Telegram Error] {e}")
-
-
 def check_anomalies_for_user(user_id: int, user_name: str = '', data_timestamp: datetime = None):
     """
     Belirli bir kullanıcı için anomali kontrolü yapar.
-    Bu fonksiyon, veri POST edildiğinde (saatlik veri geldiğinde) çağrılır.
+    Veri POST edildiğinde arka plan kuyruğundan (enqueue_anomaly_checks) çağrılır.
     data_timestamp: POST edilen verinin timestamp'i (None ise şimdiki zaman)
     """
     now = datetime.now()
@@ -60,75 +41,56 @@ def check_anomalies_for_user(user_id: int, user_name: str = '', data_timestamp:
     if current_hour >= 22 or current_hour < 8:
         return
 
-    # Son 7 günün aynı saatindeki ortalama müşteri sayısını hesapla
-    seven_days_ago = now - timedelta(days=7)
-
-    historical_rows = CustomerData.query.filter(
-        CustomerData.user_id == user_id,
-        CustomerData.timestamp >= seven_days_ago,
-        CustomerData.timestamp < ref_time - timedelta(hours=1),
-    ).all()
-
-    # Aynı saatteki geçmiş veriler
-    same_hour_entries = [
-        r for r in historical_rows
-        if r.timestamp and r.timestamp.hour == current_hour
-    ]
-
-    if len(same_hour_entries) < 3:
-        return  # Yeterli geçmiş veri yok, anomali tespiti yapma
-
-    avg_entered = sum(getattr(r, 'entered', 0) or 0 for r in same_hour_entries) / len(same_hour_entries)
-
-    # Ortalama çok düşükse (mağaza zaten trafiksiz saatler) uyarı üretme
-    if avg_entered < 5:
-        return
-
     # Verinin timestamp'ine göre o saatin aralığı
     ref_date = ref_time.date()
     today_start = datetime.combine(ref_date, datetime.min.time())
     today_hour_start = today_start.replace(hour=current_hour)
-    today_hour_end = today_hour_start + timedelta(hours=1)
 
-    today_rows = CustomerData.query.filter(
-        CustomerData.user_id == user_id,
-        CustomerData.timestamp >= today_hour_start,
-        CustomerData.timestamp < today_hour_end,
-    ).all()
+    # Bu saatin toplam girişi (customer_hourly) ve aynı saatin geçmiş günlerdeki taban çizgisi
+    today_entered = hour_entered(user_id, today_hour_start)
+    avg_entered, std_entered, samples = observe(user_id, today_hour_start, today_entered)
+    db.session.commit()
 
-    today_entered = sum(getattr(r, 'entered', 0) or 0 for r in today_rows)
-    
     alerts = []
-    
-    # Anomali 1: Müşteri trafiği ortalamanın %50 altında
-    if avg_entered > 0 and today_entered < avg_entered * CUSTOMER_DROP_THRESHOLD:
-        drop_pct = round((1 - today_entered / avg_entered) * 100, 1)
-        title = f"Müşteri Trafiği Düşük ({current_hour}:00)"
-        message = (
-            f"Saat {current_hour}:00'da {today_entered} müşteri girişi yapıldı. "
-            f"7 günlük ortalama: {round(avg_entered)} ({drop_pct}% düşüş)."
-        )
-        alerts.append(('anomaly', title, message))
-    
-    # Anomali 2: Kuyruk bekleme süresi eşiği
-    queue_rows = QueueData.query.filter(
-        QueueData.user_id == user_id,
-        db.func.coalesce(QueueData.recorded_at, QueueData.created_at) >= today_hour_start,
-        db.func.coalesce(QueueData.recorded_at, QueueData.created_at) < today_hour_end,
-    ).all()
-    
-    if queue_rows:
-        waits = [r.wait_time for r in queue_rows if r.wait_time]
-        if waits:
-            avg_wait = sum(waits) / len(waits)
-            if avg_wait > QUEUE_WAIT_THRESHOLD_SECONDS:
-                wait_min = round(avg_wait / 60, 1)
-                title = f"Kuyruk Süresi Yüksek ({current_hour}:00)"
-                message = (
-                    f"Saat {current_hour}:00'da ortalama kuyruk bekleme süresi {wait_min} dakika. "
-                    f"Eşik: {QUEUE_WAIT_THRESHOLD_SECONDS // 60} dakika."
-                )
-                alerts.append(('warning', title, message))
+
+    # Anomali 1: Müşteri trafiği taban çizgisinin belirgin altında.
+    # Yeterli geçmiş yoksa veya ortalama çok düşükse (trafiksiz saatler) uyarı üretme.
+    if samples >= BASELINE_MIN_SAMPLES and avg_entered >= 5:
+        if std_entered > 0:
+            z = (today_entered - avg_entered) / std_entered
+            # Düşük varyanslı saatlerde küçük oynamalar uyarı üretmesin
+            is_drop = z <= -CUSTOMER_DROP_ZSCORE and today_entered <= avg_entered * (1 - CUSTOMER_DROP_MIN_PCT)
+        else:
+            # Varyans yok (tüm günler aynı): sabit oran eşiği
+            is_drop = today_entered < avg_entered * CUSTOMER_DROP_THRESHOLD
+        if is_drop:
+            drop_pct = round((1 - today_entered / avg_entered) * 100, 1)
+            title = f"Müşteri Trafiği Düşük ({current_hour}:00)"
+            message = (
+                f"Saat {current_hour}:00'da {today_entered} müşteri girişi yapıldı. "
+                f"{BASELINE_WINDOW_DAYS} günlük ortalama: {round(avg_entered)} ({drop_pct}% düşüş)."
+            )
+            alerts.append(('anomaly', title, message))
+
+    # Anomali 2: Kuyruk bekleme süresi eşiği (sıfır olmayan beklemelerin ortalaması, queue_hourly)
+    nz_sum, nz_count = db.session.query(
+        db.func.coalesce(db.func.sum(QueueHourly.wait_nonzero_sum), 0),
+        db.func.coalesce(db.func.sum(QueueHourly.wait_nonzero_count), 0),
+    ).filter(
+        QueueHourly.user_id == user_id,
+        QueueHourly.hour == today_hour_start,
+    ).one()
+
+    if nz_count:
+        avg_wait = nz_sum / nz_count
+        if avg_wait > QUEUE_WAIT_THRESHOLD_SECONDS:
+            wait_min = round(avg_wait / 60, 1)
+            title = f"Kuyruk Süresi Yüksek ({current_hour}:00)"
+            message = (
+                f"Saat {current_hour}:00'da ortalama kuyruk bekleme süresi {wait_min} dakika. "
+                f"Eşik: {QUEUE_WAIT_THRESHOLD_SECONDS // 60} dakika."
+            )
+            alerts.append(('warning', title, message))
     
     # Bildirimleri kaydet ve Telegram'a gönder
     for alert_type, title, message in alerts:
@@ -150,9 +112,11 @@ def check_anomalies_for_user(user_id: int, user_name: str = '', data_timestamp:
             message=message,
         )
         db.session.add(notif)
-        db.session.commit()
+        db.session.flush()
+        adjust_unread(user_id, notifications=1)
+        publish(user_id, 'notification', notif.to_dict())
         
-        # Telegram'a gönder
+        # Telegram: aynı transaction'da kuyruğa (services/alert_dispatcher.py toplu gönderir)
         store_name = user_name or f"User #{user_id}"
         emoji = "⚠️" if alert_type == 'warning' else "🔴"
         tg_message = (
@@ -161,13 +125,31 @@ def check_anomalies_for_user(user_id: int, user_name: str = '', data_timestamp:
             f"📌 {title}\n"
             f"💬 {message}"
         )
-        thread = threading.Thread(target=_send_telegram, args=(tg_message,))
-        thread.daemon = True
-        thread.start()
+        queue_alert(tg_message)
+        db.session.commit()
+
+
+def enqueue_anomaly_checks(user_id: int, timestamps):
+    """
+    Veri gelen saatler için anomali kontrolünü arka plan kuyruğuna ekler (services/job_queue.py).
+    Aynı kullanıcı + saat için bekleyen kontrol varsa birleştirilir. Commit etmez.
+    """
+    from services.job_queue import enqueue
+    hours = {ts.replace(minute=0, second=0, microsecond=0) for ts in timestamps if ts}
+    for hour_ts in sorted(hours):
+        enqueue('anomaly_check', f'anomaly:{int(user_id)}:{hour_ts:%Y-%m-%dT%H}',
+                {'user_id': int(user_id), 'hour': hour_ts.isoformat()})
 
 
 # --- API Endpoints ---
 
+def _unread_by_user(q):
+    """Sorgudaki okunmamış bildirimlerin kullanıcı bazında sayısı [(user_id, n)] (sayaç düşümü için)."""
+    return q.filter(Notification.is_read == False).with_entities(
+        Notification.user_id, db.func.count(Notification.id)
+    ).group_by(Notification.user_id).all()
+
+
 @notifications_bp.route('/notifications', methods=['GET'])
 @jwt_required()
 def get_notifications():
@@ -185,29 +167,26 @@ def get_notifications():
         q = q.filter(Notification.is_read == False)
     
     pagination = q.order_by(Notification.created_at.desc()).paginate(page=page, per_page=per_page)
+    unread_count = get_unread_counts(user_ids)['notifications']
+    db.session.commit()  # eksik sayaç satırı oluşturulduysa
     
     return {
         'notifications': [n.to_dict() for n in pagination.items],
         'total': pagination.total,
-        'unread_count': Notification.query.filter(
-            Notification.user_id.in_(user_ids),
-            Notification.is_read == False
-        ).count(),
+        'unread_count': unread_count,
     }
 
 
 @notifications_bp.route('/notifications/unread-count', methods=['GET'])
 @jwt_required()
 def get_unread_count():
-    """Okunmamış bildirim sayısı (badge için)."""
+    """Okunmamış bildirim sayısı (badge için) — unread_counters tablosundan."""
     user_ids, _ = get_resolved_user_ids()
     if not user_ids:
         user_ids = [get_jwt_identity()]
     
-    count = Notification.query.filter(
-        Notification.user_id.in_(user_ids),
-        Notification.is_read == False
-    ).count()
+    count = get_unread_counts(user_ids)['notifications']
+    db.session.commit()  # eksik sayaç satırı oluşturulduysa
     
     return {'unread_count': count}
 
@@ -230,7 +209,10 @@ def mark_notifications_read():
     if notification_ids:
         q = q.filter(Notification.id.in_(notification_ids))
     
+    marked = _unread_by_user(q)
     q.update({Notification.is_read: True}, synchronize_session=False)
+    for uid, n in marked:
+        adjust_unread(uid, notifications=-n)
     db.session.commit()
     
     return {'message': 'Bildirimler okundu olarak işaretlendi'}
@@ -249,7 +231,11 @@ def delete_notification(notif_id: int):
     ).first()
     if not notif:
         return {'error': 'Bildirim bulunamadı'}, 404
+    was_unread = not notif.is_read
     db.session.delete(notif)
+    db.session.flush()
+    if was_unread:
+        adjust_unread(notif.user_id, notifications=-1)
     db.session.commit()
     return {'message': 'Bildirim silindi'}
 
@@ -261,7 +247,11 @@ def delete_all_notifications():
     user_ids, _ = get_resolved_user_ids()
     if not user_ids:
         user_ids = [get_jwt_identity()]
-    Notification.query.filter(Notification.user_id.in_(user_ids)).delete(synchronize_session=False)
+    q = Notification.query.filter(Notification.user_id.in_(user_ids))
+    unread = _unread_by_user(q)
+    q.delete(synchronize_session=False)
+    for uid, n in unread:
+        adjust_unread(uid, notifications=-n)
     db.session.commit()
     return {'message': 'Tüm bildirimler silindi'}
 
@@ -271,7 +261,7 @@ def delete_all_notifications():
 def trigger_anomaly_check():
     """
     Manuel anomali kontrolü tetikle. 
-    Normalde veri POST edildiğinde otomatik çağrılır.
+    Normalde veri POST edildiğinde arka plan kuyruğu üzerinden otomatik çağrılır.
     """
     user_id = get_jwt_identity()
     try:
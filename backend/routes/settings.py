@@ -3,8 +3,9 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 
 import json
 from models import db, User, SiteConfig, CameraConfig, CameraZone, ManagedStore
-from user_context import get_settings_user_id, get_resolved_user_ids
+from user_context import get_settings_user_id, get_resolved_user_ids, invalidate_access_cache
 from auth_utils import write_permission_required
+from services.cache_service import bump_config
 
 settings_bp = Blueprint('settings', __name__)
 
@@ -128,7 +129,9 @@ def update_work_hours():
     else:
         site = SiteConfig(user_id=user_id, work_start=start, work_end=end)
         db.session.add(site)
+    bump_config([int(user_id)])  # saatlik özetler mesai saatine göre üretildiği için önbelleği geçersiz kıl
     db.session.commit()
+    invalidate_access_cache()
     return {'work_start': start, 'work_end': end, 'message': 'Mesai saatleri güncellendi'}
 
 
@@ -241,7 +244,9 @@ def post_setup():
     else:
         site = SiteConfig(user_id=user_id, site_name=site_name)
         db.session.add(site)
+        bump_config([int(user_id)])  # yeni SiteConfig mesai saatlerini değiştirebilir
     db.session.commit()
+    invalidate_access_cache()
 
     cameras_data = data.get('cameras') or []
 
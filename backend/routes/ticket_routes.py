@@ -7,9 +7,12 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from sqlalchemy import or_
+from sqlalchemy.orm import aliased
 
 from models import db, User, Ticket, TicketReply
 from auth_utils import admin_required
+from services.event_bus import publish
+from services.unread_counters import adjust as adjust_unread, get_counts as get_unread_counts, last_staff_reply_at
 
 ticket_bp = Blueprint('tickets', __name__)
 
@@ -41,24 +44,50 @@ def _is_admin():
         return False
 
 
+def _user_unread(ticket, last_staff_at) -> bool:
+    """Kullanıcı için okunmamış: son personel cevabı kullanıcının son okumasından yeni."""
+    if not last_staff_at:
+        return False
+    return ticket.user_read_at is None or last_staff_at > ticket.user_read_at
+
+
+def _ticket_last_staff_at(ticket_id):
+    return db.session.query(db.func.max(TicketReply.created_at)).filter(
+        TicketReply.ticket_id == ticket_id, TicketReply.is_staff == True
+    ).scalar()
+
+
+def _admin_unread(ticket) -> bool:
+    return ticket.admin_read_at is None or bool(ticket.updated_at and ticket.updated_at > ticket.admin_read_at)
+
+
 @ticket_bp.route('', methods=['GET'])
 @jwt_required()
 def list_tickets():
-    """GET /api/tickets — Kullanıcı kendi ticket'ları; admin tümü (q, status, priority, category)."""
+    """
+    GET /api/tickets — Kullanıcı kendi ticket'ları; admin tümü (q, status, priority, category, page, per_page).
+    Yazar / kapatan kullanıcı ve son personel cevabı tek sorguda join ile gelir.
+    """
     user_id = _current_user_id()
     if not user_id:
         return jsonify({'error': 'Kullanıcı bilgisi alınamadı.', 'tickets': []}), 400
 
+    author = aliased(User)
+    closer = aliased(User)
     if _is_admin():
-        q = Ticket.query
+        q = (
+            db.session.query(Ticket, author, closer)
+            .outerjoin(author, Ticket.user_id == author.id)
+            .outerjoin(closer, Ticket.closed_by_user_id == closer.id)
+        )
         search = request.args.get('q', '').strip()
         if search:
-            q = q.join(User, Ticket.user_id == User.id).filter(
+            q = q.filter(
                 or_(
                     Ticket.subject.ilike(f'%{search}%'),
                     Ticket.message.ilike(f'%{search}%'),
-                    User.username.ilike(f'%{search}%'),
-                    User.email.ilike(f'%{search}%'),
+                    author.username.ilike(f'%{search}%'),
+                    author.email.ilike(f'%{search}%'),
                 )
             )
         status = request.args.get('status', '').strip()
@@ -93,27 +122,31 @@ def list_tickets():
                 q = q.filter(Ticket.user_id == int(user_id_filter))
             except ValueError:
                 pass
-        rows = q.order_by(Ticket.updated_at.desc()).all()
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 200)
+        pagination = q.order_by(Ticket.updated_at.desc(), Ticket.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
         tickets = []
-        for t in rows:
-            d = t.to_dict(include_user=True)
-            d['unread'] = t.admin_read_at is None or (t.updated_at and t.admin_read_at and t.updated_at > t.admin_read_at)
+        for t, a, c in pagination.items:
+            d = t.to_dict(include_user=True, users={u.id: u for u in (a, c) if u})
+            d['unread'] = _admin_unread(t)
             tickets.append(d)
-        return jsonify({'tickets': tickets})
+        return jsonify({'tickets': tickets, 'total': pagination.total, 'page': page, 'per_page': per_page})
     else:
-        rows = Ticket.query.filter_by(user_id=user_id).order_by(Ticket.updated_at.desc()).all()
+        rows = (
+            db.session.query(Ticket, closer, last_staff_reply_at())
+            .outerjoin(closer, Ticket.closed_by_user_id == closer.id)
+            .filter(Ticket.user_id == user_id)
+            .order_by(Ticket.updated_at.desc())
+            .all()
+        )
         tickets = []
         unread_count = 0
-        for t in rows:
-            d = t.to_dict()
-            last_staff = db.session.query(TicketReply.created_at).filter_by(ticket_id=t.id, is_staff=True).order_by(TicketReply.created_at.desc()).first()
-            if last_staff:
-                last_staff_at = last_staff[0]
-                unread = t.user_read_at is None or (last_staff_at and t.user_read_at and last_staff_at > t.user_read_at)
-            else:
-                unread = False
-            d['unread'] = unread
-            if unread:
+        for t, c, last_staff_at in rows:
+            d = t.to_dict(users={c.id: c} if c else {})
+            d['unread'] = _user_unread(t, last_staff_at)
+            if d['unread']:
                 unread_count += 1
             tickets.append(d)
         return jsonify({'tickets': tickets, 'unread_count': unread_count})
@@ -159,6 +192,8 @@ def create_ticket():
         created_user_agent=created_user_agent,
     )
     db.session.add(ticket)
+    db.session.flush()
+    publish(None, 'ticket', {'ticket_id': ticket.id, 'status': ticket.status})  # adminler
     db.session.commit()
     return jsonify(ticket.to_dict()), 201
 
@@ -181,20 +216,14 @@ def list_ticket_users():
 @ticket_bp.route('/unread-count', methods=['GET'])
 @jwt_required()
 def unread_count():
-    """GET /api/tickets/unread-count — Kullanıcının okunmamış destek sayısı (menü badge)."""
+    """GET /api/tickets/unread-count — Kullanıcının okunmamış destek sayısı (menü badge, unread_counters tablosundan)."""
     user_id = _current_user_id()
     if not user_id:
         return jsonify({'unread_count': 0})
     if _is_admin():
         return jsonify({'unread_count': 0})
-    rows = Ticket.query.filter_by(user_id=user_id).all()
-    count = 0
-    for t in rows:
-        last_staff = db.session.query(TicketReply.created_at).filter_by(ticket_id=t.id, is_staff=True).order_by(TicketReply.created_at.desc()).first()
-        if last_staff:
-            last_staff_at = last_staff[0]
-            if t.user_read_at is None or (last_staff_at and t.user_read_at and last_staff_at > t.user_read_at):
-                count += 1
+    count = get_unread_counts([user_id])['tickets']
+    db.session.commit()  # eksik sayaç satırı oluşturulduysa
     return jsonify({'unread_count': count})
 
 
@@ -230,14 +259,18 @@ def get_ticket(ticket_id):
         db.session.commit()
     else:
         if ticket.user_id == user_id:
+            was_unread = _user_unread(ticket, _ticket_last_staff_at(ticket.id))
             ticket.user_read_at = datetime.utcnow()
+            if was_unread:
+                db.session.flush()
+                adjust_unread(user_id, tickets=-1)
             db.session.commit()
 
     replies = TicketReply.query.filter_by(ticket_id=ticket_id).order_by(TicketReply.created_at.asc()).all()
     out = ticket.to_dict(include_user=is_admin)
     out['replies'] = [r.to_dict() for r in replies]
     if is_admin:
-        out['unread'] = ticket.admin_read_at is None or (ticket.updated_at and ticket.admin_read_at and ticket.updated_at > ticket.admin_read_at)
+        out['unread'] = _admin_unread(ticket)
     return jsonify(out)
 
 
@@ -265,6 +298,7 @@ def reply_ticket(ticket_id):
     if not message:
         return jsonify({'error': 'Mesaj gerekli.'}), 400
 
+    was_unread = is_admin and _user_unread(ticket, _ticket_last_staff_at(ticket.id))
     reply = TicketReply(
         ticket_id=ticket_id,
         user_id=user_id,
@@ -275,6 +309,11 @@ def reply_ticket(ticket_id):
     ticket.updated_at = datetime.utcnow()
     if is_admin:
         ticket.status = 'answered'
+        if not was_unread:
+            db.session.flush()
+            adjust_unread(ticket.user_id, tickets=1)  # ticket sahibi için okunmamış oldu
+    # Karşı tarafa canlı bildirim: admin cevabı → ticket sahibi, kullanıcı cevabı → adminler
+    publish(ticket.user_id if is_admin else None, 'ticket', {'ticket_id': ticket.id, 'status': ticket.status, 'reply': True})
     db.session.commit()
     return jsonify(reply.to_dict()), 201
 
@@ -303,5 +342,6 @@ def update_ticket(ticket_id):
         if status == 'closed':
             ticket.closed_at = datetime.utcnow()
             ticket.closed_by_user_id = user_id
+        publish(ticket.user_id if is_admin else None, 'ticket', {'ticket_id': ticket.id, 'status': ticket.status})
         db.session.commit()
     return jsonify(ticket.to_dict(include_user=is_admin or True))
@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app
 from models import db, User, CustomerData, QueueData, HeatmapData, CameraConfig, SiteConfig, ServiceHeartbeat
+from services.rollup_service import rebuild_rollups
 
 app = create_app()
 
@@ -189,6 +190,8 @@ def seed_database():
 
         print("Değişiklikler kaydediliyor...")
         db.session.commit()
+        rebuild_rollups()  # doğrudan DB'ye yazıldı: saatlik rollup'ları oluştur
+        db.session.commit()
         print("Tebrikler! Veritabanı başarıyla sıfırlandı ve 7 günlük full demo veri ile dolduruldu.")
 
 if __name__ == "__main__":
@@ -11,6 +11,7 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from app import create_app
 from models import db, User, CustomerData, QueueData, HeatmapData, StaffData, SiteConfig, CameraConfig
+from services.rollup_service import rebuild_rollups
 
 app = create_app()
 
@@ -249,6 +250,8 @@ def seed_all():
             ))
         print(f"\n👥 {len(STAFF_LIST)} personel kaydı oluşturuldu")
 
+        db.session.commit()
+        rebuild_rollups()  # doğrudan DB'ye yazıldı: saatlik rollup'ları oluştur
         db.session.commit()
         print("\n✅ Tüm veriler başarıyla yüklendi!")
 
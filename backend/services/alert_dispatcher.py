@@ -0,0 +1,226 @@
+"""
+Giden Telegram uyarıları için kalıcı kuyruk ve toplu gönderici.
+
+- queue_alert(): uyarıyı alert_outbox tablosuna ekler ve sohbet için 'telegram_dispatch' işini
+  job_queue'ya koyar (commit etmez; uyarı onu doğuran veriyle aynı transaction'da kalıcı olur).
+  İş dedupe_key='telegram:<chat_id>' ile birleştirilir: TELEGRAM_DIGEST_SECONDS içinde biriken
+  uyarılar tek çalıştırmada, mümkünse tek mesajda (digest) gönderilir.
+- dispatch(): arka plan iş kuyruğunda çalışır. Mesajlar Telegram'ın 4096 karakter sınırına göre
+  paketlenir; sohbet başına en az TELEGRAM_MIN_INTERVAL_SECONDS aralıkla, süreç başına tek
+  (keep-alive) HTTP oturumuyla gönderilir. Gönderilen satırlar hemen silinir; bölünmüş uzun uyarıda
+  gönderilen parça sayısı sent_parts'ta tutulur.
+- Bekleme: worker thread'i uyutulmaz. Sohbetin sırası gelmemişse veya Telegram 429 dönerse
+  (retry_after) job_queue.RetryLater yükseltilir; iş deneme hakkı harcamadan o kadar sonra kaldığı
+  yerden devam eder.
+- Hata: ağ hatası / 5xx iş hatası olarak yükseltilir; job_queue artan gecikmeyle tekrar dener,
+  gönderilmemiş satırlar outbox'ta kalır. Diğer 4xx (örn. bozuk HTML) kalıcıdır: toplu mesaj tek tek
+  denenir, reddedilen satır status='failed' olur (uzun uyarının kalan parçaları gönderilmez).
+- flush_pending(): outbox'ta bekleyen sohbetler için işi yeniden kuyruğa koyar (scheduler saatlik
+  çağırır; deneme hakkı biten işlerden kalan uyarılar da böylece tekrar denenir).
+TELEGRAM_API_URL yerel bir HTTP stub'ına çevrilerek test edilebilir.
+"""
+import os
+import threading
+import time
+
+import requests as http_requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+from models import db, AlertOutbox
+from services.job_queue import RetryLater, enqueue
+
+MESSAGE_LIMIT = 4000  # Telegram sınırı 4096; digest ayırıcıları için pay
+DIGEST_SEPARATOR = '\n\n➖➖➖\n\n'
+
+_session = {'pid': None, 'session': None}
+_last_sent = {}  # chat_id -> son gönderim (monotonic)
+_lock = threading.Lock()
+
+
+class TelegramError(Exception):
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+def _telegram_config():
+    """Token / sohbet id'si her seferinde env'den taze okunur."""
+    return os.environ.get('TELEGRAM_BOT', ''), os.environ.get('TELEGRAM_ID', '')
+
+
+def queue_alert(text: str, chat_id: str | None = None) -> bool:
+    """Uyarıyı kuyruğa ekler. Commit etmez. Telegram ayarlı değilse False."""
+    bot_token, default_chat = _telegram_config()
+    chat_id = str(chat_id or default_chat)
+    if not bot_token or not chat_id:
+        print("[Telegram Alert] TELEGRAM_BOT veya TELEGRAM_ID env var ayarlanmamış, bildirim atlanıyor.")
+        return False
+    db.session.add(AlertOutbox(chat_id=chat_id, text=text))
+    enqueue('telegram_dispatch', f'telegram:{chat_id}', {'chat_id': chat_id},
+            delay_seconds=current_app.config.get('TELEGRAM_DIGEST_SECONDS', 30))
+    return True
+
+
+def _http():
+    """Süreç başına tek requests oturumu (bağlantı havuzu / keep-alive)."""
+    with _lock:
+        if _session['pid'] != os.getpid():
+            session = http_requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+            _session.update(pid=os.getpid(), session=session)
+        return _session['session']
+
+
+def _split(text: str) -> list:
+    """MESSAGE_LIMIT'i aşan metni satır sınırlarından böler (HTML etiketleri satır içinde kapanır)."""
+    if len(text) <= MESSAGE_LIMIT:
+        return [text]
+    parts, current = [], ''
+    for line in text.split('\n'):
+        line = line[:MESSAGE_LIMIT]
+        if current and len(current) + 1 + len(line) > MESSAGE_LIMIT:
+            parts.append(current)
+            current = line
+        else:
+            current = f'{current}\n{line}' if current else line
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _pack(rows) -> list:
+    """
+    Satırları [(metin, [satır id'leri], parça)] mesajlarına paketler (sıra korunur).
+    parça: bölünmüş uzun uyarıda (satır, parça no, parça sayısı), digest mesajında None.
+    Daha önce gönderilmiş parçalar (sent_parts) atlanır.
+    """
+    messages = []
+    text, ids = '', []
+    for row in rows:
+        pieces = _split(row.text)
+        if len(pieces) > 1:
+            if ids:
+                messages.append((text, ids, None))
+                text, ids = '', []
+            messages.extend((piece, [row.id], (row, i, len(pieces)))
+                            for i, piece in enumerate(pieces) if i >= (row.sent_parts or 0))
+            continue
+        if ids and len(text) + len(DIGEST_SEPARATOR) + len(row.text) > MESSAGE_LIMIT:
+            messages.append((text, ids, None))
+            text, ids = '', []
+        text = f'{text}{DIGEST_SEPARATOR}{row.text}' if ids else row.text
+        ids.append(row.id)
+    if ids:
+        messages.append((text, ids, None))
+    return messages
+
+
+def _wait_turn(chat_id: str) -> None:
+    """Sohbet başına gönderim aralığı dolmamışsa RetryLater yükseltir (thread uyutulmaz)."""
+    interval = current_app.config.get('TELEGRAM_MIN_INTERVAL_SECONDS', 3)
+    wait = _last_sent.get(chat_id, -interval) + interval - time.monotonic()
+    if wait > 0:
+        raise RetryLater(wait, f'telegram:{chat_id} gönderim aralığı')
+
+
+def _send(chat_id: str, text: str) -> None:
+    bot_token, _ = _telegram_config()
+    if not bot_token:
+        raise TelegramError('TELEGRAM_BOT ayarlanmamış')
+    _wait_turn(chat_id)
+    url = f"{current_app.config.get('TELEGRAM_API_URL', 'https://api.telegram.org')}/bot{bot_token}/sendMessage"
+    try:
+        resp = _http().post(url, json={
+            'chat_id': chat_id,
+            'text': text,
+            'parse_mode': 'HTML',
+        }, timeout=current_app.config.get('TELEGRAM_TIMEOUT', 10))
+    except http_requests.RequestException as e:
+        raise TelegramError(f'bağlantı hatası: {e}')
+    finally:
+        _last_sent[chat_id] = time.monotonic()
+    if resp.status_code == 200:
+        return
+    try:
+        body = resp.json()
+    except ValueError:
+        body = {}
+    detail = body.get('description') or resp.text[:200]
+    if resp.status_code == 429:
+        retry_after = (body.get('parameters') or {}).get('retry_after')
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = current_app.config.get('TELEGRAM_MIN_INTERVAL_SECONDS', 3)
+        raise RetryLater(delay, f'429 rate limit (retry_after={retry_after}): {detail}')
+    raise TelegramError(f'{resp.status_code}: {detail}', permanent=400 <= resp.status_code < 500)
+
+
+def dispatch(chat_id: str) -> int:
+    """
+    Sohbetin bekleyen uyarılarını gönderir; gönderilen uyarı sayısını döner.
+    Geçici hatada TelegramError, sıra / 429 beklemesinde RetryLater (gönderilenler commit edilmiş olur).
+    """
+    rows = AlertOutbox.query.filter(
+        AlertOutbox.chat_id == chat_id, AlertOutbox.status == 'pending',
+    ).order_by(AlertOutbox.id).all()
+    sent = 0
+    failed = set()
+    for text, ids, part in _pack(rows):
+        if part and part[0].id in failed:
+            continue  # uzun uyarının bir parçası reddedildi, kalanı gönderilmez
+        try:
+            _send(chat_id, text)
+        except TelegramError as e:
+            if not e.permanent:
+                raise
+            if len(ids) > 1:
+                # Toplu mesaj reddedildi: hangi uyarının bozuk olduğunu bulmak için tek tek gönder
+                for row in rows:
+                    if row.id in ids:
+                        sent += _send_single(chat_id, row)
+                continue
+            _mark_failed(ids, e)
+            failed.update(ids)
+            continue
+        if part and part[1] < part[2] - 1:
+            part[0].sent_parts = part[1] + 1
+            db.session.commit()
+            continue
+        AlertOutbox.query.filter(AlertOutbox.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        sent += len(ids)
+    return sent
+
+
+def _mark_failed(ids, error) -> None:
+    AlertOutbox.query.filter(AlertOutbox.id.in_(ids)).update(
+        {'status': 'failed', 'last_error': str(error)[:1000]}, synchronize_session=False)
+    db.session.commit()
+    print(f"[Telegram Alert] Kalıcı hata, uyarı atlandı: {error}")
+
+
+def _send_single(chat_id: str, row) -> int:
+    """Digest'ten ayrılan tek (bölünmemiş) uyarıyı gönderir; gönderildiyse 1."""
+    try:
+        _send(chat_id, row.text)
+    except TelegramError as e:
+        if not e.permanent:
+            raise
+        _mark_failed([row.id], e)
+        return 0
+    db.session.delete(row)
+    db.session.commit()
+    return 1
+
+
+def flush_pending() -> int:
+    """Bekleyen uyarısı olan sohbetler için gönderim işini kuyruğa koyar. Commit eder."""
+    chats = [c for (c,) in db.session.query(AlertOutbox.chat_id).filter(
+        AlertOutbox.status == 'pending').distinct()]
+    for chat_id in chats:
+        enqueue('telegram_dispatch', f'telegram:{chat_id}', {'chat_id': chat_id}, delay_seconds=0)
+    db.session.commit()
+    return len(chats)
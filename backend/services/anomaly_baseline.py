@@ -0,0 +1,95 @@
+"""
+Anomali tespiti için saatlik müşteri girişi taban çizgisi (anomaly_baseline tablosu).
+
+Her (kullanıcı, günün saati) için o saatin günlük toplam girişlerinin EWMA ortalaması ve varyansı
+tutulur. Anomali kontrolü (routes/notifications.py) saatin toplamını customer_hourly'den, taban
+çizgisini bu tablodan tek satır olarak okur; 7 günlük ham veri taranmaz.
+
+- observe(): kontrol edilen saatin değerini taban çizgisine katar (aynı gün için tekrar gelirse
+  önceki katkıyı geri alıp yeniden hesaplar) ve karşılaştırma için o gün hariç durumu döner.
+- rebuild_baselines(): customer_hourly'den baştan hesaplar (ilk kurulum / geriye dönük veri sonrası).
+Fonksiyonlar commit etmez.
+"""
+import math
+from collections import defaultdict
+
+from models import db, AnomalyBaseline, CustomerHourly
+from db_utils import as_datetime
+
+# EWMA penceresi (gün): alpha = 2 / (N + 1). Önceki 7 günlük ortalamaya karşılık gelir.
+BASELINE_WINDOW_DAYS = 7
+ALPHA = 2 / (BASELINE_WINDOW_DAYS + 1)
+
+
+def hour_entered(user_id: int, hour_start) -> int:
+    """Kullanıcının verilen saatteki toplam müşteri girişi (tüm kameralar)."""
+    total = db.session.query(db.func.sum(CustomerHourly.entered)).filter(
+        CustomerHourly.user_id == user_id,
+        CustomerHourly.hour == hour_start,
+    ).scalar()
+    return int(total or 0)
+
+
+def _fold(b: AnomalyBaseline, value: float, day) -> None:
+    """Bir günün değerini EWMA ortalama/varyansa katar."""
+    b.prev_mean, b.prev_var = b.mean, b.var
+    if not b.samples:
+        b.mean, b.var = float(value), 0.0
+    else:
+        diff = value - b.mean
+        incr = ALPHA * diff
+        b.mean = b.mean + incr
+        b.var = (1 - ALPHA) * (b.var + diff * incr)
+    b.samples = (b.samples or 0) + 1
+    b.last_day = day
+
+
+def observe(user_id: int, hour_start, value: float):
+    """
+    hour_start saatinin değerini taban çizgisine katar.
+    Döner: (ortalama, standart sapma, gün sayısı) — hour_start'ın günü hariç; geçmiş yoksa samples=0.
+    last_day'den eski bir gün gelirse (geriye dönük veri) katkı yapılmaz, mevcut durum döner.
+    """
+    day = hour_start.date()
+    b = AnomalyBaseline.query.filter_by(user_id=user_id, hour_of_day=hour_start.hour).first()
+    if b is None:
+        b = AnomalyBaseline(user_id=user_id, hour_of_day=hour_start.hour, mean=0.0, var=0.0, samples=0,
+                            prev_mean=0.0, prev_var=0.0)
+        db.session.add(b)
+
+    if b.last_day is not None and day < b.last_day:
+        return b.mean, math.sqrt(b.var), b.samples
+
+    if b.last_day == day:
+        # Aynı günün önceki katkısını geri al
+        b.mean, b.var, b.samples = b.prev_mean, b.prev_var, b.samples - 1
+    before = (b.mean, math.sqrt(max(b.var, 0.0)), b.samples)
+    _fold(b, value, day)
+    return before
+
+
+def rebuild_baselines(user_ids=None) -> int:
+    """customer_hourly'den taban çizgilerini baştan hesaplar. Yazılan satır sayısını döner."""
+    day = db.func.date(CustomerHourly.hour)
+    hod = db.func.extract('hour', CustomerHourly.hour)
+    q = db.session.query(
+        CustomerHourly.user_id, day, hod, db.func.sum(CustomerHourly.entered),
+    ).group_by(CustomerHourly.user_id, day, hod).order_by(day)
+    if user_ids is not None:
+        q = q.filter(CustomerHourly.user_id.in_(user_ids))
+
+    series = defaultdict(list)  # (user_id, saat) -> [(gün, toplam), ...] gün sırasıyla
+    for uid, d, h, total in q.all():
+        series[(uid, int(h))].append((as_datetime(d).date() if isinstance(d, str) else d, total or 0))
+
+    del_q = AnomalyBaseline.query
+    if user_ids is not None:
+        del_q = del_q.filter(AnomalyBaseline.user_id.in_(user_ids))
+    del_q.delete(synchronize_session=False)
+
+    for (uid, h), points in series.items():
+        b = AnomalyBaseline(user_id=uid, hour_of_day=h, mean=0.0, var=0.0, samples=0, prev_mean=0.0, prev_var=0.0)
+        for d, total in points:
+            _fold(b, total, d)
+        db.session.add(b)
+    return len(series)
@@ -0,0 +1,207 @@
+"""
+Analytics GET yanıtları için sunucu tarafı önbellek.
+
+- Anahtar: (endpoint, çözümlenmiş user_id listesi, query parametreleri)
+- Geçerlilik: fact_version tablosundaki (kullanıcı, gün) sürümlerinden üretilen imza.
+  Ingest / düzenleme endpoint'leri rollup güncellerken ilgili (kullanıcı, gün) sürümünü artırır
+  (bump_versions); imza değişen kayıt bir sonraki okumada yeniden hesaplanır. Sürüm DB'de
+  tutulduğu için gunicorn worker'ları arasında da tutarlıdır.
+- Süre: bugünü içeren (veya tarihsiz) istekler RESPONSE_CACHE_TTL saniye, kapanmış günler
+  süresiz (sadece LRU sınırı ile) tutulur; bugünün "şimdi"ye bağlı hesapları bu sayede yenilenir.
+Önbellek worker başına bellektedir.
+- İmza, endpoint'in okuduğu gün aralığıyla sınırlıdır (days); böylece bugüne gelen veri kapanmış
+  aralıkların imzasını bozmaz. Aralıktan bağımsız parçalar (kamera listesi, "en son veri" yoklaması)
+  extra ile imzaya kendi küçük anahtarlarını ekler.
+- HTTP: aynı imzadan ETag üretilir (kapanmış günler strong, bugünü içeren yanıtlar weak + bugünün
+  tarihi; "şimdi"ye göreli insights yanıtları ayrıca TTL dilimi). If-None-Match eşleşirse hesaplama
+  yapılmadan 304 döner. Hash deterministik olduğu için ETag worker'lar arasında aynıdır.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import wraps
+from zoneinfo import ZoneInfo
+
+from flask import Response, current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+
+from models import db, FactVersion
+from db_utils import upsert
+
+ISTANBUL_TZ = ZoneInfo("Europe/Istanbul")
+
+# Ayar değişiklikleri (mesai saatleri vb.) bu güne yazılır; her imzaya dahildir
+CONFIG_DAY = date(1970, 1, 1)
+
+# Önbellek anahtarına girmeyen parametreler (JWT query string token'ı)
+_IGNORED_ARGS = {'token'}
+
+_cache = OrderedDict()  # key -> (imza, bitiş zamanı veya None, (gövde, status, mimetype))
+_lock = threading.Lock()
+
+
+def bump_versions(pairs) -> None:
+    """[(user_id, date|datetime), ...] için gün sürümlerini artırır. Commit etmez."""
+    rows = {}
+    for user_id, d in pairs:
+        if user_id is None or d is None:
+            continue
+        day = d.date() if isinstance(d, datetime) else d
+        rows[(int(user_id), day)] = {'user_id': int(user_id), 'day': day, 'version': 1}
+    upsert(FactVersion, list(rows.values()), ['user_id', 'day'],
+           update_set={'version': FactVersion.version + 1})
+
+
+def bump_config(user_ids) -> None:
+    """Analitiği etkileyen ayar değişikliği: kullanıcıların tüm önbellek kayıtlarını geçersiz kılar."""
+    bump_versions([(u, CONFIG_DAY) for u in user_ids])
+
+
+def config_version(user_ids) -> int:
+    """
+    Kullanıcıların ayar sürümü (CONFIG_DAY satırlarının toplamı). Ayara bağlı süreç önbellekleri
+    (örn. mesai saatleri) bunu anahtara ekler: bump_config tüm worker'larda anında yeni anahtar üretir.
+    İstek boyunca bir kez sorgulanır.
+    """
+    key = tuple(sorted({int(u) for u in user_ids}))
+    memo = g.setdefault('_config_version', {}) if has_request_context() else {}
+    if key not in memo:
+        memo[key] = db.session.query(db.func.coalesce(db.func.sum(FactVersion.version), 0)).filter(
+            FactVersion.user_id.in_(key), FactVersion.day == CONFIG_DAY,
+        ).scalar()
+    return memo[key]
+
+
+def _request_days():
+    """
+    Query parametrelerindeki tarih aralığı (date / date_from / date_to). Endpoint'lerin öncelik
+    kurallarından bağımsız olarak hepsini kapsayan aralığı döner: (başlangıç, bitiş), açık uçlar None.
+    Geçersiz tarihte (None, None).
+    """
+    try:
+        parsed = {k: datetime.strptime(request.args[k], '%Y-%m-%d').date()
+                  for k in ('date', 'date_from', 'date_to') if request.args.get(k)}
+    except ValueError:
+        return None, None
+    if not parsed:
+        return None, None
+    start = min(parsed.values())
+    if 'date_to' in parsed:
+        end = max(parsed.values())
+    elif 'date_from' in parsed:
+        end = None  # date_from tek başına: bazı endpoint'lerde açık uçlu
+    else:
+        end = parsed['date']
+    return start, end
+
+
+def version_signature(user_ids, start=None, end=None):
+    """Kullanıcıların (isteğe bağlı gün aralığındaki) sürüm toplamı + satır sayısı; ayar sürümü hep dahil."""
+    q = db.session.query(
+        db.func.coalesce(db.func.sum(FactVersion.version), 0),
+        db.func.count(FactVersion.id),
+    ).filter(FactVersion.user_id.in_(user_ids))
+    if start is not None or end is not None:
+        day_filter = []
+        if start is not None:
+            day_filter.append(FactVersion.day >= start)
+        if end is not None:
+            day_filter.append(FactVersion.day <= end)
+        q = q.filter(db.or_(db.and_(*day_filter), FactVersion.day == CONFIG_DAY))
+    return tuple(q.one())
+
+
+def _etag(key, sig, closed: bool, today: date, ttl: int | None):
+    """
+    (etag, weak) — anahtar + veri sürümü imzasından türetilir.
+    Kapanmış günler: yanıt sadece veriye bağlı, strong ETag. Bugünü içeren yanıtlar tarih değişince
+    (varsayılan aralık kayar) değiştiği için bugünün tarihi eklenir ve weak ETag kullanılır;
+    ttl verilirse ("şimdi"ye göreli hesaplar) TTL dilimi de eklenir.
+    """
+    parts = [repr(key), repr(sig)]
+    if not closed:
+        parts.append(today.isoformat())
+        if ttl:
+            parts.append(str(int(time.time() // max(ttl, 1))))
+    digest = hashlib.sha1('|'.join(parts).encode()).hexdigest()[:24]
+    return digest, not closed
+
+
+def _with_etag(resp, etag, weak):
+    resp.set_etag(etag, weak=weak)
+    resp.headers['Cache-Control'] = 'private, no-cache'  # tarayıcı saklar ama her seferinde doğrular
+    return resp
+
+
+def cached_response(date_scoped: bool = False, relative_to_today: bool = False, days=None, extra=None):
+    """
+    GET endpoint dekoratörü (@jwt_required'ın altında kullanılır).
+    date_scoped=True: endpoint sadece query'deki tarih aralığının (date / date_from / date_to) verisini
+    okuyorsa; imza sadece o günlerin sürümlerinden üretilir, başka günlere gelen veri önbelleği bozmaz.
+    days: aralığı endpoint kendi kurallarıyla çözüyorsa () -> (başlangıç, bitiş) (açık uç None);
+    date_scoped'u ima eder. İkisi de yoksa kullanıcıların herhangi bir günündeki değişiklik kaydı
+    geçersiz kılar.
+    extra: (user_ids, başlangıç, bitiş) -> hashable; aralık dışından okunan parçaların anahtarı imzaya eklenir.
+    relative_to_today=True: endpoint tarih parametresi yerine "bugün"e göre hesaplıyorsa; her zaman TTL uygulanır.
+    ETAG_ENABLED ise yanıtlara aynı imzadan türetilen ETag eklenir; If-None-Match eşleşirse
+    hesaplama yapılmadan 304 döner.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            cfg = current_app.config
+            use_cache = cfg.get('RESPONSE_CACHE_ENABLED', True)
+            use_etag = cfg.get('ETAG_ENABLED', True)
+            if not use_cache and not use_etag:
+                return fn(*args, **kwargs)
+
+            from user_context import get_resolved_user_ids
+            user_ids, _ = get_resolved_user_ids()
+            if not user_ids:
+                user_ids = [get_jwt_identity()]
+            user_ids = sorted({int(u) for u in user_ids})
+            start, end = (days or _request_days)()
+            query = tuple(sorted(
+                (k, v) for k, v in request.args.items(multi=True) if k not in _IGNORED_ARGS
+            ))
+            key = (request.endpoint, tuple(user_ids), query)
+            sig = version_signature(user_ids, start, end) if (days or date_scoped) else version_signature(user_ids)
+            if extra is not None:
+                sig = (sig, extra(user_ids, start, end))
+            today = datetime.now(ISTANBUL_TZ).date()
+            closed = not relative_to_today and end is not None and end < today
+            ttl = cfg.get('RESPONSE_CACHE_TTL', 60)
+
+            etag = weak = None
+            if use_etag:
+                etag, weak = _etag(key, sig, closed, today, ttl if relative_to_today else None)
+                if request.if_none_match.contains_weak(etag):
+                    return _with_etag(Response(status=304), etag, weak)
+
+            now = time.monotonic()
+            if use_cache:
+                with _lock:
+                    hit = _cache.get(key)
+                    if hit and hit[0] == sig and (hit[1] is None or hit[1] > now):
+                        _cache.move_to_end(key)
+                        body, status, mimetype = hit[2]
+                        resp = Response(body, status=status, mimetype=mimetype)
+                        return _with_etag(resp, etag, weak) if etag else resp
+
+            resp = current_app.make_response(fn(*args, **kwargs))
+
+            if resp.status_code == 200:
+                if use_cache:
+                    expires = None if closed else now + ttl
+                    with _lock:
+                        _cache[key] = (sig, expires, (resp.get_data(), resp.status_code, resp.mimetype))
+                        _cache.move_to_end(key)
+                        while len(_cache) > cfg.get('RESPONSE_CACHE_MAX_ENTRIES', 2000):
+                            _cache.popitem(last=False)
+                if etag:
+                    _with_etag(resp, etag, weak)
+            return resp
+        return wrapper
+    return decorator
@@ -0,0 +1,223 @@
+"""
+Canlı olaylar (Server-Sent Events) için yayın / abonelik katmanı.
+
+- publish(): olayı event_outbox tablosuna yazar (commit etmez; olay, onu doğuran veriyle aynı
+  transaction'da kalıcı olur). Olay üretenler: modül heartbeat'leri (heartbeat_buffer), yeni
+  bildirimler (notifications), ticket değişiklikleri (ticket_routes), rollup güncellemeleri (ingest).
+- Her gunicorn worker'ı tek bir poller thread'i ile outbox'taki yeni satırları (id > son okunan)
+  EVENT_POLL_SECONDS aralıkla okur ve kendi abonelerinin kuyruklarına dağıtır; böylece olay hangi
+  worker'da üretilirse üretilsin tüm worker'lardaki bağlantılara ulaşır. Abone yoksa sorgu yapılmaz.
+- Eşleşme: olay user_id'si abonenin kapsamındaysa (kendi id'si + çözümlenmiş mağaza id'leri)
+  veya abone admin ise iletilir. user_id NULL olaylar sadece adminlere gider.
+- id'ler commit sırasıyla gelmeyebilir (PostgreSQL sequence'ı id'yi insert anında verir, uzun
+  transaction daha küçük id ile sonra commit olur). Poller son okunan id'nin altında kalan boşlukları
+  EVENT_GAP_SECONDS boyunca tekrar sorgular; geç commit olan olay bu sürede teslim edilir, geri alınan
+  transaction'ların bıraktığı boşluklar süre dolunca bırakılır.
+- Yeniden bağlanan istemci Last-Event-ID ile kaçırdığı olayları outbox'tan alır (replay).
+- cleanup(): EVENT_RETENTION_SECONDS'ten eski satırları siler; abone olmasa da tablo büyümesin diye
+  scheduler saatlik çağırır (abone varken poller da dakikada bir çağırır).
+"""
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, EventOutbox
+
+_subscribers = set()
+_lock = threading.Lock()
+_state = {'last_id': None, 'poller_pid': None}
+_gaps = {}  # last_id'nin altında henüz görülmemiş id -> ilk fark edilme zamanı (monotonic)
+_throttle = {}  # (user_id, channel, anahtar) -> son yayın zamanı (monotonic)
+
+# Abone başına bekleyen olay sınırı; dolarsa bağlantı kapatılır, istemci replay ile devam eder
+_QUEUE_SIZE = 500
+_MAX_GAPS = 1000
+
+
+class Subscription:
+    def __init__(self, user_ids, is_admin: bool):
+        self.user_ids = {int(u) for u in user_ids}
+        self.is_admin = is_admin
+        self.queue = queue.Queue(maxsize=_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, user_id) -> bool:
+        return self.is_admin or (user_id is not None and user_id in self.user_ids)
+
+
+def publish(user_id, channel: str, payload: dict, throttle_key=None) -> None:
+    """
+    Olayı outbox'a ekler. Commit etmez.
+    throttle_key verilirse aynı (user_id, channel, throttle_key) için bu süreçte
+    EVENT_INGEST_THROTTLE_SECONDS içinde tekrar yayın yapılmaz (yüksek frekanslı ingest olayları).
+    """
+    if throttle_key is not None:
+        interval = current_app.config.get('EVENT_INGEST_THROTTLE_SECONDS', 5)
+        key = (user_id, channel, throttle_key)
+        now = time.monotonic()
+        with _lock:
+            if now - _throttle.get(key, -interval) < interval:
+                return
+            _throttle[key] = now
+    db.session.add(EventOutbox(
+        user_id=int(user_id) if user_id is not None else None,
+        channel=channel,
+        payload=json.dumps(payload, default=str),
+    ))
+
+
+def _to_event(row) -> dict:
+    return {'id': row.id, 'user_id': row.user_id, 'channel': row.channel, 'data': row.payload or '{}'}
+
+
+def subscribe(user_ids, is_admin: bool):
+    """Yeni abonelik; worker başına EVENT_STREAM_MAX_PER_WORKER doluysa None. İstek context'inde çağrılmalı."""
+    limit = current_app.config.get('EVENT_STREAM_MAX_PER_WORKER', 4)
+    with _lock:
+        if len(_subscribers) >= limit:
+            return None
+    last_id = None
+    if _state['last_id'] is None:
+        last_id = db.session.query(db.func.max(EventOutbox.id)).scalar() or 0
+    sub = Subscription(user_ids, is_admin)
+    with _lock:
+        if _state['last_id'] is None:
+            _state['last_id'] = last_id
+        _subscribers.add(sub)
+    _ensure_poller(current_app._get_current_object())
+    return sub
+
+
+def unsubscribe(sub: Subscription) -> None:
+    with _lock:
+        _subscribers.discard(sub)
+
+
+def replay(sub: Subscription, after_id: int) -> list:
+    """after_id'den sonraki, aboneyi ilgilendiren olaylar (outbox'ta hâlâ duranlar)."""
+    q = EventOutbox.query.filter(EventOutbox.id > after_id)
+    if not sub.is_admin:
+        q = q.filter(EventOutbox.user_id.in_(sub.user_ids))
+    return [_to_event(r) for r in q.order_by(EventOutbox.id).limit(_QUEUE_SIZE).all()]
+
+
+def _dispatch(events) -> None:
+    with _lock:
+        subs = list(_subscribers)
+    for sub in subs:
+        for ev in events:
+            if not sub.wants(ev['user_id']):
+                continue
+            try:
+                sub.queue.put_nowait(ev)
+            except queue.Full:
+                sub.overflowed = True
+                break
+
+
+def _poll_once(app) -> None:
+    with _lock:
+        active = bool(_subscribers)
+        if not active:
+            _state['last_id'] = None  # abone yokken takip edilmez; ilk abone yeniden başlatır
+            _gaps.clear()
+            return
+        last_id = _state['last_id'] or 0
+        gaps = list(_gaps)
+    cond = EventOutbox.id > last_id
+    if gaps:
+        cond = db.or_(cond, EventOutbox.id.in_(gaps))
+    rows = EventOutbox.query.filter(cond).order_by(EventOutbox.id).limit(1000).all()
+    now = time.monotonic()
+    gap_seconds = app.config.get('EVENT_GAP_SECONDS', 60)
+    with _lock:
+        if _state['last_id'] is None:
+            return
+        seen = {r.id for r in rows}
+        for i in seen:
+            _gaps.pop(i, None)
+        top = max((r.id for r in rows), default=last_id)
+        if top > last_id:
+            for i in range(last_id + 1, top):
+                if i not in seen:
+                    _gaps[i] = now  # henüz commit olmamış (veya geri alınmış) olay
+            _state['last_id'] = max(_state['last_id'], top)
+        for i, first_seen in list(_gaps.items()):
+            if now - first_seen > gap_seconds:
+                del _gaps[i]
+        while len(_gaps) > _MAX_GAPS:
+            del _gaps[min(_gaps)]
+    if rows:
+        _dispatch([_to_event(r) for r in rows])
+
+
+def cleanup(app=None) -> int:
+    """EVENT_RETENTION_SECONDS'ten eski olayları siler; silinen satır sayısını döner. Commit eder."""
+    app = app or current_app
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config.get('EVENT_RETENTION_SECONDS', 600))
+    deleted = EventOutbox.query.filter(EventOutbox.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def _ensure_poller(app) -> None:
+    """Bu süreç için outbox poller thread'ini (bir kez) başlatır."""
+    if _state['poller_pid'] == os.getpid():
+        return
+    with _lock:
+        if _state['poller_pid'] == os.getpid():
+            return
+        _state['poller_pid'] = os.getpid()
+
+    def loop():
+        interval = app.config.get('EVENT_POLL_SECONDS', 1)
+        last_cleanup = time.monotonic()
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    _poll_once(app)
+                    if time.monotonic() - last_cleanup > 60:
+                        cleanup(app)
+                        last_cleanup = time.monotonic()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"[EventBus] Hata: {e}")
+                finally:
+                    db.session.remove()
+
+    threading.Thread(target=loop, name='event-bus', daemon=True).start()
+
+
+def _format(ev: dict) -> str:
+    return f"id: {ev['id']}\nevent: {ev['channel']}\ndata: {ev['data']}\n\n"
+
+
+def stream(sub: Subscription, replayed, max_seconds: int, keepalive_seconds: int):
+    """
+    SSE gövdesi üreten generator (app context gerektirmez). max_seconds sonunda bağlantı kapanır;
+    EventSource otomatik yeniden bağlanır (Last-Event-ID ile).
+    """
+    try:
+        yield 'retry: 5000\n\n'
+        sent = set()
+        for ev in replayed:
+            sent.add(ev['id'])
+            yield _format(ev)
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline and not sub.overflowed:
+            try:
+                ev = sub.queue.get(timeout=keepalive_seconds)
+            except queue.Empty:
+                yield ': ping\n\n'
+                continue
+            if ev['id'] in sent:
+                continue  # replay ile zaten gönderildi (geç commit olan olay daha küçük id taşıyabilir)
+            yield _format(ev)
+    finally:
+        unsubscribe(sub)
@@ -0,0 +1,147 @@
+"""
+Modül heartbeat'leri için write-behind tampon.
+
+Ingest / upload endpoint'leri her veri noktasında module_ping / service_heartbeat satırlarını yazmak
+yerine (kullanıcı, modül) → son görülme zamanını bellekte tutar (record). Tampon HEARTBEAT_FLUSH_SECONDS
+aralıkla tek transaction'da DB'ye yazılır (flush); okuma tarafı henüz yazılmamış ping'leri
+pending_pings() ile görür. HEARTBEAT_FLUSH_SECONDS=0 ise her kayıt anında yazılır.
+Tampon worker (süreç) başınadır; modül zaman aşımı (35 dk) yanında flush gecikmesi önemsizdir.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from flask import current_app
+
+from models import db, ServiceHeartbeat, ModulePing
+from db_utils import upsert
+from services.event_bus import publish
+
+_pending = {}  # (user_id, modül) -> datetime
+_lock = threading.Lock()
+_flusher_pid = None
+
+
+def _merge(dst: dict, items: dict) -> None:
+    for key, ts in items.items():
+        cur = dst.get(key)
+        if cur is None or ts > cur:
+            dst[key] = ts
+
+
+def record(user_id: int, module: str, ts: datetime | None = None) -> None:
+    """Modül ping'ini tampona yazar (DB'ye dokunmaz)."""
+    ts = ts or datetime.utcnow()
+    with _lock:
+        _merge(_pending, {(int(user_id), module): ts})
+    interval = current_app.config.get('HEARTBEAT_FLUSH_SECONDS', 30)
+    if interval <= 0:
+        flush()
+    else:
+        _ensure_flusher(current_app._get_current_object(), interval)
+
+
+def pending_pings(user_ids=None) -> dict:
+    """Kullanıcıların (None: tüm kullanıcıların) henüz DB'ye yazılmamış ping'leri: {user_id: {modül: datetime}}"""
+    uids = {int(u) for u in user_ids} if user_ids is not None else None
+    result = defaultdict(dict)
+    with _lock:
+        for (u, m), ts in _pending.items():
+            if uids is None or u in uids:
+                result[u][m] = ts
+    return result
+
+
+def write_pings(pings) -> None:
+    """
+    [(user_id, modül, datetime), ...] → module_ping upsert; mevcut daha yeniyse korunur.
+    Kullanıcıların service_heartbeat.last_ping_at'ini de günceller (yoksa satır açar) ve 'heartbeat'
+    olayı yayınlar (services/event_bus.py). Commit etmez.
+    """
+    latest = {}
+    for user_id, module, ts in pings:
+        _merge(latest, {(int(user_id), module): ts})
+    if not latest:
+        return
+    upsert(ModulePing, [
+        {'user_id': u, 'module': m, 'last_ping_at': ts} for (u, m), ts in latest.items()
+    ], ['user_id', 'module'], update_set=lambda excluded: {
+        'last_ping_at': db.case(
+            (excluded.last_ping_at > ModulePing.last_ping_at, excluded.last_ping_at),
+            else_=ModulePing.last_ping_at,
+        ),
+    })
+
+    last_by_user = {}
+    modules_by_user = defaultdict(dict)
+    for (u, m), ts in latest.items():
+        _merge(last_by_user, {u: ts})
+        modules_by_user[u][m] = ts.isoformat()
+    # Canlı durum ekranları (SSE) için
+    for uid, modules in modules_by_user.items():
+        publish(uid, 'heartbeat', {'modules': modules})
+    recs = {r.user_id: r for r in ServiceHeartbeat.query.filter(
+        ServiceHeartbeat.user_id.in_(list(last_by_user))
+    ).all()}
+    for uid, last in last_by_user.items():
+        rec = recs.get(uid)
+        if rec:
+            if rec.last_ping_at is None or last > rec.last_ping_at:
+                rec.last_ping_at = last
+        else:
+            from routes.health import KNOWN_MODULES
+            db.session.add(ServiceHeartbeat(
+                user_id=uid,
+                last_ping_at=last,
+                received_pings=1,
+                expected_pings=len(KNOWN_MODULES),
+            ))
+
+
+def flush() -> int:
+    """Tampondaki ping'leri tek transaction'da module_ping / service_heartbeat'e yazar. Yazılan ping sayısını döner."""
+    with _lock:
+        items = dict(_pending)
+        _pending.clear()
+    if not items:
+        return 0
+    try:
+        write_pings([(u, m, ts) for (u, m), ts in items.items()])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        # Yazılamayanları tampona geri koy, sonraki flush'ta tekrar denensin
+        with _lock:
+            _merge(_pending, items)
+        print(f"[Heartbeat Flush Error] {e}")
+        return 0
+    return len(items)
+
+
+def _ensure_flusher(app, interval: int) -> None:
+    """Bu süreç için periyodik flush thread'ini (bir kez) başlatır."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                flush()
+                db.session.remove()
+
+    threading.Thread(target=loop, name='heartbeat-flush', daemon=True).start()
+
+    def flush_at_exit():
+        with app.app_context():
+            flush()
+
+    atexit.register(flush_at_exit)
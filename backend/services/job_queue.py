@@ -0,0 +1,177 @@
+"""
+DB tabanlı arka plan iş kuyruğu (job_queue tablosu).
+
+- enqueue(): istek transaction'ı içinde iş ekler (commit etmez). dedupe_key aynı olan bekleyen iş
+  varsa yeni satır açılmaz; ilk eklemeden JOB_COALESCE_SECONDS sonra tek sefer çalışır.
+- run_pending(): zamanı gelen işleri sırayla çalıştırır. Başarılı iş silinir; hata alan iş
+  artan gecikmeyle tekrar denenir, MAX_ATTEMPTS sonunda status='failed' kalır. İşleyici RetryLater
+  yükseltirse iş deneme hakkı harcamadan verilen süre sonra tekrar çalışır (örn. hız sınırı).
+- start_worker(): run_pending'i JOB_POLL_SECONDS aralıkla çağıran daemon thread. Gunicorn'da
+  scheduler kilidini alan tek worker'da başlatılır (app.py); ayrı süreç için job_worker.py.
+- requeue_stale(): worker açılırken, çökme / deploy sırasında 'running' kalmış (JOB_STALE_SECONDS'tan
+  eski) işleri tekrar 'pending' yapar; deneme hakkı bitenler 'failed' olur.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from models import db, Job
+from db_utils import upsert
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 60  # deneme sayısı ile çarpılır
+
+_loop_lock = threading.Lock()  # süreç başına tek run_forever döngüsü
+
+
+class RetryLater(Exception):
+    """İşleyici işi hata saymadan delay_seconds sonra tekrar çalıştırmak istediğinde yükseltir."""
+
+    def __init__(self, delay_seconds: float, message: str = ''):
+        super().__init__(message or f'{delay_seconds} sn sonra tekrar')
+        self.delay_seconds = max(float(delay_seconds), 0)
+
+
+def _run_anomaly_check(payload: dict):
+    from routes.notifications import check_anomalies_for_user
+    from models import User
+    user_id = int(payload['user_id'])
+    user = User.query.get(user_id)
+    user_name = (user.full_name or user.username) if user else ''
+    check_anomalies_for_user(user_id, user_name, data_timestamp=datetime.fromisoformat(payload['hour']))
+
+
+def _run_telegram_dispatch(payload: dict):
+    from services.alert_dispatcher import dispatch
+    dispatch(str(payload['chat_id']))
+
+
+# iş tipi -> işleyici(payload)
+_HANDLERS = {
+    'anomaly_check': _run_anomaly_check,
+    'telegram_dispatch': _run_telegram_dispatch,
+}
+
+
+def enqueue(kind: str, dedupe_key: str, payload: dict, delay_seconds: int | None = None) -> None:
+    """İşi kuyruğa ekler; aynı dedupe_key ile bekleyen/çalışan iş varsa tekrar 'pending' yapar. Commit etmez."""
+    if delay_seconds is None:
+        from flask import current_app
+        delay_seconds = current_app.config.get('JOB_COALESCE_SECONDS', 30)
+    upsert(Job, [{
+        'kind': kind,
+        'dedupe_key': dedupe_key,
+        'payload': json.dumps(payload),
+        'status': 'pending',
+        'attempts': 0,
+        'run_after': datetime.utcnow() + timedelta(seconds=delay_seconds),
+        'created_at': datetime.utcnow(),
+    }], ['dedupe_key'], update_set={
+        # Bekleyen işin zamanı ertelenmez (birleştirme penceresi ilk eklemeden başlar).
+        # Çalışmakta olan iş tekrar 'pending' olur: yeni veriyle bir kez daha çalışır.
+        'status': 'pending',
+        'attempts': 0,
+        'payload': json.dumps(payload),
+        'last_error': None,
+    })
+
+
+def run_pending(limit: int = 50) -> int:
+    """Zamanı gelen işleri çalıştırır; çalıştırılan iş sayısını döner."""
+    now = datetime.utcnow()
+    jobs = Job.query.filter(
+        Job.status == 'pending',
+        Job.run_after <= now,
+    ).order_by(Job.run_after, Job.id).limit(limit).all()
+    done = 0
+    for job in jobs:
+        job_id, kind, payload = job.id, job.kind, job.payload
+        # Sahiplen: başka bir süreç aynı işi almışsa atla
+        claimed = Job.query.filter(Job.id == job_id, Job.status == 'pending').update(
+            {'status': 'running', 'attempts': Job.attempts + 1, 'started_at': datetime.utcnow()},
+            synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            continue
+        try:
+            handler = _HANDLERS.get(kind)
+            if handler is None:
+                raise ValueError(f'Bilinmeyen iş tipi: {kind}')
+            handler(json.loads(payload or '{}'))
+            db.session.commit()
+            # Çalışırken tekrar eklendiyse (status='pending') silme, bir kez daha çalışsın
+            Job.query.filter(Job.id == job_id, Job.status == 'running').delete(synchronize_session=False)
+            db.session.commit()
+            done += 1
+        except RetryLater as e:
+            db.session.rollback()
+            Job.query.filter(Job.id == job_id, Job.status == 'running').update({
+                'status': 'pending',
+                'attempts': Job.attempts - 1,
+                'run_after': datetime.utcnow() + timedelta(seconds=e.delay_seconds),
+            }, synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            attempts = db.session.query(Job.attempts).filter(Job.id == job_id).scalar() or MAX_ATTEMPTS
+            failed = attempts >= MAX_ATTEMPTS
+            Job.query.filter(Job.id == job_id, Job.status == 'running').update({
+                'status': 'failed' if failed else 'pending',
+                'run_after': datetime.utcnow() + timedelta(seconds=RETRY_DELAY_SECONDS * attempts),
+                'last_error': str(e)[:1000],
+            }, synchronize_session=False)
+            db.session.commit()
+            print(f"[JobQueue] {kind} #{job_id} hata ({attempts}/{MAX_ATTEMPTS}): {e}")
+    return done
+
+
+def requeue_stale(stale_seconds: int) -> int:
+    """stale_seconds'tan uzun süredir 'running' olan işleri geri alır; etkilenen iş sayısını döner. Commit eder."""
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    n = Job.query.filter(
+        Job.status == 'running',
+        db.or_(Job.started_at.is_(None), Job.started_at < cutoff),
+    ).update({
+        'status': db.case((Job.attempts >= MAX_ATTEMPTS, 'failed'), else_='pending'),
+        'run_after': datetime.utcnow(),
+        'last_error': 'Worker çalışırken durdu (çökme / yeniden başlatma)',
+    }, synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+def run_forever(app):
+    """Kuyruğu JOB_POLL_SECONDS aralıkla işler (bloklar). Açılışta yarım kalmış işleri geri alır.
+    Aynı süreçte döngü zaten çalışıyorsa (örn. in-process worker thread'i) hemen döner."""
+    if not _loop_lock.acquire(blocking=False):
+        print("[JobQueue] Bu süreçte worker zaten çalışıyor, ikinci döngü başlatılmadı.")
+        return
+    poll = app.config.get('JOB_POLL_SECONDS', 5)
+    with app.app_context():
+        try:
+            n = requeue_stale(app.config.get('JOB_STALE_SECONDS', 600))
+            if n:
+                print(f"[JobQueue] Yarım kalmış {n} iş tekrar kuyruğa alındı.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"[JobQueue] Yarım kalan işler geri alınamadı: {e}")
+        finally:
+            db.session.remove()
+    while True:
+        with app.app_context():
+            try:
+                run_pending()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[JobQueue] Hata: {e}")
+            finally:
+                db.session.remove()
+        time.sleep(poll)
+
+
+def start_worker(app) -> None:
+    """run_forever'ı daemon thread olarak başlatır."""
+    thread = threading.Thread(target=run_forever, args=(app,), name='job-worker', daemon=True)
+    thread.start()
+    print("[JobQueue] Worker başlatıldı.")
@@ -0,0 +1,128 @@
+"""
+PostgreSQL profilinde ham veri tablolarının (customer_data / queue_data / heatmap_data) aylık
+RANGE bölümlemesi.
+
+- Bölüm anahtarı: customer_data.timestamp, queue_data.recorded_at, heatmap_data.recorded_at
+  (ingest her zaman doldurur; eski NULL kayıtlar migrate_postgres.py'de created_at ile doldurulur,
+  created_at'i olmayan/boş olanlar kopyalanmaz ve raporlanır).
+- PostgreSQL, bölümlenmiş tablodaki unique index'lerin bölüm anahtarını içermesini ister: primary key
+  (id, anahtar), idempotency index'i (user_id, idempotency_key, anahtar) olur. Tekrar gönderimler aynı
+  timestamp'i taşıdığı için tekilleştirme davranışı değişmez; ingest upsert'i conflict kolonlarını
+  partition_key() ile belirler.
+- Tablolar migrate_postgres.py --partition ile oluşturulur. Aylık bölümler ensure_partitions() ile
+  PARTITION_MONTHS_AHEAD ay ileriye kadar açılır (scheduler saatlik çağırır); aralık dışı satırlar
+  <tablo>_default bölümüne düşer. Default'ta yeni açılacak ayın satırları varsa PostgreSQL
+  "CREATE TABLE ... PARTITION OF" komutunu reddeder; bu durumda bölüm ayrı tablo olarak oluşturulur,
+  satırlar default'tan taşınır ve tablo ATTACH edilir. Her bölüm kendi savepoint'inde açılır, biri
+  başarısız olursa diğerleri etkilenmez.
+SQLite'ta hiçbir şey yapılmaz; partition_key() None döner.
+"""
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.schema import CreateColumn
+
+from models import db
+
+FACT_PARTITION_KEYS = {
+    'customer_data': 'timestamp',
+    'queue_data': 'recorded_at',
+    'heatmap_data': 'recorded_at',
+}
+
+PARTITION_MONTHS_AHEAD = 3
+
+_partitioned = {}  # tablo adı -> bool (süreç başına bir kez sorgulanır)
+
+
+def _is_partitioned(conn, table_name: str) -> bool:
+    return conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name"
+    ), {'name': table_name}).first() is not None
+
+
+def partition_key(model):
+    """Model bölümlenmiş bir PostgreSQL tablosuysa bölüm anahtarı kolon adı, değilse None."""
+    name = model.__tablename__
+    if name not in FACT_PARTITION_KEYS:
+        return None
+    if name not in _partitioned:
+        bind = db.session.get_bind()
+        _partitioned[name] = bind.dialect.name == 'postgresql' and _is_partitioned(db.session.connection(), name)
+    return FACT_PARTITION_KEYS[name] if _partitioned[name] else None
+
+
+def create_partitioned_tables(conn) -> None:
+    """Ham veri tablolarını bölümlenmiş olarak oluşturur (tablo varsa dokunmaz). users tablosu önceden var olmalı."""
+    for name, key in FACT_PARTITION_KEYS.items():
+        table = db.metadata.tables[name]
+        columns = [str(CreateColumn(c).compile(dialect=conn.dialect)) for c in table.columns]
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {name} (\n    "
+            + ",\n    ".join(columns + [
+                f"PRIMARY KEY (id, {key})",
+                "FOREIGN KEY (user_id) REFERENCES users (id)",
+            ])
+            + f"\n) PARTITION BY RANGE ({key})"
+        ))
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name}_default PARTITION OF {name} DEFAULT"))
+        for index in table.indexes:
+            cols = [c.name for c in index.columns]
+            if index.unique and key not in cols:
+                cols.append(key)
+            unique = 'UNIQUE ' if index.unique else ''
+            conn.execute(text(f"CREATE {unique}INDEX IF NOT EXISTS {index.name} ON {name} ({', '.join(cols)})"))
+
+
+def _next_month(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def _month_starts(first: date, last: date):
+    d = first.replace(day=1)
+    while d <= last:
+        yield d
+        d = _next_month(d)
+
+
+def ensure_partitions(conn, since: date | None = None, months_ahead: int = PARTITION_MONTHS_AHEAD) -> int:
+    """
+    since (varsayılan: bu ay) ile bugün + months_ahead ay arasındaki aylık bölümleri açar.
+    Bölümlenmemiş tablolar atlanır. Açılan (yeni) bölüm sayısını döner.
+    """
+    if conn.dialect.name != 'postgresql':
+        return 0
+    last = date.today().replace(day=1)
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    created = 0
+    for name, key in FACT_PARTITION_KEYS.items():
+        if not _is_partitioned(conn, name):
+            continue
+        for start in _month_starts(since or date.today(), last):
+            part = f"{name}_{start:%Y%m}"
+            if conn.execute(text("SELECT to_regclass(:name)"), {'name': part}).scalar():
+                continue
+            try:
+                with conn.begin_nested():
+                    _create_partition(conn, name, key, part, start, _next_month(start))
+                created += 1
+            except Exception as e:
+                print(f"[Partitions] {part} oluşturulamadı: {e}")
+    return created
+
+
+def _create_partition(conn, name: str, key: str, part: str, start: date, end: date) -> None:
+    """Aylık bölümü açar; default bölümde bu aya düşen satırlar varsa önce onları yeni bölüme taşır."""
+    bounds = f"FROM ('{start}') TO ('{end}')"
+    in_range = f"{key} >= '{start}' AND {key} < '{end}'"
+    if conn.execute(text(f"SELECT 1 FROM {name}_default WHERE {in_range} LIMIT 1")).first() is None:
+        conn.execute(text(f"CREATE TABLE {part} PARTITION OF {name} FOR VALUES {bounds}"))
+        return
+    conn.execute(text(f"CREATE TABLE {part} (LIKE {name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    moved = conn.execute(text(
+        f"WITH moved AS (DELETE FROM {name}_default WHERE {in_range} RETURNING *) "
+        f"INSERT INTO {part} SELECT * FROM moved"
+    )).rowcount
+    conn.execute(text(f"ALTER TABLE {name} ATTACH PARTITION {part} FOR VALUES {bounds}"))
+    print(f"[Partitions] {part}: default bölümden {moved} satır taşındı")
@@ -0,0 +1,274 @@
+"""
+Ham veri tabloları (customer_data / queue_data / heatmap_data) için saklama politikası ve arşiv.
+
+- RAW_RETENTION_DAYS günden eski ham satırlar gün gün arşivlenir (run_retention):
+  1. Etkilenen saatlerin rollup'ları (customer/queue/heatmap_hourly) ham veriden son kez hesaplanır;
+     panelin tüm özetleri bu tablolardan okunduğu için eski dönemler görünmeye devam eder.
+  2. Satırlar ARCHIVE_DIR/<tablo>/<tablo>_YYYY-MM.jsonl.gz dosyasına eklenir (aylık dosya, gzip üyeleri
+     ardışık yazılır).
+  3. Ham satırlar silinir; rollup'ların editable_id'si boşaltılır (kayıt artık düzenlenemez).
+- Arşivlenen aralığın sonu tablo başına watermark olarak ARCHIVE_DIR/watermark.json'da tutulur;
+  watermark ham satırlar silinmeden önce yazılır. Watermark'tan eski rollup saatleri "donmuştur":
+  rollup_service bu saatleri ham veriden yeniden hesaplamaz (ham kaynak artık arşivde).
+- Donmuş saate yazma (geç gelen veri, düzenleme) ArchivedHourError (409) ile reddedilir; veri
+  kabul edilip kaybolmaz. Toplu ingest endpoint'leri bu satırları satır bazlı hata olarak döner.
+- reattach(): bir ayın arşiv dosyasını ham tabloya geri yükler (ham veri sorguları / dışa aktarım için);
+  politika açık kaldıkça sonraki çalıştırmada tekrar arşivlenir.
+RAW_RETENTION_DAYS=0 (varsayılan) ise hiçbir şey yapılmaz.
+"""
+import gzip
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from werkzeug.exceptions import Conflict
+
+from models import db, CustomerData, CustomerHourly, QueueData, QueueHourly, HeatmapData, HeatmapHourly
+
+# ham model -> rollup modeli
+RAW_TABLES = {
+    CustomerData: CustomerHourly,
+    QueueData: QueueHourly,
+    HeatmapData: HeatmapHourly,
+}
+
+_CHUNK = 500
+
+ARCHIVED_MESSAGE = 'Bu saatin ham verisi arşivlendi; geç gelen veri eklenemez / düzenlenemez'
+
+
+class ArchivedHourError(Conflict):
+    """Donmuş (ham verisi arşivlenmiş) saate yazma denemesi; global hata işleyicisi 409 döner."""
+    description = ARCHIVED_MESSAGE
+
+_watermark_cache = {'mtime': None, 'data': {}}
+_lock = threading.Lock()
+
+
+def _archive_dir() -> str:
+    return current_app.config['ARCHIVE_DIR']
+
+
+def _watermark_path() -> str:
+    return os.path.join(_archive_dir(), 'watermark.json')
+
+
+def load_watermarks() -> dict:
+    """{tablo adı: datetime} — dosya değişmedikçe süreç içi önbellekten."""
+    path = _watermark_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    with _lock:
+        if _watermark_cache['mtime'] != mtime:
+            with open(path) as f:
+                raw = json.load(f)
+            _watermark_cache['data'] = {k: datetime.fromisoformat(v) for k, v in raw.items()}
+            _watermark_cache['mtime'] = mtime
+        return dict(_watermark_cache['data'])
+
+
+def _save_watermark(table: str, value: datetime) -> None:
+    data = load_watermarks()
+    if data.get(table) and data[table] >= value:
+        return
+    data[table] = value
+    os.makedirs(_archive_dir(), exist_ok=True)
+    tmp = _watermark_path() + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({k: v.isoformat() for k, v in data.items()}, f, indent=2)
+    os.replace(tmp, _watermark_path())
+
+
+def frozen_before(rollup):
+    """Rollup tablosunun ham verisi bu zamandan öncesi için arşivde (yoksa None)."""
+    for raw, r in RAW_TABLES.items():
+        if r is rollup:
+            return load_watermarks().get(raw.__tablename__)
+    return None
+
+
+def is_frozen(raw_model, ts) -> bool:
+    """Ham tablo satırının zamanı arşivlenmiş (donmuş) aralıkta mı."""
+    watermark = load_watermarks().get(raw_model.__tablename__)
+    return bool(watermark and ts is not None and ts < watermark)
+
+
+def _time_expr(model):
+    if model is CustomerData:
+        return CustomerData.timestamp
+    return db.func.coalesce(model.recorded_at, model.created_at)
+
+
+def _range_filter(model, start, end):
+    from services.rollup_service import _coalesced_range_filter
+    if model is CustomerData:
+        return [CustomerData.timestamp >= start, CustomerData.timestamp < end]
+    return _coalesced_range_filter(model, start, end)
+
+
+def _refresh_fn(model):
+    from services.rollup_service import refresh_customer_hours, refresh_queue_hours, refresh_heatmap_hours
+    return {
+        CustomerData: refresh_customer_hours,
+        QueueData: refresh_queue_hours,
+        HeatmapData: refresh_heatmap_hours,
+    }[model]
+
+
+def _archive_path(table: str, month: date) -> str:
+    return os.path.join(_archive_dir(), table, f'{table}_{month:%Y-%m}.jsonl.gz')
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def _archive_day(model, start: datetime, end: datetime) -> int:
+    """[start, end) aralığındaki ham satırları arşivler (tek transaction). Arşivlenen satır sayısını döner."""
+    table = model.__tablename__
+    cols = list(model.__table__.columns)
+    idx = {c.name: i for i, c in enumerate(cols)}
+    rows = db.session.execute(
+        db.select(*cols).where(*_range_filter(model, start, end)).order_by(model.id)
+    ).all()
+    if not rows:
+        return 0
+
+    # 1. Rollup'ları son kez ham veriden hesapla (downsample)
+    if model is CustomerData:
+        pairs = [(r[idx['user_id']], r[idx['timestamp']]) for r in rows]
+    else:
+        pairs = [(r[idx['user_id']], r[idx['recorded_at']] or r[idx['created_at']]) for r in rows]
+    _refresh_fn(model)(pairs, skip_frozen=True)  # yarıda kalmış önceki çalıştırmanın donmuş saatleri atlanır
+
+    # 2. Arşiv dosyasına ekle (DB'den silmeden önce diske yazılmış olmalı)
+    path = _archive_path(table, start.date())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, 'at', encoding='utf-8') as f:
+        for r in rows:
+            f.write(json.dumps({c.name: _to_json(v) for c, v in zip(cols, r)}, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+    # 3. Watermark silmeden önce: silme ile watermark arasında çalışan bir refresh, ham verisi
+    #    silinmiş saati boş tablodan yeniden hesaplayıp rollup'ı silmesin
+    _save_watermark(table, end)
+
+    # 4. Ham satırları sil, rollup'ları düzenlenemez yap
+    ids = [r[idx['id']] for r in rows]
+    for i in range(0, len(ids), _CHUNK):
+        model.query.filter(model.id.in_(ids[i:i + _CHUNK])).delete(synchronize_session=False)
+    rollup = RAW_TABLES[model]
+    rollup.query.filter(
+        rollup.hour >= start, rollup.hour < end, rollup.editable_id.isnot(None),
+    ).update({'editable_id': None}, synchronize_session=False)
+    db.session.commit()
+    return len(rows)
+
+
+def run_retention(now: datetime | None = None) -> dict:
+    """
+    RAW_RETENTION_DAYS'ten eski ham satırları arşivler. {tablo: arşivlenen satır} döner.
+    Gün gün ilerler; her gün ayrı transaction'dır, yarıda kesilirse kaldığı yerden devam eder.
+    """
+    days = current_app.config.get('RAW_RETENTION_DAYS', 0)
+    if days <= 0:
+        return {}
+    now = now or datetime.now()
+    cutoff = datetime.combine(now.date() - timedelta(days=days), datetime.min.time())
+    result = {}
+    for model in RAW_TABLES:
+        table = model.__tablename__
+        archived = 0
+        while True:
+            oldest = db.session.query(db.func.min(_time_expr(model))).filter(_time_expr(model) < cutoff).scalar()
+            if oldest is None:
+                break
+            if isinstance(oldest, str):
+                oldest = datetime.fromisoformat(oldest)
+            start = datetime.combine(oldest.date(), datetime.min.time())
+            end = min(start + timedelta(days=1), cutoff)
+            try:
+                archived += _archive_day(model, start, end)
+            except Exception:
+                db.session.rollback()
+                raise
+        _save_watermark(table, cutoff)
+        result[table] = archived
+    return result
+
+
+def list_archives() -> list:
+    """[{'table', 'month', 'path', 'size'}, ...]"""
+    items = []
+    for model in RAW_TABLES:
+        table = model.__tablename__
+        folder = os.path.join(_archive_dir(), table)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            if name.endswith('.jsonl.gz'):
+                path = os.path.join(folder, name)
+                items.append({
+                    'table': table,
+                    'month': name[len(table) + 1:-len('.jsonl.gz')],
+                    'path': path,
+                    'size': os.path.getsize(path),
+                })
+    return items
+
+
+def _from_json(col, value):
+    if value is None:
+        return None
+    try:
+        python_type = col.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return value
+
+
+def reattach(table: str, month: str) -> int:
+    """
+    ARCHIVE_DIR'deki <tablo>_<YYYY-MM> arşivini ham tabloya geri yükler ve dosyayı siler.
+    DB'de zaten olan id'ler atlanır. Rollup'lara dokunulmaz (donmuş saatler arşivlenirken hesaplanmıştı).
+    Eklenen satır sayısını döner.
+    """
+    model = next((m for m in RAW_TABLES if m.__tablename__ == table), None)
+    if model is None:
+        raise ValueError(f'Geçersiz tablo: {table}')
+    path = _archive_path(table, datetime.strptime(month, '%Y-%m').date())
+    if not os.path.exists(path):
+        raise ValueError(f'Arşiv bulunamadı: {path}')
+    cols = {c.name: c for c in model.__table__.columns}
+    inserted = 0
+    batch = []
+
+    def flush(batch):
+        ids = [r['id'] for r in batch]
+        existing = {i for (i,) in db.session.query(model.id).filter(model.id.in_(ids))}
+        fresh = [r for r in batch if r['id'] not in existing]
+        if fresh:
+            db.session.execute(model.__table__.insert(), fresh)
+        return len(fresh)
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            raw = json.loads(line)
+            batch.append({k: _from_json(cols[k], v) for k, v in raw.items() if k in cols})
+            if len(batch) >= _CHUNK:
+                inserted += flush(batch)
+                batch = []
+    if batch:
+        inserted += flush(batch)
+    db.session.commit()
+    os.remove(path)
+    return inserted
@@ -0,0 +1,299 @@
+"""
+Ham veri tablolarının saatlik toplamlarını (rollup) güncel tutar.
+
+Yazma yolu: ingest / düzenleme endpoint'leri etkilenen (kullanıcı, saat) çiftlerini
+refresh_*_hours() ile bildirir; bu saatler ham tablodan GROUP BY ile yeniden
+hesaplanıp rollup tablosuna yazılır. Artımlı (+= delta) yerine yeniden hesaplama kullanılır:
+upsert ile güncellenen veya silinen kayıtlarda eski değeri bilmek gerekmez.
+Fonksiyonlar commit etmez; çağıranın transaction'ı içinde çalışır. Aynı transaction'da
+fact_version sürümleri de artırılır (yanıt önbelleğinin geçersiz kılınması, cache_service.py) ve
+canlı 'ingest' olayı yayınlanır (event_bus.py).
+
+Tablolar:
+- customer_hourly: (kullanıcı, kamera, saat)
+- queue_hourly:    (kullanıcı, kasa, saat) — adet, ağırlıklı bekleme, min/max, dağılım
+- heatmap_hourly:  (kullanıcı, gün, bölge, saat) — ziyaretçi, bekleme toplamı, örnek sayısı
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from models import (
+    db, CustomerData, CustomerHourly, QueueData, QueueHourly, HeatmapData, HeatmapHourly,
+)
+from db_utils import upsert, hour_bucket, as_datetime
+from services.cache_service import bump_versions, bump_config
+from services.event_bus import publish
+
+# Tek DELETE ... IN (...) ifadesindeki saat sayısı
+_CHUNK = 500
+
+# Bekleme süresi dağılımı aralıkları (saniye): queue_hourly.wait_* kolonları
+WAIT_BUCKETS = [
+    (0, 60, 'wait_0_1', '0-1 dk'),
+    (60, 120, 'wait_1_2', '1-2 dk'),
+    (120, 180, 'wait_2_3', '2-3 dk'),
+    (180, 300, 'wait_3_5', '3-5 dk'),
+    (300, None, 'wait_5_plus', '5+ dk'),
+]
+
+
+def hour_floor(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _touched_hours(pairs) -> dict:
+    """[(user_id, timestamp), ...] → {user_id: {saat başı, ...}}"""
+    by_user = defaultdict(set)
+    for user_id, ts in pairs:
+        if user_id is not None and ts is not None:
+            by_user[int(user_id)].add(hour_floor(ts))
+    return by_user
+
+
+def _range_filter(col, start, end):
+    """[start, end) filtresi; start None ise filtre yok (tam yeniden oluşturma)."""
+    if start is None:
+        return []
+    return [col >= start, col < end]
+
+
+def _coalesced_range_filter(model, start, end):
+    """
+    COALESCE(recorded_at, created_at) ∈ [start, end) filtresi, index kullanılabilir şekilde:
+    recorded_at dolu kayıtlar recorded_at index'inden, eski (recorded_at NULL) kayıtlar ayrıca.
+    """
+    if start is None:
+        return []
+    return [db.or_(
+        db.and_(model.recorded_at >= start, model.recorded_at < end),
+        db.and_(model.recorded_at.is_(None), model.created_at >= start, model.created_at < end),
+    )]
+
+
+# --- Müşteri (CustomerData) ---
+
+def _customer_rows(user_id: int, start=None, end=None) -> list:
+    """[start, end) aralığındaki ham müşteri kayıtlarını (kamera, saat) bazında toplar."""
+    bucket = hour_bucket(CustomerData.timestamp)
+    camera = db.func.coalesce(CustomerData.camera_id, '')
+    q = db.session.query(
+        camera,
+        bucket,
+        db.func.sum(CustomerData.entered),
+        db.func.sum(CustomerData.exited),
+        db.func.sum(CustomerData.male_count),
+        db.func.sum(CustomerData.female_count),
+        db.func.sum(CustomerData.age_18_30),
+        db.func.sum(CustomerData.age_30_50),
+        db.func.sum(CustomerData.age_50_plus),
+        db.func.count(CustomerData.id),
+        db.func.min(CustomerData.id),
+    ).filter(
+        CustomerData.user_id == user_id,
+        CustomerData.timestamp.isnot(None),
+        *_range_filter(CustomerData.timestamp, start, end),
+    ).group_by(camera, bucket)
+    rows = []
+    for cam, hour, ent, ext, male, female, a1, a2, a3, cnt, min_id in q.all():
+        rows.append({
+            'user_id': user_id,
+            'camera_id': cam,
+            'hour': as_datetime(hour),
+            'entered': ent or 0,
+            'exited': ext or 0,
+            'male_count': male or 0,
+            'female_count': female or 0,
+            'age_18_30': a1 or 0,
+            'age_30_50': a2 or 0,
+            'age_50_plus': a3 or 0,
+            'row_count': cnt,
+            'editable_id': min_id,
+        })
+    return rows
+
+
+# --- Kuyruk (QueueData) ---
+
+def _queue_rows(user_id: int, start=None, end=None) -> list:
+    """[start, end) aralığındaki ham kuyruk kayıtlarını (kasa, saat) bazında toplar."""
+    ts = db.func.coalesce(QueueData.recorded_at, QueueData.created_at)
+    bucket = hour_bucket(ts)
+    cashier = db.func.coalesce(QueueData.cashier_id, '')
+    cnt = db.func.coalesce(db.func.nullif(QueueData.total_customers, 0), 1)
+    wt = db.func.coalesce(QueueData.wait_time, 0)
+    nonzero = QueueData.wait_time != 0
+    bucket_cols = []
+    for lo, hi, _, _ in WAIT_BUCKETS:
+        cond = (wt >= lo) if hi is None else db.and_(wt >= lo, wt < hi)
+        bucket_cols.append(db.func.sum(db.case((cond, cnt), else_=0)))
+    q = db.session.query(
+        cashier,
+        bucket,
+        db.func.sum(cnt),
+        db.func.sum(wt * cnt),
+        db.func.sum(db.case((nonzero, QueueData.wait_time), else_=0)),
+        db.func.sum(db.case((nonzero, 1), else_=0)),
+        db.func.min(db.case((nonzero, QueueData.wait_time))),
+        db.func.max(wt),
+        db.func.count(QueueData.id),
+        db.func.min(QueueData.id),
+        *bucket_cols,
+    ).filter(
+        QueueData.user_id == user_id,
+        ts.isnot(None),
+        *_coalesced_range_filter(QueueData, start, end),
+    ).group_by(cashier, bucket)
+    rows = []
+    for cid, hour, customers, weighted, nz_sum, nz_cnt, wmin, wmax, cnt_rows, min_id, *dist in q.all():
+        row = {
+            'user_id': user_id,
+            'cashier_id': cid,
+            'hour': as_datetime(hour),
+            'customers': customers or 0,
+            'wait_weighted_sum': weighted or 0,
+            'wait_nonzero_sum': nz_sum or 0,
+            'wait_nonzero_count': nz_cnt or 0,
+            'wait_min': wmin,
+            'wait_max': wmax or 0,
+            'row_count': cnt_rows,
+            'editable_id': min_id,
+        }
+        for (_, _, col, _), val in zip(WAIT_BUCKETS, dist):
+            row[col] = val or 0
+        rows.append(row)
+    return rows
+
+
+# --- Isı haritası (HeatmapData) ---
+
+def _heatmap_rows(user_id: int, start=None, end=None) -> list:
+    """[start, end) aralığındaki ham heatmap kayıtlarını (gün, bölge, saat) bazında toplar."""
+    ts = db.func.coalesce(HeatmapData.recorded_at, HeatmapData.created_at)
+    bucket = hour_bucket(ts)
+    day = db.func.coalesce(HeatmapData.date_recorded, db.func.date(ts))
+    zone = db.func.coalesce(HeatmapData.zone, '')
+    q = db.session.query(
+        day,
+        zone,
+        bucket,
+        db.func.sum(db.func.coalesce(HeatmapData.visitor_count, 0)),
+        db.func.sum(db.func.coalesce(HeatmapData.intensity, 0)),
+        db.func.count(HeatmapData.id),
+        db.func.max(db.func.coalesce(HeatmapData.visitor_count, 0)),
+        db.func.min(HeatmapData.id),
+    ).filter(
+        HeatmapData.user_id == user_id,
+        ts.isnot(None),
+        *_coalesced_range_filter(HeatmapData, start, end),
+    ).group_by(day, zone, bucket)
+    rows = []
+    for d, z, hour, visitors, dwell, samples, vmax, min_id in q.all():
+        rows.append({
+            'user_id': user_id,
+            'date_recorded': as_datetime(d).date() if isinstance(d, str) else d,
+            'zone': z,
+            'hour': as_datetime(hour),
+            'visitors': visitors or 0,
+            'dwell_sum': dwell or 0,
+            'samples': samples,
+            'max_visitors': vmax or 0,
+            'editable_id': min_id,
+        })
+    return rows
+
+
+# rollup modeli -> (hesaplama fonksiyonu, unique anahtar kolonları)
+_ROLLUPS = {
+    CustomerHourly: (_customer_rows, ['user_id', 'camera_id', 'hour']),
+    QueueHourly: (_queue_rows, ['user_id', 'cashier_id', 'hour']),
+    HeatmapHourly: (_heatmap_rows, ['user_id', 'date_recorded', 'zone', 'hour']),
+}
+
+
+def _refresh(rollup, pairs, skip_frozen: bool = False) -> None:
+    """
+    Verilen (user_id, timestamp) çiftlerinin düştüğü saatleri ham veriden yeniden hesaplar.
+    Kullanıcı başına tek GROUP BY sorgusu (etkilenen ilk ve son saat arası) çalışır.
+    Ham verisi arşivlenmiş (donmuş) saat yeniden hesaplanamaz: ArchivedHourError (409) yükseltilir,
+    böylece geç gelen veri sessizce kaybolmaz. skip_frozen=True (arşivleme) bu saatleri atlar.
+    """
+    from services.retention_service import frozen_before, ArchivedHourError
+    compute, keys = _ROLLUPS[rollup]
+    frozen = frozen_before(rollup)
+    for user_id, hours in _touched_hours(pairs).items():
+        if frozen and min(hours) < frozen:
+            if not skip_frozen:
+                raise ArchivedHourError()
+            hours = {h for h in hours if h >= frozen}
+            if not hours:
+                continue
+        fresh = [
+            r for r in compute(user_id, min(hours), max(hours) + timedelta(hours=1))
+            if r['hour'] in hours
+        ]
+        hours = sorted(hours)
+        days = set()
+        for i in range(0, len(hours), _CHUNK):
+            chunk = rollup.query.filter(
+                rollup.user_id == user_id,
+                rollup.hour.in_(hours[i:i + _CHUNK]),
+            )
+            if rollup is HeatmapHourly:
+                days.update(d for (d,) in chunk.with_entities(HeatmapHourly.date_recorded).distinct())
+            chunk.delete(synchronize_session=False)
+        upsert(rollup, fresh, keys)
+        # Yanıt önbelleği: bu kullanıcının etkilenen günleri değişti. Heatmap özeti date_recorded'a
+        # göre filtrelenir; saatin gününden farklı date_recorded günlerinin sürümü de artar.
+        if rollup is HeatmapHourly:
+            days.update(r['date_recorded'] for r in fresh)
+        bump_versions([(user_id, h) for h in hours] + [(user_id, d) for d in days])
+        # Canlı sayaçlar (SSE): kullanıcı/tablo başına kısıtlanmış 'ingest' olayı
+        publish(user_id, 'ingest', {'table': rollup.__tablename__, 'hour': hours[-1].isoformat()},
+                throttle_key=rollup.__tablename__)
+
+
+def refresh_customer_hours(pairs, skip_frozen: bool = False) -> None:
+    _refresh(CustomerHourly, pairs, skip_frozen)
+
+
+def refresh_queue_hours(pairs, skip_frozen: bool = False) -> None:
+    _refresh(QueueHourly, pairs, skip_frozen)
+
+
+def refresh_heatmap_hours(pairs, skip_frozen: bool = False) -> None:
+    _refresh(HeatmapHourly, pairs, skip_frozen)
+
+
+def _rebuild(rollup, raw_model, user_ids=None) -> int:
+    """Bir rollup tablosunu ham veriden baştan oluşturur. Yazılan satır sayısını döner."""
+    from services.retention_service import frozen_before
+    compute, keys = _ROLLUPS[rollup]
+    if user_ids is None:
+        user_ids = [u for (u,) in db.session.query(raw_model.user_id).distinct()]
+    frozen = frozen_before(rollup)
+    total = 0
+    for user_id in user_ids:
+        q = rollup.query.filter(rollup.user_id == user_id)
+        if frozen:
+            # Arşivlenmiş dönemin rollup'ları korunur; sadece ham verisi duran saatler yeniden oluşturulur
+            q = q.filter(rollup.hour >= frozen)
+            rows = compute(user_id, frozen, datetime.max)
+        else:
+            rows = compute(user_id)
+        q.delete(synchronize_session=False)
+        upsert(rollup, rows, keys)
+        bump_config([user_id])  # kullanıcının tüm önbellek kayıtları geçersiz
+        total += len(rows)
+    return total
+
+
+def rebuild_rollups(user_ids=None) -> dict:
+    """
+    Tüm rollup tablolarını ham veriden yeniden oluşturur (ilk kurulum, seed script'leri, toplu import sonrası).
+    user_ids verilmezse tüm kullanıcılar. {tablo: satır sayısı} döner. Commit etmez.
+    """
+    return {
+        'customer_hourly': _rebuild(CustomerHourly, CustomerData, user_ids),
+        'queue_hourly': _rebuild(QueueHourly, QueueData, user_ids),
+        'heatmap_hourly': _rebuild(HeatmapHourly, HeatmapData, user_ids),
+    }
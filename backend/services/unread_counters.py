@@ -0,0 +1,102 @@
+"""
+Okunmamış bildirim / destek talebi sayaçları (unread_counters tablosu).
+
+Menü badge'leri (/api/notifications/unread-count, /api/tickets/unread-count) her açık panelden sürekli
+sorgulanır; sayılar her istekte COUNT ile hesaplanmak yerine kullanıcı başına tek satırda tutulur.
+- adjust(): değişikliği yapan kod, değişikliği flush ettikten sonra aynı transaction'da çağırır
+  (yeni bildirim +1, okundu işaretleme / silme -n, ticket'a personel cevabı +1, kullanıcının ticket'ı
+  açması -1). Güncelleme atomik (kolon = kolon + n) olduğu için worker'lar arasında tutarlıdır.
+- Satırı olmayan kullanıcının sayacı ilk ihtiyaçta kaynak tablolardan hesaplanarak oluşturulur;
+  bu yüzden geçiş (migration) gerekmez.
+- reconcile(): sayaçları kaynak tablolarla karşılaştırıp sapmaları tek UPDATE ile düzeltir (scheduler
+  saatlik çağırır). Sayım ve yazma aynı ifadede olduğu için arada gelen adjust() ezilmez.
+"""
+from models import db, Notification, Ticket, TicketReply, UnreadCounter
+from db_utils import upsert
+
+KINDS = ('notifications', 'tickets')
+
+
+def last_staff_reply_at():
+    """Ticket'ın son personel cevabı zamanı — ticket satırına bağlı skaler alt sorgu (ix_ticket_replies_staff)."""
+    return (
+        db.session.query(db.func.max(TicketReply.created_at))
+        .filter(TicketReply.ticket_id == Ticket.id, TicketReply.is_staff == True)
+        .correlate(Ticket)
+        .scalar_subquery()
+    )
+
+
+def _unread_ticket_filter():
+    """Kullanıcının görmediği personel cevabı olan ticket'lar."""
+    last = last_staff_reply_at()
+    return db.and_(last.isnot(None), db.or_(Ticket.user_read_at.is_(None), last > Ticket.user_read_at))
+
+
+def _source_counts(user_ids=None) -> dict:
+    """{user_id: {'notifications': n, 'tickets': m}} — kaynak tablolardan. user_ids None ise tüm kullanıcılar."""
+    nq = db.session.query(Notification.user_id, db.func.count(Notification.id)).filter(Notification.is_read == False)
+    tq = db.session.query(Ticket.user_id, db.func.count(Ticket.id)).filter(_unread_ticket_filter())
+    if user_ids is not None:
+        nq = nq.filter(Notification.user_id.in_(user_ids))
+        tq = tq.filter(Ticket.user_id.in_(user_ids))
+    counts = {}
+    for kind, q, col in (('notifications', nq, Notification.user_id), ('tickets', tq, Ticket.user_id)):
+        for uid, n in q.group_by(col).all():
+            counts.setdefault(uid, dict.fromkeys(KINDS, 0))[kind] = n
+    return counts
+
+
+def _create_missing(user_ids) -> dict:
+    """Satırı olmayan kullanıcıların sayaçlarını kaynak tablolardan oluşturur. Commit etmez."""
+    counts = _source_counts(user_ids)
+    rows = [{'user_id': uid, **counts.get(uid, dict.fromkeys(KINDS, 0))} for uid in user_ids]
+    upsert(UnreadCounter, rows, ['user_id'], update_cols=[])
+    return {r['user_id']: r for r in rows}
+
+
+def adjust(user_id, **deltas) -> None:
+    """
+    Sayaçları deltalar kadar değiştirir (örn. adjust(uid, notifications=1)). Commit etmez.
+    Değişiklik flush edilmiş olmalı: satır yoksa kaynaktan hesaplanır ve değişiklik zaten sayıma girer.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas or user_id is None:
+        return
+    values = {}
+    for kind, delta in deltas.items():
+        col = getattr(UnreadCounter, kind)
+        values[col] = db.case((col + delta < 0, 0), else_=col + delta)
+    updated = UnreadCounter.query.filter(UnreadCounter.user_id == int(user_id)).update(
+        values, synchronize_session=False
+    )
+    if not updated:
+        _create_missing([int(user_id)])
+
+
+def get_counts(user_ids) -> dict:
+    """Kullanıcıların sayaç toplamları {'notifications': n, 'tickets': m}. Eksik satırları oluşturur (commit etmez)."""
+    user_ids = sorted({int(u) for u in user_ids})
+    rows = {r.user_id: {k: getattr(r, k) for k in KINDS}
+            for r in UnreadCounter.query.filter(UnreadCounter.user_id.in_(user_ids)).all()}
+    missing = [u for u in user_ids if u not in rows]
+    if missing:
+        rows.update(_create_missing(missing))
+    return {k: sum(r[k] for r in rows.values()) for k in KINDS}
+
+
+def reconcile() -> int:
+    """Mevcut sayaç satırlarını kaynak tablolarla eşitler; düzeltilen satır sayısını döner. Commit eder."""
+    expected = {
+        'notifications': db.session.query(db.func.count(Notification.id)).filter(
+            Notification.user_id == UnreadCounter.user_id, Notification.is_read == False,
+        ).scalar_subquery(),
+        'tickets': db.session.query(db.func.count(Ticket.id)).filter(
+            Ticket.user_id == UnreadCounter.user_id, _unread_ticket_filter(),
+        ).correlate(UnreadCounter).scalar_subquery(),
+    }
+    fixed = UnreadCounter.query.filter(
+        db.or_(*(getattr(UnreadCounter, k) != expected[k] for k in KINDS))
+    ).update({getattr(UnreadCounter, k): expected[k] for k in KINDS}, synchronize_session=False)
+    db.session.commit()
+    return fixed
@@ -1,15 +1,70 @@
-"""Kullanıcı yetki bağlamı: brand_manager için yönetilen mağazalar, company bazlı erişim, store_id filtresi."""
-from flask import request
+"""
+Kullanıcı yetki bağlamı: brand_manager için yönetilen mağazalar, company bazlı erişim, store_id filtresi.
+
+Erişim kapsamı sorguları (company kullanıcıları, yönetilen mağazalar, mesai saatleri) memoize edilir:
+aynı request içinde flask.g'de, request'ler arasında ACCESS_CACHE_TTL saniyelik süreç önbelleğinde.
+Kullanıcı / şirket / mağaza / mesai saati yazan endpoint'ler invalidate_access_cache() çağırır;
+diğer gunicorn worker'larında eski değer en fazla TTL kadar kalır.
+"""
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
 from flask_jwt_extended import get_jwt_identity, get_jwt
 
 from models import ManagedStore, User
 
+_scope_cache = {}  # key -> (bitiş zamanı, değer)
+_scope_lock = threading.Lock()
+_SCOPE_CACHE_MAX_ENTRIES = 5000
+
+
+def memoize_scope(key: tuple, compute):
+    """
+    Erişim kapsamı değerini (request + kısa TTL süreç önbelleği ile) döndürür.
+    Değer değiştirilmemelidir (tuple / int gibi değişmez tipler kullanın).
+    """
+    memo = g.setdefault('_access_scope', {}) if has_request_context() else None
+    if memo is not None and key in memo:
+        return memo[key]
+    ttl = current_app.config.get('ACCESS_CACHE_TTL', 30)
+    now = time.monotonic()
+    with _scope_lock:
+        hit = _scope_cache.get(key)
+    if hit and hit[0] > now:
+        value = hit[1]
+    else:
+        value = compute()
+        if ttl > 0:
+            with _scope_lock:
+                if len(_scope_cache) >= _SCOPE_CACHE_MAX_ENTRIES:
+                    _scope_cache.clear()
+                _scope_cache[key] = (now + ttl, value)
+    if memo is not None:
+        memo[key] = value
+    return value
+
+
+def invalidate_access_cache() -> None:
+    """Kullanıcı / şirket / yönetilen mağaza / mesai saati değişince çağrılır (bu worker + bu request)."""
+    with _scope_lock:
+        _scope_cache.clear()
+    if has_request_context():
+        g.pop('_access_scope', None)
+
 
 def _get_company_user_ids(user_id: int, company_id: int | None = None) -> list[int]:
     """
     Belirtilen company_id'deki tüm user_id'leri döndürür.
     company_id verilmezse user'ın DB'deki company_id'si kullanılır.
     """
+    return list(memoize_scope(
+        ('company_users', user_id, company_id),
+        lambda: tuple(_query_company_user_ids(user_id, company_id)),
+    ))
+
+
+def _query_company_user_ids(user_id: int, company_id: int | None = None) -> list[int]:
     if not company_id:
         user = User.query.get(user_id)
         if not user or not user.company_id:
@@ -78,8 +133,9 @@ def get_effective_user_ids(user_id: int, role: str) -> list[int]:
     if role == 'admin':
         return []  # Admin kendi context'inde çalışır, analytics'te tüm user'ları görmek için ayrı mantık
     if role == 'brand_manager':
-        rows = ManagedStore.query.filter_by(manager_user_id=user_id).all()
-        return [r.store_user_id for r in rows]
+        return list(memoize_scope(('managed_stores', user_id), lambda: tuple(
+            r.store_user_id for r in ManagedStore.query.filter_by(manager_user_id=user_id).all()
+        )))
     # Company bazlı: aynı şirketteki tüm user_id'ler
     return _get_company_user_ids(user_id)
 
@@ -117,8 +173,9 @@ def get_resolved_user_ids():
         if store_id_param:
             return ([store_id_param], store_id_param)
         # Admin: tüm user'ları gör
-        all_users = User.query.filter_by(is_active=True).all()
-        all_ids = [u.id for u in all_users]
+        all_ids = list(memoize_scope(('active_users',), lambda: tuple(
+            uid for (uid,) in User.query.with_entities(User.id).filter_by(is_active=True).all()
+        )))
         return (all_ids if all_ids else [user_id], None)
 
     # Normal user veya store_manager: company bazlı erişim
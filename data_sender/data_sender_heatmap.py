@@ -5,6 +5,8 @@ Isı haritası (heatmap) verisi gönderen script.
 - zone: Bölge adı (erkek-giyim, kadin-giyim vb.) – her kamera/script farklı zone gönderir
 - zone: Bölge adı (erkek-giyim, kadin-giyim vb.)
 - intensity: Ortalama geçirilen zaman (saniye)
+- zones: (opsiyonel) Bir kamera-saatin tüm bölgeleri; verilirse tek login + tek istekle
+  POST /api/analytics/heatmaps/batch kullanılır
 
 Kullanım:
   python data_sender_heatmap.py -j payload_heatmap.json
@@ -55,6 +57,31 @@ def send(token: str, payload: dict) -> dict:
     return r.json()
 
 
+def send_batch(token: str, payload: dict) -> dict:
+    """Bir kamera-saatin tüm bölgelerini tek istekte gönderir (idempotent, tekrar denenebilir)."""
+    base = {
+        "zones": [
+            {
+                "zone": z.get("zone") or "genel",
+                "visitor_count": int(z.get("visitor_count") or 0),
+                "intensity": float(z.get("intensity") or 0),
+            }
+            for z in payload["zones"]
+        ],
+    }
+    for key in ("camera_id", "timestamp", "date_recorded"):
+        if payload.get(key):
+            base[key] = payload[key]
+
+    r = requests.post(
+        f"{API_BASE}/api/analytics/heatmaps/batch",
+        json=base,
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+    )
+    r.raise_for_status()
+    return r.json()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Isı haritası verisi gönderir.")
     parser.add_argument("-j", "--json", type=str, required=True, help="Payload JSON (örn: payload_heatmap.json)")
@@ -81,6 +108,14 @@ def main():
 
     try:
         token = login()
+        if isinstance(payload.get("zones"), list):
+            result = send_batch(token, payload)
+            for row in result.get("results", []):
+                if row.get("error"):
+                    print(f"HATA | zone={row.get('zone')} | {row['error']}")
+                else:
+                    print(f"OK | zone={row.get('zone')} | id={row.get('id')}")
+            return
         result = send(token, payload)
         print(f"OK | zone={zone} visitor_count={vc} ort_süre={intensity}sn | id={result.get('id')}")
     except requests.RequestException as e:
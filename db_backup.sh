@@ -1,8 +1,7 @@
 #!/bin/bash
+# Tutarlı online yedek (SQLite backup API) + doğrulama + saklama politikası: backend/db_backup.py
 DB=/var/www/vislivis/backend/instance/vislivis.db
 BACKUP_DIR=/var/www/vislivis/db_backups
-mkdir -p $BACKUP_DIR
-STAMP=$(date +%Y-%m-%d_%H-%M)
-cp $DB $BACKUP_DIR/vislivis_$STAMP.db
-find $BACKUP_DIR -name 'vislivis_*.db' -mmin +2880 -delete
-echo "[$(date)] DB backup OK: $BACKUP_DIR/vislivis_$STAMP.db"
+PYTHON=/var/www/vislivis/venv/bin/python
+[ -x "$PYTHON" ] || PYTHON=python3
+"$PYTHON" /var/www/vislivis/backend/db_backup.py --db "$DB" --dir "$BACKUP_DIR" backup
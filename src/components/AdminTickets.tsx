@@ -46,7 +46,10 @@ export default function AdminTickets() {
   const { t } = useLanguage();
   const [isAdmin, setIsAdmin] = useState<boolean | null>(null);
   const [tickets, setTickets] = useState<TicketItem[]>([]);
+  const [page, setPage] = useState(1);
+  const [total, setTotal] = useState(0);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [search, setSearch] = useState('');
   const [filterStatus, setFilterStatus] = useState('');
   const [filterPriority, setFilterPriority] = useState('');
@@ -77,10 +80,12 @@ export default function AdminTickets() {
     }
   }, []);
 
-  const loadList = async () => {
-    setLoading(true);
+  const loadList = async (nextPage = 1) => {
+    if (nextPage === 1) setLoading(true);
+    else setLoadingMore(true);
     try {
       const params = new URLSearchParams();
+      params.set('page', String(nextPage));
       if (search.trim()) params.set('q', search.trim());
       if (filterStatus) params.set('status', filterStatus);
       if (filterPriority) params.set('priority', filterPriority);
@@ -92,12 +97,16 @@ export default function AdminTickets() {
       const res = await apiFetch(`/api/tickets?${params}`);
       if (res.ok) {
         const data = await res.json();
-        setTickets(data.tickets || []);
+        const items: TicketItem[] = data.tickets || [];
+        setTickets((prev) => (nextPage === 1 ? items : [...prev, ...items]));
+        setTotal(data.total ?? items.length);
+        setPage(nextPage);
       }
     } catch {
-      setTickets([]);
+      if (nextPage === 1) setTickets([]);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -449,6 +458,16 @@ export default function AdminTickets() {
               </div>
             </button>
           ))}
+          {tickets.length < total && (
+            <button
+              type="button"
+              onClick={() => loadList(page + 1)}
+              disabled={loadingMore}
+              className="w-full rounded-2xl p-3 border border-slate-700 bg-slate-800/40 hover:bg-slate-800/70 text-sm text-slate-300 disabled:opacity-50"
+            >
+              {loadingMore ? t('common.loading') : `${t('ticket.admin.loadMore')} (${tickets.length} / ${total})`}
+            </button>
+          )}
         </div>
       )}
     </div>
@@ -566,6 +566,7 @@ export const LanguageProvider: React.FC<{ children: React.ReactNode }> = ({ chil
         'ticket.admin.filterUser': 'Kullanıcı',
         'ticket.admin.searchButton': 'Ara',
         'ticket.admin.clearFilters': 'Filtre temizle',
+        'ticket.admin.loadMore': 'Daha fazla göster',
         'chat.loadingHistory': 'Geçmiş yükleniyor...',
         'chat.placeholder': 'Mağaza verileriniz hakkında soru sorun. Örn: Bugün satışlar nasıl? Kasa yoğunluğu var mı?',
         'chat.inputPlaceholder': 'Mesajınızı yazın...',
@@ -1250,6 +1251,7 @@ export const LanguageProvider: React.FC<{ children: React.ReactNode }> = ({ chil
         'ticket.admin.filterUser': 'User',
         'ticket.admin.searchButton': 'Search',
         'ticket.admin.clearFilters': 'Clear filters',
+        'ticket.admin.loadMore': 'Show more',
         'role.admin': 'Admin',
         'chat.loadingHistory': 'Loading history...',
         'chat.placeholder': 'Ask about your store data. E.g. How are sales today? Is there queue congestion?',